@@ -4,6 +4,7 @@
 
 use App\Models\SearchLog;
 use Illuminate\Http\JsonResponse;
+use Illuminate\Support\Facades\Http;
 
 class DashboardController extends Controller
 {
@@ -14,6 +15,7 @@ class DashboardController extends Controller
      * - среднее время поиска
      * - процент «успешных» запросов
      * - топ-5 запросов по частоте
+     * - счётчики кэша результатов bm25_engine.py (null, если движок не настроен)
      */
     public function stats(): JsonResponse
     {
@@ -46,6 +48,26 @@ public function stats(): JsonResponse
             'avgTime'        => $avgTime,
             'successRatePct' => $successRate,
             'topQueries'     => $topQueries,
+            'searchCache'    => $this->engineCacheStats(),
         ]);
     }
+
+    /**
+     * Попадания, промахи, вытеснения кэша результатов из GET /stats движка.
+     */
+    private function engineCacheStats(): ?array
+    {
+        $url = config('services.search_engine.url');
+        if (!$url) {
+            return null;
+        }
+
+        try {
+            $response = Http::timeout((float) config('services.search_engine.timeout', 2))
+                ->get(rtrim($url, '/') . '/stats');
+            return $response->successful() ? $response->json('cache') : null;
+        } catch (\Throwable $e) {
+            return null;
+        }
+    }
 }
@@ -4,7 +4,7 @@
 
 use Illuminate\Http\JsonResponse;
 use Illuminate\Support\Facades\Log;
-use App\Models\Article;
+use App\Services\ArticleDataset;
 use Illuminate\Support\Facades\File;
 
 class DataLoaderController extends Controller
@@ -15,7 +15,8 @@ public function run(): \Illuminate\Http\JsonResponse
 
         $python = 'D:\\projects\\nummy\\scripts\\python\\venv\\Scripts\\python.exe';
         $script = 'D:\\projects\\nummy\\scripts\\python\\fetch_arxiv.py';
-        $command = "\"{$python}\" \"{$script}\"";
+        $dataset = ArticleDataset::path();
+        $command = "\"{$python}\" \"{$script}\" --output \"{$dataset}\"";
 
         $output = [];
         $returnVar = 0;
@@ -45,63 +46,94 @@ public function run(): \Illuminate\Http\JsonResponse
 
     public function importArticles(): \Illuminate\Http\JsonResponse
     {
-        $path = storage_path('app/arxiv_dataset.json');
+        $path = ArticleDataset::path();
 
         if (!File::exists($path)) {
             return response()->json([
                 'success' => false,
-                'error' => "Файл arxiv_dataset.json не найден по пути: $path"
+                'error' => "Файл датасета не найден по пути: $path"
             ], 404);
         }
 
-        $json = File::get($path);
-        $data = json_decode($json, true);
-
-        if (!is_array($data) || empty($data)) {
+        // Записи читаются потоком (JSON Lines — по строке). Весь файл
+        // проверяется до очистки коллекции, чтобы не остаться без статей из-за битого файла
+        try {
+            $count = ArticleDataset::validate($path);
+        } catch (\RuntimeException $e) {
+            Log::error('importArticles: ' . $e->getMessage());
             return response()->json([
                 'success' => false,
-                'error' => "Не удалось прочитать или декодировать JSON"
+                'error' => "Не удалось прочитать или декодировать JSON: " . $e->getMessage()
             ], 500);
         }
 
-        // Очищаем коллекцию
-        Article::query()->delete();
-
-        $batch = [];
-        foreach ($data as $entry) {
-            $batch[] = [
-                'title'            => $entry['title'] ?? 'Без названия',
-                'abstract'         => $entry['abstract'] ?? '',
-                'tags'             => $entry['tags'] ?? [],
-                'authors'          => $entry['authors'] ?? [],
-                'affiliations'     => $entry['affiliations'] ?? [],
-                'date'             => $entry['date'] ?? now(),
-                'updated'          => $entry['updated'] ?? null,
-                'arxiv_id'         => $entry['arxiv_id'] ?? null,
-                'primary_category' => $entry['primary_category'] ?? null,
-                'categories'       => $entry['categories'] ?? [],
-                'doi'              => $entry['doi'] ?? null,
-                'pdf_url'          => $entry['pdf_url'] ?? null,
-                'comment'          => $entry['comment'] ?? null,
-                'journal_ref'      => $entry['journal_ref'] ?? null,
-                'lang'             => $entry['lang'] ?? null,
-            ];
+        if ($count === 0) {
+            return response()->json([
+                'success' => false,
+                'error' => "Датасет пуст: $path"
+            ], 500);
         }
 
-        // По чанкам, если данных много
-        $chunks = array_chunk($batch, 1000);
+        // Коллекция не пересоздаётся: статьи сопоставляются по arxiv_id и
+        // сохраняют _id (см. ArticleDataset::upsert), по чанкам, не держа весь датасет в памяти
+        ArticleDataset::prepareImport();
+        $chunk = [];
+        $keep = [];
         $total = 0;
-        foreach ($chunks as $chunk) {
-            Article::insert($chunk);
-            $total += count($chunk);
+        try {
+            foreach (ArticleDataset::records($path) as $entry) {
+                $row = $this->articleRow($entry);
+                if ($row['arxiv_id']) {
+                    $keep[$row['arxiv_id']] = true;
+                }
+                $chunk[] = $row;
+                if (count($chunk) === 1000) {
+                    $total += ArticleDataset::upsert($chunk);
+                    $chunk = [];
+                }
+            }
+        } catch (\RuntimeException $e) {
+            Log::error('importArticles: ' . $e->getMessage());
+            return response()->json([
+                'success' => false,
+                'error' => $e->getMessage(),
+                'imported' => $total,
+            ], 500);
+        }
+        if ($chunk) {
+            $total += ArticleDataset::upsert($chunk);
         }
+        // статьи, которых больше нет в датасете
+        $removed = ArticleDataset::removeMissing($keep);
 
         return response()->json([
             'success' => true,
-            'imported' => $total
+            'imported' => $total,
+            'removed' => $removed,
         ]);
     }
 
+    private function articleRow(array $entry): array
+    {
+        return [
+            'title'            => $entry['title'] ?? 'Без названия',
+            'abstract'         => $entry['abstract'] ?? '',
+            'tags'             => $entry['tags'] ?? [],
+            'authors'          => $entry['authors'] ?? [],
+            'affiliations'     => $entry['affiliations'] ?? [],
+            'date'             => $entry['date'] ?? now(),
+            'updated'          => $entry['updated'] ?? null,
+            'arxiv_id'         => $entry['arxiv_id'] ?? null,
+            'primary_category' => $entry['primary_category'] ?? null,
+            'categories'       => $entry['categories'] ?? [],
+            'doi'              => $entry['doi'] ?? null,
+            'pdf_url'          => $entry['pdf_url'] ?? null,
+            'comment'          => $entry['comment'] ?? null,
+            'journal_ref'      => $entry['journal_ref'] ?? null,
+            'lang'             => $entry['lang'] ?? null,
+        ];
+    }
+
     public function exportAndNormalize(): \Illuminate\Http\JsonResponse
     {
         $exportPath = storage_path('app/articles_export.json');
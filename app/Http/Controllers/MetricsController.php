@@ -34,7 +34,8 @@ public function runEvaluation(Request $request): JsonResponse
             Log::info("[MetricsController] Запуск оценки поиска (force={$force})...");
             $cmd = escapeshellarg($pythonExe)
                 . ' '
-                . escapeshellarg($scriptPath);
+                . escapeshellarg($scriptPath)
+                . ' --workers 0'; // ячейки оценки — на все ядра
             exec($cmd . ' 2>&1', $out, $code);
             if ($code !== 0) {
                 Log::error("[MetricsController] Ошибка запуска скрипта (код $code). Вывод:\n" . implode("\n", $out));
@@ -6,6 +6,7 @@
 use App\Models\SearchLog;
 use App\Services\QueryExpander;
 use Illuminate\Http\Request;
+use Illuminate\Support\Facades\Http;
 use Illuminate\Support\Facades\Log;
 use MongoDB\BSON\ObjectId;
 use MongoDB\Client as MongoClient;
@@ -30,6 +31,31 @@ public function search(Request $request): \Illuminate\Http\JsonResponse
                 return response()->json(['error' => 'Missing query'], 400);
             }
 
+            // --- BM25F-движок (bm25_engine.py), если настроен ---
+            $engine = $this->searchViaEngine($query, $expand, $useLemmas);
+            if ($engine !== null) {
+                $results = $this->fetchRanked($engine['results']);
+                $duration = round(microtime(true) - $start, 3);
+
+                SearchLog::create([
+                    'query'            => $query,
+                    'expanded'         => $expand,
+                    'lemmas'           => $useLemmas,
+                    'expanded_terms'   => $engine['expanded_terms'],
+                    'normalized_terms' => $engine['normalized_terms'],
+                    'result_count'     => count($results),
+                    'duration'         => $duration,
+                ]);
+
+                return response()->json([
+                    'query'            => $query,
+                    'expanded_terms'   => $engine['expanded_terms'],
+                    'normalized_terms' => $engine['normalized_terms'],
+                    'results'          => $results,
+                    'duration'         => $duration,
+                ]);
+            }
+
             // --- Prepare terms for search ---
             $expandedTermsWithWeights = $expand
                 ? (new QueryExpander())->expandWithWeights($query)
@@ -81,14 +107,83 @@ public function search(Request $request): \Illuminate\Http\JsonResponse
         }
     }
 
+    /**
+     * Поиск через bm25_engine.py --serve: расширение с весами синонимов,
+     * лемматизация и top-k по BM25F. Возвращает null, если движок не
+     * настроен или недоступен, — тогда поиск идёт через $text.
+     */
+    private function searchViaEngine(string $query, bool $expand, bool $useLemmas): ?array
+    {
+        $url = config('services.search_engine.url');
+        if (!$url) {
+            return null;
+        }
+
+        try {
+            $response = Http::timeout((float) config('services.search_engine.timeout', 2))
+                ->get(rtrim($url, '/') . '/search', [
+                    'q'      => $query,
+                    'expand' => $expand ? 1 : 0,
+                    'lemmas' => $useLemmas ? 1 : 0,
+                    'k'      => (int) config('services.search_engine.limit', 100),
+                ]);
+            if (!$response->successful() || !is_array($response->json('results'))) {
+                Log::warning("Search engine ($url): HTTP {$response->status()}");
+                return null;
+            }
+            return $response->json();
+        } catch (\Throwable $e) {
+            Log::warning("Search engine unavailable ($url): " . $e->getMessage());
+            return null;
+        }
+    }
+
+    /**
+     * Документы найденных движком статей в порядке выдачи, с полем score.
+     */
+    private function fetchRanked(array $hits): array
+    {
+        if (!$hits) {
+            return [];
+        }
+
+        $client = new MongoClient();
+        $collection = $client->scholar_db->normalized_articles;
+        $ids = array_map(fn ($hit) => new ObjectId($hit['id']), $hits);
+
+        $byId = [];
+        foreach ($collection->find(['_id' => ['$in' => $ids]]) as $doc) {
+            $byId[(string) $doc['_id']] = $doc;
+        }
+
+        $results = [];
+        foreach ($hits as $hit) {
+            if (isset($byId[$hit['id']])) {
+                $doc = $byId[$hit['id']];
+                $doc['score'] = $hit['score'];
+                $results[] = $doc;
+            }
+        }
+        return $results;
+    }
+
     /**
      * Лемматизация массива terms через внешний Python-скрипт.
      */
     private function lemmatizeTerms(array $terms): array
     {
+        $query = implode(' ', $terms);
+
+        $address = config('services.normalizer.address');
+        if ($address) {
+            $lemmas = $this->lemmatizeViaDaemon($address, $query);
+            if ($lemmas !== null) {
+                return $lemmas;
+            }
+        }
+
         try {
             $scriptPath = base_path('scripts/python/normalize_query.py');
-            $query = implode(' ', $terms);
             $python = 'D:\\projects\\nummy\\scripts\\python\\venv\\Scripts\\python.exe';
             $command = $python . ' ' . escapeshellarg($scriptPath) . ' ' . escapeshellarg($query);
 
@@ -111,6 +206,44 @@ private function lemmatizeTerms(array $terms): array
         }
     }
 
+    /**
+     * Лемматизация через долгоживущий процесс normalize_query.py --serve
+     * (протокол JSON Lines). Возвращает null, если демон недоступен, —
+     * тогда lemmatizeTerms запускает скрипт как раньше.
+     */
+    private function lemmatizeViaDaemon(string $address, string $query): ?array
+    {
+        $timeout = (float) config('services.normalizer.timeout', 2);
+        $socket = @stream_socket_client($address, $errno, $errstr, $timeout);
+        if (!$socket) {
+            Log::warning("Lemmatization daemon unavailable ($address): $errstr");
+            return null;
+        }
+
+        try {
+            stream_set_timeout($socket, (int) ceil($timeout));
+            fwrite($socket, json_encode(['query' => $query], JSON_UNESCAPED_UNICODE) . "\n");
+            $line = fgets($socket);
+            if ($line === false) {
+                Log::warning("Lemmatization daemon: no response from $address");
+                return null;
+            }
+
+            $decoded = json_decode(trim($line), true);
+            if (!is_array($decoded) || !isset($decoded['lemmas']) || !is_array($decoded['lemmas'])) {
+                Log::error("Lemmatization daemon: invalid JSON. Output: " . $line);
+                return null;
+            }
+            if (isset($decoded['error'])) {
+                Log::warning("Lemmatization daemon error: " . $decoded['error']);
+            }
+
+            return $decoded['lemmas'];
+        } finally {
+            fclose($socket);
+        }
+    }
+
     /**
      * Возвращает статью по id из коллекции articles.
      */
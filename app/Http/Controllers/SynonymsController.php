@@ -37,6 +37,8 @@ public function update(string $term, Request $req): JsonResponse
 
         $dict[$term] = $data['synonyms'];
         Storage::disk('local')->put('query_synonyms.json', json_encode($dict, JSON_PRETTY_PRINT|JSON_UNESCAPED_UNICODE));
+        // бинарный индекс больше не соответствует JSON — QueryExpander вернётся к JSON
+        Storage::disk('local')->delete('query_synonyms.idx');
         return response()->json(['status'=>'success','synonyms'=>$dict]);
     }
 }
@@ -0,0 +1,149 @@
+<?php
+
+namespace App\Services;
+
+use App\Models\Article;
+
+/**
+ * Датасет статей scripts/python/fetch_arxiv.py. Формат — по расширению,
+ * как в scripts/python/jsonstream.py: .jsonl — JSON Lines, .json — массив,
+ * суффикс .gz — gzip.
+ */
+class ArticleDataset
+{
+    public static function path(): string
+    {
+        return config('services.arxiv.dataset_path') ?: storage_path('app/arxiv_dataset.json');
+    }
+
+    public static function isJsonLines(string $path): bool
+    {
+        return (bool) preg_match('/\.(jsonl|ndjson)(\.gz)?$/', $path);
+    }
+
+    /**
+     * Записи по одной. JSON Lines читаются построчно, в памяти только
+     * текущая строка (gzopen читает и несжатые файлы); JSON-массив
+     * декодируется целиком, как раньше.
+     *
+     * @throws \RuntimeException если файл не читается или запись — не JSON-объект
+     */
+    public static function records(string $path): \Generator
+    {
+        if (!self::isJsonLines($path)) {
+            $raw = @file_get_contents($path);
+            if ($raw !== false && str_ends_with($path, '.gz')) {
+                $raw = @gzdecode($raw);
+            }
+            $data = $raw === false ? null : json_decode($raw, true);
+            if (!is_array($data)) {
+                throw new \RuntimeException("Не удалось прочитать или декодировать JSON: $path");
+            }
+            foreach (array_values($data) as $i => $entry) {
+                if (!is_array($entry)) {
+                    throw new \RuntimeException("$path, запись $i: не JSON-объект");
+                }
+                yield $entry;
+            }
+            return;
+        }
+
+        $f = @gzopen($path, 'rb');
+        if ($f === false) {
+            throw new \RuntimeException("Не удалось открыть $path");
+        }
+
+        try {
+            $lineNo = 0;
+            while (($line = gzgets($f)) !== false) {
+                $lineNo++;
+                $line = trim($line, " \t\r\n\u{FEFF}");
+                if ($line === '') {
+                    continue;
+                }
+                $entry = json_decode($line, true);
+                if (!is_array($entry)) {
+                    throw new \RuntimeException("$path, строка $lineNo: не JSON-объект");
+                }
+                yield $entry;
+            }
+        } finally {
+            gzclose($f);
+        }
+    }
+
+    /**
+     * Проверочный проход до изменения коллекции: каждая запись читается и
+     * декодируется (потоком, как при импорте), но никуда не пишется. Битая
+     * запись в середине файла иначе обнаружилась бы, когда коллекция уже
+     * очищена и импортирована наполовину.
+     *
+     * @return int число записей
+     * @throws \RuntimeException на первой нечитаемой записи
+     */
+    public static function validate(string $path): int
+    {
+        $count = 0;
+        foreach (self::records($path) as $entry) {
+            $count++;
+        }
+        return $count;
+    }
+
+    /**
+     * Пачка статей в коллекцию articles без пересоздания: статья с уже
+     * известным arxiv_id обновляется на месте и сохраняет свой _id, новая
+     * добавляется. От _id зависят normalized_articles и состояние
+     * инкрементальной нормализации (build_normalized_articles.py): с новыми
+     * _id каждый импорт выглядел бы как новый корпус. Статьи без arxiv_id
+     * сопоставить не с чем — они добавляются (старые удаляет prepareImport).
+     *
+     * @return int записано статей
+     */
+    public static function upsert(array $rows): int
+    {
+        $keyed = array_values(array_filter($rows, fn (array $row) => !empty($row['arxiv_id'])));
+        $plain = array_values(array_filter($rows, fn (array $row) => empty($row['arxiv_id'])));
+        if ($keyed) {
+            // через query builder: без updated_at, иначе выгрузка менялась бы при каждом импорте
+            Article::query()->toBase()->upsert($keyed, ['arxiv_id']);
+        }
+        if ($plain) {
+            Article::insert($plain);
+        }
+        return count($rows);
+    }
+
+    /**
+     * Перед импортом: индекс по arxiv_id (без него каждая запись upsert —
+     * полный просмотр коллекции; createIndex для существующего индекса
+     * ничего не делает) и удаление статей без arxiv_id, которые upsert не узнает.
+     *
+     * @return int удалено статей
+     */
+    public static function prepareImport(): int
+    {
+        Article::raw(fn ($collection) => $collection->createIndex(['arxiv_id' => 1]));
+        return Article::query()->whereNull('arxiv_id')->delete();
+    }
+
+    /**
+     * После импорта: статьи, чьего arxiv_id нет в датасете.
+     *
+     * @param array<string, true> $keep arxiv_id импортированных статей
+     * @return int удалено статей
+     */
+    public static function removeMissing(array $keep): int
+    {
+        $stale = [];
+        foreach (Article::query()->whereNotNull('arxiv_id')->select(['_id', 'arxiv_id'])->cursor() as $article) {
+            if (!isset($keep[$article->arxiv_id])) {
+                $stale[] = $article->getKey();
+            }
+        }
+        foreach (array_chunk($stale, 1000) as $ids) {
+            Article::query()->whereIn('_id', $ids)->delete();
+        }
+        return count($stale);
+    }
+}
@@ -6,13 +6,96 @@ class QueryExpander
 {
     protected array $dictionary = [];
 
+    /** Путь к бинарному индексу query_synonyms.idx, если он актуален */
+    protected ?string $indexPath = null;
+
     public function __construct() {
-        $this->loadDictionary();
+        $jsonPath = storage_path('app/query_synonyms.json');
+        $indexPath = storage_path('app/query_synonyms.idx');
+
+        // Индекс строит scripts/python/synonym_index.py вместе с JSON; если JSON
+        // правили позже (SynonymsController), индекс устарел — читаем JSON
+        if (is_file($indexPath) && (!is_file($jsonPath) || filemtime($indexPath) >= filemtime($jsonPath))) {
+            $this->indexPath = $indexPath;
+        } else {
+            $this->loadDictionary($jsonPath);
+        }
+    }
+
+    /**
+     * Словарь из JSON сразу раскладывается по нормализованным ключам
+     * (при совпадении нормализованных ключей остаётся первый).
+     */
+    protected function loadDictionary(string $path): void {
+        $json = is_file($path) ? file_get_contents($path) : '';
+        foreach (json_decode($json, true) ?? [] as $key => $synonyms) {
+            $this->dictionary[$this->normalize($key)] ??= $synonyms;
+        }
+    }
+
+    /**
+     * Поиск нормализованного ключа в бинарном индексе: хэш-таблица с открытой
+     * адресацией, читаются только нужные слоты и записи (формат описан
+     * в scripts/python/synonym_index.py).
+     */
+    protected function lookupIndex(string $keyNorm): array
+    {
+        $f = @fopen($this->indexPath, 'rb');
+        if ($f === false) {
+            return [];
+        }
+
+        try {
+            $header = unpack('a8magic/VnEntries/VnSlots/VentriesOff/VsynonymsOff/VstringsOff', fread($f, 32));
+            if ($header['magic'] !== 'NUMSYN01') {
+                return [];
+            }
+
+            $hash = substr(md5($keyNorm, true), 0, 8);
+            $mask = $header['nSlots'] - 1;
+            $pos = unpack('V', $hash)[1] & $mask;
+
+            while (true) {
+                fseek($f, 32 + $pos * 12);
+                $slot = fread($f, 12);
+                $entry = unpack('V', $slot, 8)[1];
+                if ($entry === 0) {
+                    return [];
+                }
+
+                if (substr($slot, 0, 8) === $hash) {
+                    fseek($f, $header['entriesOff'] + ($entry - 1) * 16);
+                    $e = unpack('VkeyOff/VkeyLen/VsynStart/VsynCount', fread($f, 16));
+                    if ($this->readString($f, $header['stringsOff'] + $e['keyOff'], $e['keyLen']) === $keyNorm) {
+                        $synonyms = [];
+                        if ($e['synCount'] > 0) {
+                            fseek($f, $header['synonymsOff'] + $e['synStart'] * 16);
+                            $table = fread($f, $e['synCount'] * 16);
+                            for ($k = 0; $k < $e['synCount']; $k++) {
+                                $s = unpack('VtermOff/VtermLen/eweight', $table, $k * 16);
+                                $synonyms[] = [
+                                    $this->readString($f, $header['stringsOff'] + $s['termOff'], $s['termLen']),
+                                    $s['weight'],
+                                ];
+                            }
+                        }
+                        return $synonyms;
+                    }
+                }
+                $pos = ($pos + 1) & $mask;
+            }
+        } finally {
+            fclose($f);
+        }
     }
 
-    protected function loadDictionary(): void {
-        $json = file_get_contents(storage_path('app/query_synonyms.json'));
-        $this->dictionary = json_decode($json, true) ?? [];
+    protected function readString($f, int $offset, int $length): string
+    {
+        if ($length === 0) {
+            return '';
+        }
+        fseek($f, $offset);
+        return fread($f, $length);
     }
 
     /**
@@ -40,14 +123,12 @@ public function expandWithWeights(string $query): array
         $expanded = [['term' => $query, 'weight' => 1.0]];
         $queryNorm = $this->normalize($query);
 
-        foreach ($this->dictionary as $key => $synonyms) {
-            $keyNorm = $this->normalize($key);
-            if ($keyNorm === $queryNorm) {
-                foreach ($synonyms as [$synTerm, $weight]) {
-                    $expanded[] = ['term' => $synTerm, 'weight' => floatval($weight)];
-                }
-                break;
-            }
+        $synonyms = $this->indexPath !== null
+            ? $this->lookupIndex($queryNorm)
+            : ($this->dictionary[$queryNorm] ?? []);
+
+        foreach ($synonyms as [$synTerm, $weight]) {
+            $expanded[] = ['term' => $synTerm, 'weight' => floatval($weight)];
         }
 
         return $expanded;
@@ -33,6 +33,35 @@
         'endpoint' => 'https://newsapi.org/v2/everything',
     ],
 
+    'normalizer' => [
+        // Адрес демона normalize_query.py --serve, например
+        // unix:///tmp/nummy-normalizer.sock или tcp://127.0.0.1:8765.
+        // Если не задан — лемматизация через запуск скрипта на каждый запрос.
+        'address' => env('NORMALIZER_ADDRESS'),
+        'timeout' => env('NORMALIZER_TIMEOUT', 2),
+    ],
+
+    'search_engine' => [
+        // Адрес scripts/python/bm25_engine.py --serve, например
+        // http://127.0.0.1:8766. Если не задан или недоступен — поиск
+        // через $text в MongoDB, как раньше.
+        'url' => env('SEARCH_ENGINE_URL'),
+        'timeout' => env('SEARCH_ENGINE_TIMEOUT', 2),
+        'limit' => env('SEARCH_ENGINE_LIMIT', 100),
+    ],
+
+    'arxiv' => [
+        // Датасет scripts/python/fetch_arxiv.py. Формат по расширению:
+        // .json, .jsonl, с суффиксом .gz — сжатый. Если не задан —
+        // storage/app/arxiv_dataset.json.
+        'dataset_path' => env('ARXIV_DATASET_PATH'),
+    ],
+
+    'python' => [
+        // Интерпретатор для scripts/python (artisan pipeline:refresh)
+        'bin' => env('PYTHON_BIN', 'python'),
+    ],
+
     'slack' => [
         'notifications' => [
             'bot_user_oauth_token' => env('SLACK_BOT_USER_OAUTH_TOKEN'),
@@ -2,7 +2,7 @@
 
 namespace Database\Seeders;
 
-use App\Models\Article;
+use App\Services\ArticleDataset;
 use Illuminate\Database\Seeder;
 use Illuminate\Support\Facades\File;
 
@@ -10,59 +10,83 @@ class ArticleSeeder extends Seeder
 {
     public function run(): void
     {
-        // Очистка коллекции перед импортом
-        Article::query()->delete();
-
-        $path = storage_path('app/arxiv_dataset.json');
+        $path = ArticleDataset::path();
 
         if (!File::exists($path)) {
-            echo "Файл arxiv_dataset.json не найден по пути: $path\n";
+            echo "Файл датасета не найден по пути: $path\n";
             return;
         }
 
-        $json = File::get($path);
-        $data = json_decode($json, true);
-
-        if (!is_array($data) || empty($data)) {
-            echo "Не удалось прочитать или декодировать JSON.\n";
+        // Весь файл проверяется до очистки коллекции: битый файл не должен её опустошить
+        try {
+            $count = ArticleDataset::validate($path);
+        } catch (\RuntimeException $e) {
+            echo $e->getMessage() . "\n";
             return;
         }
 
-        $batch = [];
-
-        foreach ($data as $entry) {
-            // Удаляем id и _id из входных данных, чтобы не было конфликтов с MongoDB
-            unset($entry['id'], $entry['_id']);
-
-            $batch[] = [
-                'title'            => $entry['title'] ?? 'Без названия',
-                'abstract'         => $entry['abstract'] ?? '',
-                'tags'             => isset($entry['tags']) && is_array($entry['tags']) ? $entry['tags'] : [],
-                'authors'          => isset($entry['authors']) && is_array($entry['authors']) ? $entry['authors'] : [],
-                'affiliations'     => isset($entry['affiliations']) && is_array($entry['affiliations']) ? $entry['affiliations'] : [],
-                'date'             => $entry['date'] ?? now(),
-                'updated'          => $entry['updated'] ?? null,
-                'arxiv_id'         => $entry['arxiv_id'] ?? null,
-                'primary_category' => $entry['primary_category'] ?? null,
-                'categories'       => isset($entry['categories']) && is_array($entry['categories']) ? $entry['categories'] : [],
-                'doi'              => $entry['doi'] ?? null,
-                'pdf_url'          => $entry['pdf_url'] ?? null,
-                'comment'          => $entry['comment'] ?? null,
-                'journal_ref'      => $entry['journal_ref'] ?? null,
-                'lang'             => $entry['lang'] ?? 'en'
-            ];
+        if ($count === 0) {
+            echo "Датасет пуст: $path\n";
+            return;
         }
 
-        // Для больших объёмов — вставка по чанкам (например, по 1000 записей)
-        $chunks = array_chunk($batch, 1000);
+        // Коллекция не очищается: статьи сопоставляются по arxiv_id и сохраняют _id,
+        // иначе после каждого импорта нормализация считала бы все статьи новыми
+        ArticleDataset::prepareImport();
 
+        // Запись по чанкам по 1000 записей по мере чтения — датасет целиком в памяти не нужен
+        $chunk = [];
+        $chunkNo = 0;
+        $keep = [];
         $total = 0;
-        foreach ($chunks as $i => $chunk) {
-            Article::insert($chunk);
-            $total += count($chunk);
-            echo "Импортировано записей: " . count($chunk) . " (чанк #" . ($i + 1) . ")\n";
+        foreach (ArticleDataset::records($path) as $entry) {
+            $row = $this->articleRow($entry);
+            if ($row['arxiv_id']) {
+                $keep[$row['arxiv_id']] = true;
+            }
+            $chunk[] = $row;
+            if (count($chunk) === 1000) {
+                $total += $this->upsertChunk($chunk, ++$chunkNo);
+                $chunk = [];
+            }
+        }
+        if ($chunk) {
+            $total += $this->upsertChunk($chunk, ++$chunkNo);
         }
+        $removed = ArticleDataset::removeMissing($keep);
 
-        echo "Импорт завершён успешно. Всего импортировано статей: " . $total . "\n";
+        echo "Импорт завершён успешно. Всего импортировано статей: " . $total
+            . ", удалено отсутствующих в датасете: " . $removed . "\n";
+    }
+
+    private function articleRow(array $entry): array
+    {
+        // Удаляем id и _id из входных данных: _id статьи задаёт коллекция (upsert по arxiv_id)
+        unset($entry['id'], $entry['_id']);
+
+        return [
+            'title'            => $entry['title'] ?? 'Без названия',
+            'abstract'         => $entry['abstract'] ?? '',
+            'tags'             => isset($entry['tags']) && is_array($entry['tags']) ? $entry['tags'] : [],
+            'authors'          => isset($entry['authors']) && is_array($entry['authors']) ? $entry['authors'] : [],
+            'affiliations'     => isset($entry['affiliations']) && is_array($entry['affiliations']) ? $entry['affiliations'] : [],
+            'date'             => $entry['date'] ?? now(),
+            'updated'          => $entry['updated'] ?? null,
+            'arxiv_id'         => $entry['arxiv_id'] ?? null,
+            'primary_category' => $entry['primary_category'] ?? null,
+            'categories'       => isset($entry['categories']) && is_array($entry['categories']) ? $entry['categories'] : [],
+            'doi'              => $entry['doi'] ?? null,
+            'pdf_url'          => $entry['pdf_url'] ?? null,
+            'comment'          => $entry['comment'] ?? null,
+            'journal_ref'      => $entry['journal_ref'] ?? null,
+            'lang'             => $entry['lang'] ?? 'en'
+        ];
+    }
+
+    private function upsertChunk(array $chunk, int $chunkNo): int
+    {
+        ArticleDataset::upsert($chunk);
+        echo "Импортировано записей: " . count($chunk) . " (чанк #" . $chunkNo . ")\n";
+        return count($chunk);
     }
 }
@@ -1,8 +1,48 @@
 <?php
 
+use App\Models\Article;
+use Database\Seeders\ArticleSeeder;
+use Database\Seeders\NormalizedArticleSeeder;
 use Illuminate\Foundation\Inspiring;
 use Illuminate\Support\Facades\Artisan;
+use Illuminate\Support\Facades\Process;
 
 Artisan::command('inspire', function () {
     $this->comment(Inspiring::quote());
 })->purpose('Display an inspiring quote');
+
+// Стадии scripts/python/pipeline.py, которым нужна MongoDB
+
+Artisan::command('articles:import', function () {
+    return $this->call('db:seed', ['--class' => ArticleSeeder::class, '--force' => true]);
+})->purpose('Импорт датасета fetch_arxiv.py (ARXIV_DATASET_PATH) в коллекцию articles');
+
+Artisan::command('articles:export {path}', function (string $path) {
+    // JSON Lines: build_normalized_articles.py читает потоком, в памяти по одной статье
+    $f = fopen($path . '.tmp', 'wb');
+    if ($f === false) {
+        $this->error("Не удалось открыть $path.tmp");
+        return 1;
+    }
+    $count = 0;
+    foreach (Article::query()->cursor() as $article) {
+        fwrite($f, json_encode($article->toArray(), JSON_UNESCAPED_UNICODE) . "\n");
+        $count++;
+    }
+    fclose($f);
+    rename($path . '.tmp', $path);
+    $this->info("Выгружено статей: $count в $path");
+    return 0;
+})->purpose('Выгрузка коллекции articles в JSON Lines для build_normalized_articles.py');
+
+Artisan::command('articles:import-normalized', function () {
+    return $this->call('db:seed', ['--class' => NormalizedArticleSeeder::class, '--force' => true]);
+})->purpose('Импорт storage/app/normalized_articles.json в коллекцию normalized_articles');
+
+Artisan::command('pipeline:refresh {args?*}', function (array $args = []) {
+    $command = [config('services.python.bin'), base_path('scripts/python/pipeline.py'), ...$args];
+    $result = Process::forever()->path(base_path())->run($command, function (string $type, string $output) {
+        $this->output->write($output);
+    });
+    return $result->exitCode();
+})->purpose('Обновить датасет, нормализацию и синонимы (только устаревшие стадии)');
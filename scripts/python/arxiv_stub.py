@@ -0,0 +1,155 @@
+"""
+Заглушка arXiv API (Atom) для проверки fetch_arxiv.py без сети.
+
+На любой search_query отдаёт детерминированную выдачу из --total статей
+(часть статей общая для разных тем — проверка дедупликации) с
+пагинацией start/max_results, задержкой ответа --latency и случайными
+ошибками 503 с долей --fail-rate. Статья i обновлена через i × --step
+секунд после BASE_DATE (по умолчанию — через i часов; при --step меньше 1
+несколько статей обновлены в одну секунду, как бывает в arXiv); sortBy=lastUpdatedDate выдаёт от новых к старым, так что
+перезапуск с большим --total имитирует появление новых статей. Если
+запросы приходят чаще, чем раз в --min-interval секунд, отвечает 429 —
+так видно, соблюдает ли клиент ограничение частоты.
+
+GET /stats — счётчики: запросы, ответы 429/503, минимальный интервал
+между запросами.
+
+    python arxiv_stub.py --port 8790 --latency 0.5 --fail-rate 0.1 --min-interval 0.05
+"""
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CATEGORIES = ["cs.LG", "cs.AI", "cs.CL", "cs.CV", "stat.ML", "hep-th"]
+SHARED_EVERY = 10   # каждая такая статья темы — «общая» для всех тем
+BASE_DATE = datetime(2024, 1, 1)
+
+def entry_xml(topic, i, step=3600):
+    key = hashlib.md5(topic.encode("utf-8")).hexdigest()[:6]
+    shared = i % SHARED_EVERY == 0
+    title = f"Shared paper {i}" if shared else f"{topic.title()} study {i}"
+    arxiv_id = f"2401.{i:05d}" if shared else f"{key}.{i:05d}"
+    # у каждой седьмой только категория без перевода — fetch_arxiv её пропустит
+    cats = ["hep-th"] if i % 7 == 3 else [CATEGORIES[i % 5], CATEGORIES[(i + 1) % 5]]
+    tags = "".join(f'<category term="{c}" scheme="http://arxiv.org/schemas/atom"/>' for c in cats)
+    date = (BASE_DATE + timedelta(seconds=i * step)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return f"""<entry>
+<id>http://arxiv.org/abs/{arxiv_id}v1</id>
+<updated>{date}</updated>
+<published>{date}</published>
+<title>{escape(title)}</title>
+<summary>Abstract of {escape(title)}.
+Second line.</summary>
+<author><name>Author {i % 13}</name></author>
+<link href="http://arxiv.org/abs/{arxiv_id}v1" rel="alternate" type="text/html"/>
+<link title="pdf" href="http://arxiv.org/pdf/{arxiv_id}v1" rel="related" type="application/pdf"/>
+<arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="{cats[0]}" scheme="http://arxiv.org/schemas/atom"/>
+{tags}
+</entry>"""
+
+def feed_xml(topic, start, count, total, by_date=False, step=3600):
+    positions = range(start, min(start + count, total))
+    entries = "\n".join(entry_xml(topic, total - 1 - j if by_date else j, step) for j in positions)
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">
+<title>arXiv Query: {escape(topic)}</title>
+<opensearch:totalResults>{total}</opensearch:totalResults>
+<opensearch:startIndex>{start}</opensearch:startIndex>
+<opensearch:itemsPerPage>{count}</opensearch:itemsPerPage>
+{entries}
+</feed>""".encode("utf-8")
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            with server.lock:
+                return self._send(200, json.dumps(server.stats).encode("utf-8"), "application/json")
+
+        now = time.monotonic()
+        with server.lock:
+            stats = server.stats
+            stats["requests"] += 1
+            if server.last is not None:
+                gap = now - server.last
+                stats["min_interval"] = gap if stats["min_interval"] is None else min(stats["min_interval"], gap)
+                too_fast = gap < server.args.min_interval
+            else:
+                too_fast = False
+            server.last = now
+            failed = server.random.random() < server.args.fail_rate
+            if too_fast:
+                stats["rate_limited"] += 1
+            elif failed:
+                stats["failed"] += 1
+
+        if too_fast:
+            return self._send(429, b"Too Many Requests", "text/plain")
+        if failed:
+            return self._send(503, b"Service Unavailable", "text/plain")
+
+        params = parse_qs(url.query)
+        topic = params.get("search_query", [""])[0]
+        start = int(params.get("start", [0])[0])
+        count = int(params.get("max_results", [10])[0])
+        time.sleep(server.args.latency)
+        by_date = params.get("sortBy", [""])[0] == "lastUpdatedDate"
+        self._send(200, feed_xml(topic, start, count, server.args.total, by_date, server.args.step), "application/atom+xml")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Заглушка arXiv API для fetch_arxiv.py.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--total", type=int, default=250, help="статей в выдаче по любой теме")
+    parser.add_argument("--step", type=float, default=3600,
+                        help="секунд между updated соседних статей (меньше 1 — совпадения до секунды)")
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка ответа, сек")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument("--min-interval", type=float, default=0.0,
+                        help="запросы чаще этого интервала (сек) получают 429")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+def make_server(args):
+    """Сервер заглушки (ещё не запущен); port 0 — свободный порт."""
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    server.args = args
+    server.lock = threading.Lock()
+    server.random = random.Random(args.seed)
+    server.last = None
+    server.stats = {"requests": 0, "rate_limited": 0, "failed": 0, "min_interval": None}
+    return server
+
+def main():
+    args = parse_args()
+    server = make_server(args)
+    print(f"arxiv_stub: http://{args.host}:{server.server_address[1]}/api/query", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
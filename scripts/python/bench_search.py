@@ -0,0 +1,389 @@
+"""
+Нагрузочный тест поиска: повтор запросов из выгрузки search_logs.
+
+До сих пор задержку поиска можно было узнать только по полю duration,
+которое SearchController::search пишет в SearchLog. Этот скрипт берёт
+запросы из выгрузки коллекции (mongoexport: JSON-массив или JSON Lines,
+можно .gz) с теми же флагами expanded/lemmas и проигрывает их
+с заданной параллельностью тем же путём, что и контроллер:
+
+    expand     — расширение синонимами (как QueryExpander::expandWithWeights)
+    lemmatize  — normalize_query.py: демон --serve или в этом процессе
+    spawn      — то же, но запуском normalize_query.py на каждый запрос
+                 (как shell_exec в SearchController без NORMALIZER_ADDRESS)
+    search     — поисковый бэкенд
+
+Бэкенды: local — замена MongoDB $text без сервера (TF-IDF по
+нормализованным статьям, см. tfidf_index.py), mongo — настоящий $text
+(нужен pymongo), none — без поиска, или свой класс "модуль:Класс".
+Параметры бэкенда передаются через --backend-arg ключ=значение.
+
+Отчёт: p50/p95/p99 задержки всего запроса и каждой стадии, пропускная
+способность. С --baseline сравнивает p95 с прошлым отчётом (--json) и
+завершается с кодом 1, если что-то стало медленнее больше чем на
+--max-regression.
+
+    python bench_search.py search_logs.json --concurrency 8 --json bench.json
+    python bench_search.py search_logs.json --normalizer daemon --address tcp://127.0.0.1:8765 \\
+        --baseline bench.json
+"""
+import sys
+import json
+import time
+import socket
+import argparse
+import importlib
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from jsonstream import iter_records
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+STORAGE_DIR = SCRIPT_DIR.parent.parent / "storage" / "app"
+NORMALIZE_SCRIPT = SCRIPT_DIR / "normalize_query.py"
+
+STAGES = ("spawn", "lemmatize", "expand", "search")
+PERCENTILES = (50, 95, 99)
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_REGRESSION = 0.2   # допустимый рост p95 относительно --baseline
+MIN_REGRESSION_MS = 1.0        # меньшие абсолютные изменения p95 — шум, не регрессия
+
+# === НОРМАЛИЗАЦИЯ ===
+
+class SpawnNormalizer:
+    """Новый процесс normalize_query.py на каждый запрос."""
+    stage = "spawn"
+
+    def __init__(self, python=None, timeout=DEFAULT_TIMEOUT):
+        self.python = python or sys.executable
+        self.timeout = timeout
+
+    def __call__(self, query):
+        out = subprocess.run([self.python, str(NORMALIZE_SCRIPT), query],
+                             capture_output=True, timeout=self.timeout, check=True)
+        return json.loads(out.stdout.decode("utf-8").strip() or "[]")
+
+class DaemonNormalizer:
+    """
+    normalize_query.py --serve; как lemmatizeViaDaemon — новое соединение
+    на запрос. address: unix:///path/to.sock или tcp://host:port.
+    """
+    stage = "lemmatize"
+
+    def __init__(self, address, timeout=DEFAULT_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+
+    def _connect(self):
+        if self.address.startswith("unix://"):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.address[len("unix://"):])
+            return sock
+        host, port = self.address.removeprefix("tcp://").rsplit(":", 1)
+        return socket.create_connection((host, int(port)), timeout=self.timeout)
+
+    def __call__(self, query):
+        with self._connect() as sock, sock.makefile("rwb") as f:
+            f.write((json.dumps({"query": query}, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            response = json.loads(f.readline())
+        if response.get("error"):
+            raise RuntimeError(f"normalize_query: {response['error']}")
+        return response["lemmas"]
+
+class InprocNormalizer:
+    """normalize_query.lemmatize в этом процессе (нижняя граница для демона)."""
+    stage = "lemmatize"
+
+    def __init__(self):
+        from normalize_query import lemmatize
+        self._lemmatize = lemmatize
+
+    def __call__(self, query):
+        return self._lemmatize(query)
+
+def make_normalizer(args):
+    if args.normalizer == "spawn":
+        return SpawnNormalizer(args.python, args.timeout)
+    if args.normalizer == "daemon":
+        if not args.address:
+            raise SystemExit("--normalizer daemon: нужен --address")
+        return DaemonNormalizer(args.address, args.timeout)
+    if args.normalizer == "inproc":
+        return InprocNormalizer()
+    return None
+
+# === РАСШИРЕНИЕ ===
+
+class Expander:
+    """Как QueryExpander::expandWithWeights: запрос с весом 1.0 + все синонимы из словаря."""
+
+    def __init__(self, synonyms_path):
+        from synonym_index import open_or_build
+        self.index = open_or_build(synonyms_path)
+
+    def __call__(self, query):
+        return [{"term": query, "weight": 1.0}] + [
+            {"term": term, "weight": float(weight)} for term, weight in self.index.get(query)
+        ]
+
+# === ПОИСКОВЫЕ БЭКЕНДЫ ===
+# Бэкенд — объект с методом search(строка поиска) → список _id найденных статей.
+
+class LocalTextBackend:
+    """
+    Замена MongoDB $text без сервера: TF-IDF по нормализованным статьям, по убыванию score.
+    _id статей — из хранилища корпуса (corpus_store.doc_id): и {"$oid": ...}
+    из mongoexport, и строка, как пишет build_normalized_articles.py.
+    """
+
+    def __init__(self, articles=None):
+        import corpus_store
+        store = corpus_store.open_or_build(articles or STORAGE_DIR / "normalized_articles.json")
+        self.ids = store.ids
+        self.tfidf = store.tfidf()
+
+    def search(self, search_string):
+        return [self.ids[i] for i in self.tfidf.search([search_string])[0]]
+
+class MongoBackend:
+    """Тот же конвейер $text, что в SearchController::search."""
+
+    def __init__(self, uri="mongodb://localhost:27017", db="scholar_db", collection="normalized_articles"):
+        try:
+            from pymongo import MongoClient
+        except ImportError:
+            raise SystemExit("--backend mongo: нужен pymongo (pip install pymongo)")
+        self.collection = MongoClient(uri)[db][collection]
+
+    def search(self, search_string):
+        pipeline = [
+            {"$match": {"$text": {"$search": search_string}}},
+            {"$addFields": {"score": {"$meta": "textScore"}}},
+            {"$sort": {"score": -1}},
+        ]
+        return [doc["_id"] for doc in self.collection.aggregate(pipeline)]
+
+class NullBackend:
+    def search(self, search_string):
+        return []
+
+BACKENDS = {
+    "local": LocalTextBackend,
+    "mongo": MongoBackend,
+    "none":  NullBackend,
+}
+
+def make_backend(name, options):
+    if name in BACKENDS:
+        cls = BACKENDS[name]
+    elif ":" in name:
+        module, attr = name.split(":", 1)
+        cls = getattr(importlib.import_module(module), attr)
+    else:
+        raise SystemExit(f"Неизвестный бэкенд: {name} (local, mongo, none или модуль:Класс)")
+    return cls(**options)
+
+# === ПРОИГРЫВАНИЕ ===
+
+def load_requests(path, limit=None):
+    """Запросы из выгрузки search_logs; флаги по умолчанию — как в контроллере."""
+    requests = []
+    for record in iter_records(path):
+        query = record.get("query")
+        if not query:
+            continue
+        requests.append({
+            "query": query,
+            "expanded": bool(record.get("expanded", False)),
+            "lemmas": bool(record.get("lemmas", True)),
+            "duration": record.get("duration"),
+        })
+        if limit and len(requests) >= limit:
+            break
+    return requests
+
+def run_request(request, expander, normalizer, backend):
+    """Один запрос путём SearchController::search; возвращает длительности стадий, сек."""
+    timings = {}
+    start = time.perf_counter()
+    try:
+        query = request["query"]
+        t = time.perf_counter()
+        terms = expander(query) if request["expanded"] else [{"term": query, "weight": 1.0}]
+        if request["expanded"]:
+            timings["expand"] = time.perf_counter() - t
+
+        raw_terms = [term["term"] for term in terms]
+        normalized = raw_terms
+        if request["lemmas"] and normalizer is not None:
+            t = time.perf_counter()
+            normalized = normalizer(" ".join(raw_terms))
+            timings[normalizer.stage] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        results = backend.search(" ".join(normalized))
+        timings["search"] = time.perf_counter() - t
+        error = None
+    except Exception as e:
+        # сообщения бывают многострочными (nltk) — в отчёт идёт одна строка
+        results, error = [], f"{type(e).__name__}: {' '.join(str(e).split())[:200]}"
+    return {"total": time.perf_counter() - start, "stages": timings,
+            "result_count": len(results), "error": error}
+
+def replay(requests, expander, normalizer, backend, concurrency, warmup=0):
+    """Проигрывает запросы в concurrency потоков; первые warmup не учитываются."""
+    for request in requests[:warmup]:
+        run_request(request, expander, normalizer, backend)
+    measured = requests[warmup:]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(lambda r: run_request(r, expander, normalizer, backend), measured))
+    return samples, time.perf_counter() - start
+
+# === ОТЧЁТ ===
+
+def latency_stats(seconds):
+    """p50/p95/p99, среднее и максимум в миллисекундах."""
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    stats = {"count": len(ms)}
+    if len(ms):
+        for p, v in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+            stats[f"p{p}"] = round(float(v), 3)
+        stats["mean"] = round(float(ms.mean()), 3)
+        stats["max"] = round(float(ms.max()), 3)
+    return stats
+
+def summarize(samples, wall, requests, concurrency):
+    ok = [s for s in samples if not s["error"]]
+    errors = [s["error"] for s in samples if s["error"]]
+    summary = {
+        "requests": len(samples),
+        "errors": len(errors),
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 2) if wall > 0 else 0.0,
+        "latency_ms": latency_stats([s["total"] for s in ok]),
+        "stages": {},
+    }
+    for stage in STAGES:
+        values = [s["stages"][stage] for s in ok if stage in s["stages"]]
+        if values:
+            summary["stages"][stage] = latency_stats(values)
+    logged = [r["duration"] for r in requests if isinstance(r.get("duration"), (int, float))]
+    if logged:
+        # duration из SearchLog — секунды, как здесь
+        summary["logged_duration_ms"] = latency_stats(logged)
+    if errors:
+        summary["first_errors"] = errors[:5]
+    return summary
+
+def print_report(summary):
+    print(f"Запросов: {summary['requests']}, ошибок: {summary['errors']}, "
+          f"параллельность: {summary['concurrency']}")
+    print(f"Время: {summary['wall_s']} с, пропускная способность: {summary['throughput_rps']} запр/с")
+    header = f"{'':<20}{'n':>7}" + "".join(f"{'p' + str(p):>10}" for p in PERCENTILES) + f"{'max':>10}"
+    print(header + "   (мс)")
+    rows = [("всего", summary["latency_ms"])]
+    rows += [(stage, stats) for stage, stats in summary["stages"].items()]
+    if "logged_duration_ms" in summary:
+        rows.append(("duration из лога", summary["logged_duration_ms"]))
+    for name, stats in rows:
+        if not stats["count"]:
+            continue
+        print(f"{name:<20}{stats['count']:>7}"
+              + "".join(f"{stats['p' + str(p)]:>10.1f}" for p in PERCENTILES)
+              + f"{stats['max']:>10.1f}")
+    for error in summary.get("first_errors", []):
+        print(f"  ошибка: {error}")
+
+def regressions(summary, baseline, tolerance):
+    """Сообщения о росте p95 (всего и по стадиям) больше чем на tolerance относительно baseline."""
+    pairs = [("всего", summary["latency_ms"], baseline.get("latency_ms", {}))]
+    pairs += [(stage, stats, baseline.get("stages", {}).get(stage, {}))
+              for stage, stats in summary["stages"].items()]
+    found = []
+    for name, now, before in pairs:
+        if "p95" in now and before.get("p95"):
+            growth = now["p95"] / before["p95"] - 1
+            if growth > tolerance and now["p95"] - before["p95"] >= MIN_REGRESSION_MS:
+                found.append(f"{name}: p95 {before['p95']:.1f} → {now['p95']:.1f} мс (+{growth:.0%})")
+    return found
+
+def parse_backend_args(items):
+    options = {}
+    for item in items:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--backend-arg: ожидается ключ=значение, получено {item!r}")
+        options[key.replace("-", "_")] = value
+    return options
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный тест поиска по выгрузке search_logs (JSON-массив или JSON Lines, .gz)."
+    )
+    parser.add_argument("search_logs", help="выгрузка коллекции search_logs")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="одновременных запросов")
+    parser.add_argument("--limit", type=int, help="взять не больше стольких запросов из лога")
+    parser.add_argument("--repeat", type=int, default=1, help="проиграть лог столько раз")
+    parser.add_argument("--warmup", type=int, default=0,
+                        help="первые запросы, не входящие в статистику (прогрев кэшей)")
+    parser.add_argument("--normalizer", choices=("spawn", "daemon", "inproc", "none"), default="spawn",
+                        help="как лемматизировать запросы с lemmas=true (по умолчанию — как без демона)")
+    parser.add_argument("--address", help="адрес демона normalize_query.py --serve (unix://… или tcp://…)")
+    parser.add_argument("--python", help="интерпретатор для --normalizer spawn (по умолчанию текущий)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="таймаут лемматизации одного запроса, сек")
+    parser.add_argument("--synonyms", default=str(STORAGE_DIR / "query_synonyms.json"),
+                        help="словарь синонимов для запросов с expanded=true")
+    parser.add_argument("--backend", default="local",
+                        help="поисковый бэкенд: local, mongo, none или модуль:Класс")
+    parser.add_argument("--backend-arg", action="append", default=[], metavar="KEY=VALUE",
+                        help="параметр конструктора бэкенда (например articles=… или uri=…)")
+    parser.add_argument("--json", metavar="FILE", help="сохранить отчёт в JSON (для --baseline)")
+    parser.add_argument("--baseline", metavar="FILE", help="отчёт прошлого прогона для сравнения")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION,
+                        help="допустимый рост p95 относительно --baseline (доля)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    requests = load_requests(args.search_logs, args.limit) * max(1, args.repeat)
+    if not requests:
+        print("В логе нет запросов.")
+        sys.exit()
+
+    expander = Expander(args.synonyms) if any(r["expanded"] for r in requests) else None
+    normalizer = make_normalizer(args)
+    backend = make_backend(args.backend, parse_backend_args(args.backend_arg))
+
+    concurrency = max(1, args.concurrency)
+    samples, wall = replay(requests, expander, normalizer, backend, concurrency, args.warmup)
+    summary = summarize(samples, wall, requests[args.warmup:], concurrency)
+    summary["normalizer"] = args.normalizer
+    summary["backend"] = args.backend
+    print_report(summary)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        found = regressions(summary, baseline, args.max_regression)
+        for message in found:
+            print(f"РЕГРЕССИЯ {message}")
+        if found:
+            sys.exit(1)
+        print(f"Регрессий относительно {args.baseline} нет (порог +{args.max_regression:.0%}).")
+
+if __name__ == "__main__":
+    main()
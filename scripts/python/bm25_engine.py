@@ -0,0 +1,437 @@
+"""
+Поиск BM25F по нормализованным статьям в процессе, с отсечением top-k (MaxScore).
+
+SearchController отправляет в MongoDB один $text-запрос без $limit,
+сортирует все совпадения по textScore и не учитывает веса синонимов из
+QueryExpander. Здесь — компактный инвертированный индекс по полям
+title/abstract/tags и оценка BM25F: частоты термина в полях складываются
+с весами полей (как WEIGHTS в evaluate_search_1.py) и нормировкой длины
+поля, а вклад термина умножается на его вес из расширения запроса.
+
+Индекс (каталог; обычно bm25/ внутри corpus_store, ключ — хэш корпуса):
+    meta.json              — поля, веса, k1, b, средние длины, число статей
+    vocab.{bin,off.npy}    — токены
+    ptr.npy                — CSR: начало списка статей токена
+    docs.npy               — номера статей (int32, по возрастанию в списке)
+    impact.npy             — насыщенная BM25F-частота tf~/(k1 + tf~) (float32)
+    idf.npy, max_impact.npy
+
+Вклад токена в оценку статьи — вес запроса × idf × impact, поэтому верхняя
+граница вклада известна заранее (вес × idf × max_impact). Поиск top-k —
+MaxScore «термин за термином» на numpy: токены идут по убыванию границы;
+как только сумма границ оставшихся токенов меньше k-й текущей оценки,
+новые статьи в топ попасть не могут — дальше обновляются только
+кандидаты, а кандидаты без шанса догнать k-ю оценку отбрасываются.
+Результат тот же, что у полного перебора.
+
+Сервер для PHP (HTTP, JSON):
+    python bm25_engine.py --serve --port 8766 --articles normalized_articles.json \\
+        --synonyms query_synonyms.json
+    GET /search?q=...&expand=1&lemmas=1&k=100
+      → {"query", "expanded_terms": [{"term", "weight"}], "normalized_terms",
+         "results": [{"id", "score"}], "took_ms", "cached"}
+    GET /stats → счётчики кэша результатов (query_cache.py), поколение данных,
+                 число перезагрузок
+
+Когда стадии нормализации и синонимов увеличивают поколение данных поиска,
+сервер заново открывает хранилище корпуса и синонимы (без перезапуска).
+Повторные запросы отдаются из кэша результатов (--cache-mb, --cache-ttl;
+--cache-mb 0 — без кэша); он сбрасывается после перезагрузки данных.
+"""
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+from query_cache import (QueryCache, CachedResult, query_key, read_generation, generation_stamp,
+                         DEFAULT_MEMORY_MB, DEFAULT_TTL)
+
+WEIGHTS = {"title": 3, "abstract": 2, "tags": 1}   # как в evaluate_search_1.py
+K1 = 1.2
+B = 0.75
+DEFAULT_K = 100
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8766
+PRUNE_SLACK = 1e-9   # запас на ошибки округления при сравнении с границами
+
+TOKEN_RE = re.compile(r"[a-zа-яё0-9]+(?:-[a-zа-яё0-9]+)*")
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+def field_tokens(doc, field):
+    value = doc.get(field, "")
+    return tokenize(" ".join(value) if isinstance(value, list) else value)
+
+# === ПОСТРОЕНИЕ ===
+
+def build(articles, out_dir, weights=WEIGHTS, k1=K1, b=B):
+    """Индекс BM25F для списка статей в каталоге out_dir."""
+    fields = list(weights)
+    n_docs = len(articles)
+
+    vocab = {}
+    terms, docs, field_ids, counts = [], [], [], []
+    lengths = np.zeros((n_docs, len(fields)), dtype=np.float64)
+    for d, doc in enumerate(articles):
+        for f, field in enumerate(fields):
+            tokens = field_tokens(doc, field)
+            lengths[d, f] = len(tokens)
+            for token, c in Counter(tokens).items():
+                terms.append(vocab.setdefault(token, len(vocab)))
+                docs.append(d)
+                field_ids.append(f)
+                counts.append(c)
+
+    write_index(out_dir, sorted(vocab, key=vocab.get), np.asarray(terms, dtype=np.int64),
+                np.asarray(docs, dtype=np.int64), np.asarray(field_ids, dtype=np.int64),
+                np.asarray(counts, dtype=np.int64), lengths, weights, k1, b)
+
+def build_from_stream(stream, out_dir, weights=WEIGHTS, k1=K1, b=B):
+    """
+    То же, что build, по потоку токенов (token_stream.py): TOKEN_RE
+    применяется к словарю потока, частоты считаются на номерах терминов.
+    """
+    fields = list(weights)
+    n_docs = stream.n_docs
+    analyzer = stream.analyzer(tokenize)
+    width = max(n_docs, 1)
+
+    terms, docs, field_ids, counts = [], [], [], []
+    lengths = np.zeros((n_docs, len(fields)), dtype=np.float64)
+    for f, field in enumerate(fields):
+        ids, offsets = analyzer.apply(stream.tokens(field), stream.doc_offsets(field))
+        lengths[:, f] = np.diff(offsets)
+        owner = np.repeat(np.arange(n_docs, dtype=np.int64), np.diff(offsets))
+        keys, c = np.unique(ids * width + owner, return_counts=True)
+        terms.append(keys // width)
+        docs.append(keys % width)
+        field_ids.append(np.full(len(keys), f, dtype=np.int64))
+        counts.append(c)
+
+    write_index(out_dir, analyzer.terms, np.concatenate(terms), np.concatenate(docs),
+                np.concatenate(field_ids), np.concatenate(counts), lengths, weights, k1, b)
+
+def write_index(out_dir, vocab, terms, docs, field_ids, counts, lengths, weights, k1, b):
+    """
+    Пишет индекс по частотам: vocab — токены по номерам; terms, docs,
+    field_ids, counts — по записи на (токен, статья, поле); lengths — длины полей.
+    """
+    from corpus_store import write_strings
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    fields = list(weights)
+    n_docs = len(lengths)
+
+    # (токен, статья) → частоты по полям; np.unique сортирует по токену, затем по статье
+    keys, inverse = np.unique(terms * max(n_docs, 1) + docs, return_inverse=True)
+    tf = np.zeros((len(keys), len(fields)), dtype=np.float64)
+    np.add.at(tf, (inverse, field_ids), counts)
+    post_terms, post_docs = keys // max(n_docs, 1), keys % max(n_docs, 1)
+
+    avg = lengths.mean(axis=0) if n_docs else np.ones(len(fields))
+    avg[avg == 0] = 1.0
+    norm = 1 - b + b * lengths[post_docs] / avg
+    tf_tilde = (tf * np.array([weights[f] for f in fields], dtype=np.float64) / norm).sum(axis=1)
+    impact = (tf_tilde / (k1 + tf_tilde)).astype(np.float32)
+
+    ptr = np.searchsorted(post_terms, np.arange(len(vocab) + 1)).astype(np.int64)
+    df = np.diff(ptr)
+    idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+    # верхняя граница вклада токена для MaxScore; у токена без постингов — 0
+    # (reduceat по пустому отрезку вернул бы значение соседа)
+    max_impact = np.zeros(len(vocab), dtype=np.float32)
+    nonempty = df > 0
+    if nonempty.any():
+        max_impact[nonempty] = np.maximum.reduceat(impact, ptr[:-1][nonempty])
+
+    write_strings(out_dir / "vocab", vocab)
+    np.save(out_dir / "ptr.npy", ptr)
+    np.save(out_dir / "docs.npy", post_docs.astype(np.int32))
+    np.save(out_dir / "impact.npy", impact)
+    np.save(out_dir / "idf.npy", idf)
+    np.save(out_dir / "max_impact.npy", max_impact)
+    meta = {"n_docs": n_docs, "fields": fields, "weights": weights, "k1": k1, "b": b,
+            "avg_lengths": [round(float(a), 4) for a in avg], "n_postings": int(len(post_docs))}
+    (out_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
+# === ПОИСК ===
+
+class BM25Engine:
+    """Индекс из каталога build(); массивы открыты через mmap."""
+
+    def __init__(self, path):
+        from corpus_store import StringColumn
+
+        path = Path(path)
+        self.meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        self.n_docs = self.meta["n_docs"]
+        self.vocab = {t: i for i, t in enumerate(StringColumn(path / "vocab"))}
+        self.ptr = np.load(path / "ptr.npy", mmap_mode="r")
+        self.docs = np.load(path / "docs.npy", mmap_mode="r")
+        self.impact = np.load(path / "impact.npy", mmap_mode="r")
+        self.idf = np.load(path / "idf.npy", mmap_mode="r")
+        self.max_impact = np.load(path / "max_impact.npy", mmap_mode="r")
+
+    def query_weights(self, terms):
+        """[(термин, вес)] → {номер токена: вес}; токен из нескольких терминов берёт больший вес."""
+        weights = {}
+        for text, w in terms:
+            for token in tokenize(text):
+                tid = self.vocab.get(token)
+                if tid is not None and w > 0:
+                    weights[tid] = max(weights.get(tid, 0.0), float(w))
+        return weights
+
+    def search(self, terms, k=DEFAULT_K):
+        """
+        terms — [(термин, вес)] (уже нормализованные) или строка (вес 1.0).
+        Возвращает [(номер статьи, оценка)] по убыванию оценки, при равенстве —
+        по номеру; k=None — все статьи с положительной оценкой.
+        """
+        if isinstance(terms, str):
+            terms = [(terms, 1.0)]
+        if k is not None and k <= 0:
+            return []
+        query = []
+        for tid, w in self.query_weights(terms).items():
+            factor = w * float(self.idf[tid])
+            query.append((factor * float(self.max_impact[tid]), factor, tid))
+        query.sort(key=lambda x: (-x[0], x[2]))
+        # сумма границ токенов после текущего (у последнего — ровно 0)
+        remaining = np.cumsum([ub for ub, _, _ in query][::-1])[::-1].tolist()[1:] + [0.0]
+
+        acc = np.zeros(self.n_docs, dtype=np.float64)
+        touched = np.empty(0, dtype=np.int64)
+        candidates = None   # None — новые статьи ещё могут попасть в top-k
+        for (ub, factor, tid), rest in zip(query, remaining):
+            lo, hi = self.ptr[tid], self.ptr[tid + 1]
+            docs = self.docs[lo:hi]
+            contrib = np.multiply(self.impact[lo:hi], factor, dtype=np.float64)
+            if candidates is None:
+                acc[docs] += contrib
+                if k is None:
+                    continue
+                touched = np.union1d(touched, docs)
+                if len(touched) > k:
+                    theta = np.partition(acc[touched], len(touched) - k)[len(touched) - k]
+                    if rest + PRUNE_SLACK < theta:
+                        candidates = touched[acc[touched] + rest + PRUNE_SLACK >= theta]
+            else:
+                pos = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+                hit = docs[pos] == candidates
+                acc[candidates[hit]] += contrib[pos[hit]]
+                if len(candidates) > k:
+                    theta = np.partition(acc[candidates], len(candidates) - k)[len(candidates) - k]
+                    candidates = candidates[acc[candidates] + rest + PRUNE_SLACK >= theta]
+
+        found = np.flatnonzero(acc > 0) if candidates is None else candidates[acc[candidates] > 0]
+        order = np.lexsort((found, -acc[found]))
+        if k is not None:
+            order = order[:k]
+        return [(int(found[i]), float(acc[found[i]])) for i in order]
+
+# === СЕРВЕР ===
+
+class SearchData:
+    """Данные поиска одного поколения: _id статей, индекс BM25F, синонимы."""
+
+    def __init__(self, articles_path, synonyms_path, generation):
+        import corpus_store
+        store = corpus_store.open_or_build(articles_path)
+        self.ids = store.ids
+        self.engine = store.bm25()
+        self.synonyms = None
+        if synonyms_path:
+            from synonym_index import open_or_build
+            self.synonyms = open_or_build(synonyms_path)
+        self.generation = generation
+
+class SearchService:
+    """
+    Расширение запроса, лемматизация по терминам (веса сохраняются) и поиск.
+    Когда стадии нормализации и синонимов увеличивают поколение данных
+    (query_cache.py), хранилище корпуса и синонимы открываются заново,
+    и только потом сбрасывается кэш результатов.
+    """
+
+    def __init__(self, articles_path, synonyms_path=None, cache=None, generation_file=None):
+        self.articles_path = articles_path
+        self.synonyms_path = synonyms_path
+        self.generation_file = generation_file
+        self._stamp = generation_stamp(generation_file)
+        self.data = SearchData(articles_path, synonyms_path, read_generation(generation_file))
+        self.cache = cache
+        if cache is not None:
+            cache.clear(self.data.generation)
+        self.reloads = 0
+        self._reload_lock = threading.Lock()
+        self._lemmatize = None
+
+    def refresh(self):
+        """
+        Перезагружает данные, если файл поколения изменился. Перезагружает
+        один поток, остальные тем временем отвечают по прежним данным. Если
+        новые данные не открылись, поиск идёт по прежним, а попытка
+        повторяется со следующим запросом.
+        """
+        stamp = generation_stamp(self.generation_file)
+        if stamp == self._stamp or not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            if stamp == self._stamp:
+                return
+            record = read_generation(self.generation_file)
+            if record != self.data.generation:
+                try:
+                    data = SearchData(self.articles_path, self.synonyms_path, record)
+                except Exception as e:
+                    print(f"bm25_engine: данные поколения {record.get('generation')} не открылись, "
+                          f"поиск по прежним: {e}", file=sys.stderr, flush=True)
+                    return
+                self.data = data
+                self.reloads += 1
+                if self.cache is not None:
+                    self.cache.clear(record)
+            self._stamp = stamp
+        finally:
+            self._reload_lock.release()
+
+    def lemmatize(self, term):
+        if self._lemmatize is None:
+            from normalize_query import lemmatize
+            self._lemmatize = lemmatize
+        return " ".join(self._lemmatize(term))
+
+    def search(self, query, expand=False, lemmas=True, k=DEFAULT_K):
+        start = time.perf_counter()
+        self.refresh()
+        data = self.data   # весь запрос — по одному поколению, даже если его сменят
+        key = query_key(query, expand, lemmas, k)
+        cached = self.cache.get(key, data.generation) if self.cache is not None else None
+        hit = cached is not None
+        if not hit:
+            cached = self._compute(data, query, expand, lemmas, k)
+            if self.cache is not None:
+                self.cache.put(key, cached, data.generation)
+        normalized = list(cached.normalized)
+        if not lemmas:
+            normalized[0] = query.lower()   # ключ без лишних пробелов, а термин — как в запросе
+        return {
+            "query": query,
+            "expanded_terms": [{"term": query, "weight": 1.0}]
+                              + [{"term": t, "weight": w} for t, w in cached.expanded],
+            "normalized_terms": normalized,
+            "results": [{"id": data.ids[d], "score": round(s, 6)}
+                        for d, s in zip(cached.docs.tolist(), cached.scores.tolist())],
+            "took_ms": round((time.perf_counter() - start) * 1000, 3),
+            "cached": hit,
+        }
+
+    def _compute(self, data, query, expand, lemmas, k):
+        expanded = [(query, 1.0)]
+        if expand and data.synonyms is not None:
+            expanded += [(t, float(w)) for t, w in data.synonyms.get(query)]
+        terms = [(self.lemmatize(t) if lemmas else t.lower(), w) for t, w in expanded]
+        hits = data.engine.search(terms, k)
+        return CachedResult(expanded[1:], [t for t, _ in terms],
+                            np.array([d for d, _ in hits], dtype=np.int32),
+                            np.array([s for _, s in hits], dtype=np.float64))
+
+def _flag(params, name, default):
+    value = params.get(name, [None])[0]
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+class SearchHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == "/health":
+            return self._send(200, {"status": "ok", "n_docs": self.server.service.data.engine.n_docs})
+        if url.path == "/stats":
+            service = self.server.service
+            return self._send(200, {"cache": service.cache.stats() if service.cache is not None else None,
+                                    "generation": service.data.generation.get("generation"),
+                                    "reloads": service.reloads})
+        if url.path != "/search":
+            return self._send(404, {"error": "not found"})
+        query = params.get("q", [""])[0]
+        if not query:
+            return self._send(400, {"error": "Missing query"})
+        try:
+            k = int(params.get("k", [DEFAULT_K])[0])
+            result = self.server.service.search(query, _flag(params, "expand", False),
+                                                _flag(params, "lemmas", True), k if k > 0 else None)
+        except Exception as e:
+            return self._send(500, {"error": str(e)})
+        self._send(200, result)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass   # без строки в stderr на каждый запрос
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Поиск BM25F по нормализованным статьям.")
+    parser.add_argument("--articles", required=True, help="нормализованные статьи (JSON)")
+    parser.add_argument("--synonyms", help="query_synonyms.json для expand=1")
+    parser.add_argument("--serve", action="store_true", help="запустить HTTP-сервер")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--query", help="без --serve: один запрос, ответ в stdout")
+    parser.add_argument("--expand", action="store_true")
+    parser.add_argument("--no-lemmas", action="store_true")
+    parser.add_argument("-k", type=int, default=DEFAULT_K)
+    parser.add_argument("--cache-mb", type=float, default=DEFAULT_MEMORY_MB,
+                        help="память под кэш результатов, МБ (0 — без кэша)")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL,
+                        help="время жизни записи кэша, сек")
+    parser.add_argument("--generation-file",
+                        help="файл поколения данных поиска: при его смене данные "
+                             "перечитываются (см. query_cache.py)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    cache = None
+    if args.serve and args.cache_mb > 0:
+        cache = QueryCache(args.cache_mb, args.cache_ttl)
+    service = SearchService(args.articles, args.synonyms, cache, args.generation_file)
+    if not args.serve:
+        if not args.query:
+            raise SystemExit("нужен --query или --serve")
+        result = service.search(args.query, args.expand, not args.no_lemmas, args.k)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    server = ThreadingHTTPServer((args.host, args.port), SearchHandler)
+    server.daemon_threads = True
+    server.service = service
+    print(f"bm25_engine: слушаем http://{args.host}:{server.server_address[1]}", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
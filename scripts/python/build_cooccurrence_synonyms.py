@@ -0,0 +1,325 @@
+"""
+Синонимы по совместной встречаемости слов в заголовках и аннотациях.
+
+В отличие от build_synonyms.py (только теги), здесь источник — весь текст
+нормализованных статей. Два потоковых прохода по файлу (или по потоку
+токенов рядом с ним, см. token_stream.py):
+  1. документная частота слов → словарь (редкие слова и слишком частые,
+     по сути стоп-слова, отбрасываются; размер ограничен --max-vocab);
+  2. пары слов в окне --window → счётчики пар.
+
+Счётчики копятся в буфере фиксированного размера (--memory-mb); при
+переполнении буфер сворачивается (уникальные пары + суммы) и сбрасывается
+на диск, разбитый по строкам на --partitions частей. В конце каждая часть
+сворачивается отдельно, так что в памяти одновременно только одна часть.
+
+Вес пары — положительный NPMI (нормированная PMI, от 0 до 1), результат —
+в том же формате [термин, вес], что и query_synonyms.json.
+"""
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+from collections import Counter
+
+import numpy as np
+
+import token_stream
+from jsonstream import iter_records
+from synonym_index import build_index, index_path
+from query_cache import bump_generation
+from topk_similarity import topk_pairs
+
+TOP_N = 5             # Количество ближайших синонимов
+MIN_SCORE = 0.1       # Порог минимального веса для включения
+
+DEFAULT_WINDOW = 5
+DEFAULT_MIN_COUNT = 5        # минимум документов со словом
+DEFAULT_MAX_DF = 0.3         # слова из большей доли документов — стоп-слова
+DEFAULT_MAX_VOCAB = 50000
+DEFAULT_MIN_PAIR_COUNT = 3   # редкие пары дают завышенную PMI
+DEFAULT_MEMORY_MB = 256
+DEFAULT_PARTITIONS = 16
+BATCH_DOCS = 1000            # статей в одной векторной обработке
+
+# Очистка текста
+def clean(text):
+    return re.sub(r"[^a-zA-Zа-яА-Я0-9ёЁ\s\-]", " ", text.lower())
+
+def words_of(text):
+    return [w for w in clean(text).split() if len(w) > 1 and not w.strip("-").isdigit()]
+
+def tokens(article):
+    return words_of(f"{article.get('title', '')} {article.get('abstract', '')}")
+
+def select_words(df, n_docs, min_count, max_df, max_vocab):
+    """Словарь по документной частоте (слово → число статей): по убыванию частоты."""
+    limit = max_df * n_docs
+    words = [w for w, c in df.items() if min_count <= c <= limit]
+    words.sort(key=lambda w: (-df[w], w))
+    return words[:max_vocab]
+
+def build_vocab(path, min_count, max_df, max_vocab):
+    """Проход 1: документная частота → список слов (по убыванию частоты)."""
+    df = Counter()
+    n_docs = 0
+    for article in iter_records(path):
+        df.update(set(tokens(article)))
+        n_docs += 1
+    return select_words(df, n_docs, min_count, max_df, max_vocab), n_docs
+
+# === ПО ПОТОКУ ТОКЕНОВ ===
+# Если build_normalized_articles.py оставил рядом с файлом поток токенов
+# (token_stream.py), оба прохода идут по нему: JSON не разбирается, clean()
+# и фильтр слов применяются один раз на токен словаря.
+
+def stream_batches(stream, analyzer):
+    """
+    Пачки по BATCH_DOCS статей: (номера слов analyzer, номера статей) —
+    слова title, затем abstract каждой статьи, как в tokens().
+    """
+    fields = ("title", "abstract")
+    columns = {f: (stream.tokens(f), stream.doc_offsets(f)) for f in fields}
+    for start in range(0, stream.n_docs, BATCH_DOCS):
+        stop = min(start + BATCH_DOCS, stream.n_docs)
+        ids, docs = [], []
+        for f in fields:
+            field_tokens, offsets = columns[f]
+            o = np.asarray(offsets[start:stop + 1])
+            terms, bounds = analyzer.apply(field_tokens[o[0]:o[-1]], o - o[0])
+            ids.append(terms)
+            docs.append(np.repeat(np.arange(start, stop, dtype=np.int64), np.diff(bounds)))
+        ids, docs = np.concatenate(ids), np.concatenate(docs)
+        order = np.argsort(docs, kind="stable")
+        yield ids[order], docs[order]
+
+def build_vocab_stream(stream, min_count, max_df, max_vocab):
+    """Проход 1 по потоку токенов: то же, что build_vocab."""
+    analyzer = stream.analyzer(words_of)
+    df = np.zeros(len(analyzer.terms), dtype=np.int64)
+    for ids, docs in stream_batches(stream, analyzer):
+        df += np.bincount(np.unique(docs * len(df) + ids) % max(len(df), 1), minlength=len(df))
+    df = {analyzer.terms[t]: c for t, c in enumerate(df.tolist()) if c}
+    return select_words(df, stream.n_docs, min_count, max_df, max_vocab), stream.n_docs
+
+def count_pairs_stream(stream, index, window, counter):
+    """Проход 2 по потоку токенов: то же, что count_pairs."""
+    analyzer = stream.analyzer(words_of)
+    lookup = np.fromiter((index.get(t, -1) for t in analyzer.terms), dtype=np.int64, count=len(analyzer.terms))
+    for n, (ids, docs) in enumerate(stream_batches(stream, analyzer), start=1):
+        j = lookup[ids]
+        keep = j >= 0
+        counter.add(*window_pairs(j[keep], docs[keep], window))
+        if n % 10 == 0:
+            print(f"Обработано статей: {n * BATCH_DOCS}")
+
+def window_pairs(ids, doc, window):
+    """Пары (i, j) слов одной статьи на расстоянии до window, в обе стороны."""
+    left, right = [], []
+    for d in range(1, window + 1):
+        same = (doc[d:] == doc[:-d]) & (ids[d:] != ids[:-d])
+        a, b = ids[:-d][same], ids[d:][same]
+        left += [a, b]
+        right += [b, a]
+    if not left:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(left), np.concatenate(right)
+
+class PairCounter:
+    """
+    Счётчик пар с ограничением памяти. Пара кодируется ключом i * V + j;
+    буфер ключей при заполнении сворачивается и пишется на диск по частям
+    (часть = i % partitions), поэтому строка матрицы целиком лежит в одной части.
+    """
+
+    def __init__(self, vocab_size, memory_mb, partitions, tmp_dir):
+        self.V = vocab_size
+        self.partitions = partitions
+        # ключ int64 + место под сортировку/np.unique при сворачивании
+        self.capacity = max(1 << 16, memory_mb * (1 << 20) // 32)
+        self.buffer = np.empty(self.capacity, dtype=np.int64)
+        self.size = 0
+        self.marginals = np.zeros(vocab_size, dtype=np.int64)
+        self.spill_dir = tempfile.mkdtemp(prefix="cooc-", dir=tmp_dir)
+        self.spills = 0
+
+    def add(self, I, J):
+        self.marginals += np.bincount(I, minlength=self.V)
+        keys = I * self.V + J
+        pos = 0
+        while pos < len(keys):
+            n = min(len(keys) - pos, self.capacity - self.size)
+            self.buffer[self.size:self.size + n] = keys[pos:pos + n]
+            self.size += n
+            pos += n
+            if self.size == self.capacity:
+                self.spill()
+
+    def spill(self):
+        if self.size == 0:
+            return
+        keys, counts = np.unique(self.buffer[:self.size], return_counts=True)
+        part = (keys // self.V) % self.partitions
+        order = np.argsort(part, kind="stable")
+        keys, counts, part = keys[order], counts[order], part[order]
+        bounds = np.searchsorted(part, np.arange(self.partitions + 1))
+        for p in range(self.partitions):
+            lo, hi = bounds[p], bounds[p + 1]
+            if lo < hi:
+                np.save(self._path(p, "keys"), keys[lo:hi])
+                np.save(self._path(p, "counts"), counts[lo:hi].astype(np.uint32))
+        self.spills += 1
+        self.size = 0
+
+    def _path(self, p, kind, spill=None):
+        spill = self.spills if spill is None else spill
+        return os.path.join(self.spill_dir, f"{p:03d}-{spill:05d}-{kind}.npy")
+
+    def partitions_iter(self):
+        """Свёрнутые части: (I, J, counts) для всех строк i ≡ p по модулю partitions."""
+        self.spill()
+        for p in range(self.partitions):
+            keys, counts = [], []
+            for s in range(self.spills):
+                path = self._path(p, "keys", s)
+                if os.path.exists(path):
+                    keys.append(np.load(path))
+                    counts.append(np.load(self._path(p, "counts", s)))
+                    os.remove(path)
+                    os.remove(self._path(p, "counts", s))
+            if not keys:
+                continue
+            keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+            counts = np.bincount(inverse, weights=np.concatenate(counts)).astype(np.int64)
+            yield keys // self.V, keys % self.V, counts
+
+    def close(self):
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+def count_pairs(path, index, window, counter):
+    """Проход 2: пары слов в окне по всем статьям, пачками по BATCH_DOCS."""
+    ids, doc = [], []
+    n_docs = 0
+    for article in iter_records(path):
+        for w in tokens(article):
+            j = index.get(w)
+            if j is not None:
+                ids.append(j)
+                doc.append(n_docs)
+        n_docs += 1
+        if n_docs % BATCH_DOCS == 0:
+            counter.add(*window_pairs(np.array(ids, dtype=np.int64), np.array(doc), window))
+            ids, doc = [], []
+            if n_docs % (BATCH_DOCS * 10) == 0:
+                print(f"Обработано статей: {n_docs}")
+    if ids:
+        counter.add(*window_pairs(np.array(ids, dtype=np.int64), np.array(doc), window))
+
+def npmi(I, J, counts, marginals, total):
+    """Положительная нормированная PMI: log(p_ij / (p_i p_j)) / -log(p_ij), обрезанная снизу нулём."""
+    p_ij = counts / total
+    pmi = np.log(p_ij) - np.log(marginals[I] / total) - np.log(marginals[J] / total)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = pmi / -np.log(p_ij)
+    return np.nan_to_num(np.maximum(score, 0.0))
+
+def merge_dictionaries(base, extra, top_n):
+    """Объединение со словарём тегов: общий ключ — максимум весов, top_n лучших."""
+    result = dict(base)
+    for term, synonyms in extra.items():
+        weights = {t: w for t, w in result.get(term, [])}
+        for t, w in synonyms:
+            weights[t] = max(w, weights.get(t, 0.0))
+        result[term] = sorted(([t, w] for t, w in weights.items()),
+                              key=lambda tw: (-tw[1], tw[0]))[:top_n]
+    return result
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="build_cooccurrence_synonyms.py <input_file> <output_file> [--merge query_synonyms.json]",
+        description="Вход — нормализованные статьи (JSON-массив или JSON Lines, .gz)."
+    )
+    parser.add_argument("input_file")
+    parser.add_argument("output_file")
+    parser.add_argument("--merge", metavar="FILE",
+                        help="словарь синонимов тегов (build_synonyms.py), с которым объединить результат")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                        help="окно совместной встречаемости, слов")
+    parser.add_argument("--min-count", type=int, default=DEFAULT_MIN_COUNT,
+                        help="минимум статей, где встречается слово")
+    parser.add_argument("--max-df", type=float, default=DEFAULT_MAX_DF,
+                        help="максимальная доля статей со словом (отсечение стоп-слов)")
+    parser.add_argument("--max-vocab", type=int, default=DEFAULT_MAX_VOCAB,
+                        help="максимальный размер словаря")
+    parser.add_argument("--min-pair-count", type=int, default=DEFAULT_MIN_PAIR_COUNT,
+                        help="минимум совместных появлений пары")
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_MB,
+                        help="память под буфер счётчиков пар, МБ")
+    parser.add_argument("--partitions", type=int, default=DEFAULT_PARTITIONS,
+                        help="частей, на которые делятся сброшенные на диск счётчики")
+    parser.add_argument("--tmp-dir", help="каталог для временных файлов (по умолчанию системный)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    stream = token_stream.open_for(args.input_file)
+    if stream is not None:
+        print(f"Поток токенов: {stream.path}")
+        words, n_docs = build_vocab_stream(stream, args.min_count, args.max_df, args.max_vocab)
+    else:
+        words, n_docs = build_vocab(args.input_file, args.min_count, args.max_df, args.max_vocab)
+    if not words:
+        print("Нет слов для анализа. Проверь входной файл и пороги --min-count/--max-df.")
+        sys.exit()
+    print(f"Статей: {n_docs}, слов в словаре: {len(words)}")
+
+    index = {w: i for i, w in enumerate(words)}
+    counter = PairCounter(len(words), args.memory_mb, max(1, args.partitions), args.tmp_dir)
+    result = {}
+    try:
+        if stream is not None:
+            count_pairs_stream(stream, index, args.window, counter)
+        else:
+            count_pairs(args.input_file, index, args.window, counter)
+        total = counter.marginals.sum()
+        print(f"Пар в окне: {total}, сбросов на диск: {counter.spills}")
+
+        for I, J, counts in counter.partitions_iter():
+            keep = counts >= args.min_pair_count
+            I, J, counts = I[keep], J[keep], counts[keep]
+            scores = npmi(I, J, counts, counter.marginals, total)
+            I, J, scores = topk_pairs(I, J, scores, len(words), TOP_N, MIN_SCORE)
+            bounds = np.flatnonzero(np.diff(I)) + 1
+            for rows, cols, vals in zip(np.split(I, bounds), np.split(J, bounds), np.split(scores, bounds)):
+                if len(rows):
+                    result[words[rows[0]]] = [[words[j], round(float(s), 4)] for j, s in zip(cols, vals)]
+    finally:
+        counter.close()
+
+    # порядок ключей — как в словаре (по частоте), а не по частям
+    result = {w: result[w] for w in words if w in result}
+    print(f"Синонимы найдены для {len(result)} слов")
+
+    if args.merge:
+        with open(args.merge, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        result = merge_dictionaries(base, result, TOP_N)
+        print(f"Объединено со словарём {args.merge}: {len(result)} ключей")
+
+    # Сохранение результата
+    with open(args.output_file, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=4)
+
+    # Бинарный индекс для быстрого поиска по ключу (QueryExpander, оценка поиска)
+    build_index(result, index_path(args.output_file))
+    # словарь синонимов изменился — кэши результатов (query_cache.py) сбрасываются
+    bump_generation("build_cooccurrence_synonyms.py")
+
+    print(f"Готово! Словарь синонимов сохранён в {args.output_file}")
+
+if __name__ == "__main__":
+    main()
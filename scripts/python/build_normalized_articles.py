@@ -1,59 +1,275 @@
-import sys
+import os
 import json
-import re
+import sqlite3
+import hashlib
+import argparse
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+import pymorphy3
 from pymorphy3 import MorphAnalyzer
+from lemma_cache import morph_lemma_cache
+from tokenizer import Tokenizer
+from jsonstream import iter_records, RecordWriter
+from token_stream import TokenStreamWriter, tokens_path
+from query_cache import bump_generation
 
-if len(sys.argv) < 3:
-    print("Usage: build_normalized_articles.py <input_file> <output_file>")
-    sys.exit(1)
+DEFAULT_CHUNK_SIZE = 200   # статей в одной задаче для пула процессов
+CHECKPOINT_EVERY = 500     # как часто фиксировать состояние (статей)
 
-INPUT_FILE = sys.argv[1]
-OUTPUT_FILE = sys.argv[2]
+# Меняется при любом изменении логики нормализации: все статьи пересчитаются
+NORMALIZER_VERSION = f"1/pymorphy3-{pymorphy3.__version__}"
 
-morph = MorphAnalyzer()
+# Анализатор и кэш создаются в каждом процессе отдельно (см. init_worker)
+morph = None
+morph_lemmas = None
+tokenizer = None
 
-def clean(text):
-    return re.sub(r"[^\w\s\-]", "", text.lower())
+def init_worker():
+    global morph, morph_lemmas, tokenizer
+    morph = MorphAnalyzer()
+    morph_lemmas = morph_lemma_cache(morph, threshold=0.3)
+    # pymorphy3 — только для токенов с кириллицей; остальные он и так не меняет
+    tokenizer = Tokenizer(ru=morph_lemmas.get)
 
 def lemmatize(text):
-    words = clean(text).split()
-    lemmas = []
-    for word in words:
-        parsed = morph.parse(word)
-        if parsed and parsed[0].score > 0.3:
-            lemmas.append(parsed[0].normal_form)
-        else:
-            lemmas.append(word)
-    return " ".join(lemmas)
-
-with open(INPUT_FILE, "r", encoding="utf-8") as f:
-    raw_articles = json.load(f)
-
-normalized = []
-total = len(raw_articles)
-print(f"Начата обработка {total} статей...\n")
-
-for i, article in enumerate(raw_articles, start=1):
+    return " ".join(tokenizer.lemmas(text))
+
+def valid_id(article):
+    art_id = article.get("id")
+    return art_id if art_id and isinstance(art_id, str) and len(art_id) == 24 else None
+
+def normalize_article(article):
+    """Возвращает нормализованную статью или None, если у неё нет корректного id."""
+    # Главная фича — корректный _id!
+    art_id = valid_id(article)
+    if art_id is None:
+        # Если нет id или id некорректный, лучше пропустить
+        return None
+
     normalized_article = dict(article)
     normalized_article["title"] = lemmatize(article.get("title", ""))
     normalized_article["abstract"] = lemmatize(article.get("abstract", ""))
     normalized_article["tags"] = [lemmatize(tag) for tag in article.get("tags", [])]
     if "categories" in article:
         normalized_article["categories"] = [lemmatize(cat) for cat in article.get("categories", [])]
+    normalized_article["_id"] = art_id
+    return normalized_article
 
-    # Главная фича — корректный _id!
-    art_id = article.get("id")
-    if art_id and isinstance(art_id, str) and len(art_id) == 24:
-        normalized_article["_id"] = art_id
-    else:
-        # Если нет id или id некорректный, лучше пропустить
-        continue
+def normalize_chunk(chunk):
+    """Задача для пула: нормализует пачку статей, отдаёт ещё и статистику кэша воркера."""
+    results = [normalize_article(a) for a in chunk]
+    # воркеры пула завершаются без atexit: новые леммы — на диск сейчас
+    morph_lemmas.flush()
+    return results, os.getpid(), morph_lemmas.stats()
+
+def iter_chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+def normalize_all(raw_articles, workers, chunk_size, cache_stats):
+    """
+    Нормализует статьи по порядку: None для пропущенных, иначе статья.
+    raw_articles может быть генератором (потоковое чтение файла).
+
+    При workers > 1 пачки уходят в пул процессов (по MorphAnalyzer на воркер).
+    В работе одновременно не больше 2*workers пачек, результаты отдаются
+    в исходном порядке — память не растёт с размером корпуса.
+    """
+    if workers <= 1:
+        init_worker()
+        for article in raw_articles:
+            yield normalize_article(article)
+        cache_stats[os.getpid()] = morph_lemmas.stats()
+        return
+
+    with Pool(processes=workers, initializer=init_worker) as pool:
+        pending = deque()
+        for chunk in iter_chunks(raw_articles, chunk_size):
+            pending.append(pool.apply_async(normalize_chunk, (chunk,)))
+            if len(pending) >= 2 * workers:
+                results, pid, stats = pending.popleft().get()
+                cache_stats[pid] = stats
+                yield from results
+        while pending:
+            results, pid, stats = pending.popleft().get()
+            cache_stats[pid] = stats
+            yield from results
+
+# === ИНКРЕМЕНТАЛЬНЫЙ РЕЖИМ ===
+# Состояние (SQLite рядом с выходным файлом) — манифест _id → хэш исходной
+# статьи + версия нормализатора, вместе с готовой нормализованной статьёй.
+# Повторный запуск нормализует только новые/изменённые статьи, удалённые
+# из выгрузки выбрасывает. Результаты фиксируются каждые CHECKPOINT_EVERY
+# статей, поэтому прерванный запуск продолжается с места остановки.
+
+def content_hash(article):
+    raw = json.dumps(article, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def open_state(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS articles ("
+        " id TEXT PRIMARY KEY,"
+        " hash TEXT NOT NULL,"
+        " version TEXT NOT NULL,"
+        " normalized TEXT NOT NULL"
+        ")"
+    )
+    # порядок статей текущей выгрузки; повтор _id в выгрузке не добавляется
+    conn.execute("CREATE TEMP TABLE current (pos INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE)")
+    conn.commit()
+    return conn
+
+def scan_changed(raw_articles, conn, pending_hashes, counters):
+    """
+    Проходит по выгрузке, запоминает порядок статей и отдаёт на нормализацию
+    только те, чей хэш или версия нормализатора не совпадают с состоянием.
+    Статья с уже встречавшимся _id пропускается: в состоянии одна запись
+    на _id, остаётся первая.
+    """
+    pos = 0
+    for article in raw_articles:
+        art_id = valid_id(article)
+        if art_id is None:
+            counters["skipped"] += 1
+            continue
+        inserted = conn.execute(
+            "INSERT OR IGNORE INTO current (pos, id) VALUES (?, ?)", (pos, art_id)
+        ).rowcount
+        if not inserted:
+            counters["duplicates"] += 1
+            continue
+        pos += 1
+
+        h = content_hash(article)
+        row = conn.execute("SELECT hash, version FROM articles WHERE id = ?", (art_id,)).fetchone()
+        if row is not None and row[0] == h and row[1] == NORMALIZER_VERSION:
+            counters["unchanged"] += 1
+            continue
+        pending_hashes[art_id] = h
+        yield article
+
+def normalize_incremental(args, workers, state_path):
+    conn = open_state(state_path)
+    if args.full:
+        conn.execute("DELETE FROM articles")
+        conn.commit()
+
+    counters = {"skipped": 0, "duplicates": 0, "unchanged": 0, "normalized": 0}
+    pending_hashes = {}
+    cache_stats = {}
+    changed = scan_changed(iter_records(args.input_file), conn, pending_hashes, counters)
+    try:
+        for normalized_article in normalize_all(changed, workers, max(1, args.chunk_size), cache_stats):
+            art_id = normalized_article["_id"]
+            conn.execute(
+                "INSERT OR REPLACE INTO articles (id, hash, version, normalized) VALUES (?, ?, ?, ?)",
+                (art_id, pending_hashes.pop(art_id), NORMALIZER_VERSION,
+                 json.dumps(normalized_article, ensure_ascii=False))
+            )
+            counters["normalized"] += 1
+            if counters["normalized"] % CHECKPOINT_EVERY == 0:
+                conn.commit()
+                print(f"Нормализовано новых/изменённых статей: {counters['normalized']}")
+    finally:
+        # Всё, что успели посчитать, остаётся в состоянии и при прерывании
+        conn.commit()
+
+    deleted = conn.execute(
+        "DELETE FROM articles WHERE id NOT IN (SELECT id FROM current)"
+    ).rowcount
+    conn.commit()
+
+    stream = TokenStreamWriter(tokens_path(args.output_file))
+    with RecordWriter(args.output_file) as writer:
+        rows = conn.execute(
+            "SELECT a.normalized FROM current c JOIN articles a ON a.id = c.id ORDER BY c.pos"
+        )
+        for (normalized_json,) in rows:
+            normalized_article = json.loads(normalized_json)
+            writer.write(normalized_article)
+            stream.add(normalized_article)
+    conn.close()
+    stream.close(args.output_file)
+
+    print(f"Без изменений: {counters['unchanged']}, нормализовано: {counters['normalized']}, "
+          f"удалено: {deleted}, пропущено без id: {counters['skipped']}, "
+          f"повторов id: {counters['duplicates']}")
+    print(f"\nГотово! Сохранено {writer.count} нормализованных статей в {args.output_file}")
+    print(f"Поток токенов: {stream.path}")
+    # корпус поиска изменился — кэши результатов (query_cache.py) сбрасываются
+    bump_generation("build_normalized_articles.py")
+    if cache_stats:
+        print(cache_report(cache_stats))
+
+def cache_report(cache_stats):
+    keys = ("lookups", "memory_hits", "disk_hits", "misses")
+    total = {k: sum(s[k] for s in cache_stats.values()) for k in keys}
+    hit_rate = (total["memory_hits"] + total["disk_hits"]) / total["lookups"] if total["lookups"] else 0.0
+    return (f"lemma_cache ({len(cache_stats)} процесс(ов)): {total['lookups']} обращений, "
+            f"hit rate {hit_rate:.1%} (память {total['memory_hits']}, "
+            f"диск {total['disk_hits']}, вычислено {total['misses']})")
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="build_normalized_articles.py <input_file> <output_file> [--workers N]",
+        description="Вход: JSON-массив или JSON Lines; выход: .json (массив) или .jsonl. "
+                    "Суффикс .gz — сжатие. Файлы читаются и пишутся потоково. Рядом с выходом "
+                    "пишется поток токенов <output>.tokens (token_stream.py)."
+    )
+    parser.add_argument("input_file")
+    parser.add_argument("output_file")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="число процессов; 0 — по числу ядер (по умолчанию 1)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="статей в одной задаче для воркера")
+    parser.add_argument("--state",
+                        help="файл состояния инкрементального режима "
+                             "(по умолчанию <output_file>.state.sqlite3)")
+    parser.add_argument("--full", action="store_true",
+                        help="игнорировать состояние и нормализовать весь корпус заново")
+    parser.add_argument("--no-state", action="store_true",
+                        help="обычный однопроходный режим без состояния")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+
+    print(f"Начата обработка статей из {args.input_file} (процессов: {workers})...\n")
+
+    if not args.no_state:
+        normalize_incremental(args, workers, args.state or args.output_file + ".state.sqlite3")
+        return
 
-    normalized.append(normalized_article)
-    if i % 1000 == 0 or i == total:
-        print(f"Обработано статей: {i}/{total}")
+    cache_stats = {}
+    raw_articles = iter_records(args.input_file)
+    stream = TokenStreamWriter(tokens_path(args.output_file))
+    i = 0
+    with RecordWriter(args.output_file) as writer:
+        results = normalize_all(raw_articles, workers, max(1, args.chunk_size), cache_stats)
+        for i, normalized_article in enumerate(results, start=1):
+            if i % 1000 == 0:
+                print(f"Обработано статей: {i}")
+            if normalized_article is None:
+                continue
+            writer.write(normalized_article)
+            stream.add(normalized_article)
+    stream.close(args.output_file)
+    print(f"Обработано статей: {i}")
 
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    json.dump(normalized, f, ensure_ascii=False, indent=2)
+    print(f"\nГотово! Сохранено {writer.count} нормализованных статей в {args.output_file}")
+    print(f"Поток токенов: {stream.path}")
+    # корпус поиска изменился — кэши результатов (query_cache.py) сбрасываются
+    bump_generation("build_normalized_articles.py")
+    print(cache_report(cache_stats))
 
-print(f"\nГотово! Сохранено {len(normalized)} нормализованных статей в {OUTPUT_FILE}")
+if __name__ == "__main__":
+    main()
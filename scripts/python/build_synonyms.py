@@ -1,67 +1,137 @@
 import sys
 import json
 import re
-import numpy as np
+import argparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-
-if len(sys.argv) < 3:
-    print("Usage: build_synonyms.py <input_file> <output_file>")
-    sys.exit(1)
+import numpy as np
+import corpus_store
+import token_stream
+from tfidf_index import fit_counts
+from synonym_index import build_index, index_path
+from query_cache import bump_generation
+from topk_similarity import topk_cosine, DEFAULT_BLOCK_SIZE
+import lsh_similarity
 
-INPUT_FILE = sys.argv[1]
-OUTPUT_FILE = sys.argv[2]
 TOP_N = 5             # Количество ближайших синонимов
 MIN_SCORE = 0.1       # Порог минимального веса для включения
 
-# Загрузка нормализованных статей
-with open(INPUT_FILE, "r", encoding="utf-8") as f:
-    articles = json.load(f)
-
 # Очистка текста
 def clean(text):
     return re.sub(r"[^a-zA-Zа-яА-Я0-9ёЁ\s\-]", "", text.lower())
 
-# Сбор уникальных тегов
-tag_set = set()
-for article in articles:
-    tag_set.update(article.get("tags", []))
-
-terms = list(tag_set)
-tag_texts = [clean(tag) for tag in terms]
-
-if not terms:
-    print("Нет тегов для анализа. Проверь входной файл.")
-    exit()
-
-print(f"Начинаем обработку {len(terms)} тегов...")
-
-# Векторизация
-vectorizer = TfidfVectorizer()
-X = vectorizer.fit_transform(tag_texts)
-
-print("TF-IDF векторизация завершена.")
-
-# Косинусное сходство
-similarities = cosine_similarity(X)
-result = {}
-
-for i, term in enumerate(terms):
-    sim_scores = similarities[i]
-    top_indices = np.argsort(sim_scores)[::-1][1:]  # исключаем сам себя
-    similar_terms = []
-
-    for j in top_indices:
-        score = float(sim_scores[j])
-        if score >= MIN_SCORE:
-            similar_terms.append([terms[j], round(score, 4)])
-            if len(similar_terms) == TOP_N:
-                break
-
-    result[term] = similar_terms
-
-# Сохранение результата
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    json.dump(result, f, ensure_ascii=False, indent=4)
-
-print(f"Готово! Словарь синонимов для {len(terms)} тегов сохранён в {OUTPUT_FILE}")
+def tag_matrix(stream):
+    """
+    Уникальные теги (по алфавиту) и их TF-IDF по потоку токенов — то же, что
+    TfidfVectorizer().fit_transform(clean(тег)), но clean() и разбор на
+    термины выполняются один раз на токен словаря, а не на текст тега.
+    """
+    first = {}
+    for u, tag in enumerate(stream.unit_strings("tags")):
+        first.setdefault(tag, u)
+    terms = sorted(first)
+    if not terms:
+        return terms, None
+
+    vectorizer = TfidfVectorizer()
+    analyze = vectorizer.build_analyzer()
+    analyzer = stream.analyzer(lambda token: analyze(clean(token)))
+    units = np.asarray(stream.units("tags"))
+    picked = np.fromiter((first[t] for t in terms), dtype=np.int64, count=len(terms))
+    lengths = units[picked + 1] - units[picked]
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    # токены выбранных тегов подряд: начало тега + сдвиг внутри него
+    pos = np.arange(offsets[-1], dtype=np.int64) - np.repeat(offsets[:-1] - units[picked], lengths)
+    ids, offsets = analyzer.apply(np.asarray(stream.tokens("tags"))[pos], offsets)
+    rows = np.repeat(np.arange(len(terms), dtype=np.int64), np.diff(offsets))
+    _, _, X = fit_counts(analyzer.terms, rows, ids, len(terms), vectorizer.get_params(), vectorizer.dtype)
+    return terms, X
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage="build_synonyms.py <input_file> <output_file> [--mode exact|lsh] "
+              "[--workers N] [--block-size N]"
+    )
+    parser.add_argument("input_file")
+    parser.add_argument("output_file")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="процессов для поиска ближайших тегов; 0 — по числу ядер")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE,
+                        help="строк матрицы сходства, считаемых за раз")
+
+    # Приближённый режим для больших словарей (см. lsh_similarity.py)
+    parser.add_argument("--mode", choices=["exact", "lsh"], default="exact",
+                        help="exact — все пары (по умолчанию, точно и на тегах быстрее); "
+                             "lsh — кандидаты по случайным проекциям, для очень больших словарей "
+                             "(recall ниже 1, см. lsh_similarity.py)")
+    parser.add_argument("--lsh-bands", type=int, default=lsh_similarity.DEFAULT_BANDS,
+                        help="полос сигнатуры (больше — выше recall, медленнее)")
+    parser.add_argument("--lsh-rows", type=int, default=lsh_similarity.DEFAULT_ROWS,
+                        help="бит в полосе (больше — меньше кандидатов, ниже recall)")
+    parser.add_argument("--lsh-max-bucket", type=int, default=lsh_similarity.DEFAULT_MAX_BUCKET,
+                        help="максимальный размер группы кандидатов в корзине")
+    parser.add_argument("--recall-sample", type=int, default=200,
+                        help="строк для оценки recall lsh относительно exact (0 — не оценивать)")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    # Теги — из потока токенов build_normalized_articles.py, если он есть
+    # для этого файла; иначе — колонка тегов хранилища корпуса (mmap, строится
+    # при первом запуске для этого файла). Статьи целиком не разбираются
+    stream = token_stream.open_for(args.input_file)
+    if stream is not None and stream.exact_text:
+        terms, X = tag_matrix(stream)
+    else:
+        store = corpus_store.open_or_build(args.input_file)
+        # сортировка — чтобы порядок ключей и разрешение равных score не зависели от запуска
+        terms = sorted(set(store.values("tags")))
+        X = None
+
+    if not terms:
+        print("Нет тегов для анализа. Проверь входной файл.")
+        sys.exit()
+
+    print(f"Начинаем обработку {len(terms)} тегов...")
+
+    # Векторизация
+    if X is None:
+        X = TfidfVectorizer().fit_transform([clean(tag) for tag in terms])
+
+    print("TF-IDF векторизация завершена.")
+
+    if args.mode == "lsh":
+        # Кандидаты по LSH, затем точное переранжирование
+        neighbours, n_candidates = lsh_similarity.topk_cosine_lsh(
+            X, TOP_N, MIN_SCORE, bands=args.lsh_bands, rows=args.lsh_rows,
+            max_bucket=args.lsh_max_bucket, seed=args.seed
+        )
+        print(f"LSH: {n_candidates} пар-кандидатов "
+              f"({n_candidates / max(len(terms), 1):.1f} на термин)")
+        if args.recall_sample > 0:
+            recall, sampled = lsh_similarity.recall_against_exact(
+                X, neighbours, TOP_N, MIN_SCORE, sample=args.recall_sample, seed=args.seed
+            )
+            print(f"LSH recall@{TOP_N} относительно exact на {sampled} терминах: {recall:.3f}")
+    else:
+        # Косинусное сходство: разреженно, блоками строк, top-k через argpartition
+        neighbours = topk_cosine(X, TOP_N, MIN_SCORE, block_size=args.block_size, workers=args.workers)
+    result = {}
+
+    for term, (indices, scores) in zip(terms, neighbours):
+        result[term] = [[terms[j], round(float(score), 4)] for j, score in zip(indices, scores)]
+
+    # Сохранение результата
+    with open(args.output_file, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=4)
+
+    # Бинарный индекс для быстрого поиска по ключу (QueryExpander, оценка поиска)
+    build_index(result, index_path(args.output_file))
+    # словарь синонимов изменился — кэши результатов (query_cache.py) сбрасываются
+    bump_generation("build_synonyms.py")
+
+    print(f"Готово! Словарь синонимов для {len(terms)} тегов сохранён в {args.output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Хранилище корпуса в файлах, открываемых через mmap, для параллельной оценки.
+
+Воркеры пула не разбирают JSON со статьями и не строят индекс заново:
+всё нужное один раз пишется в каталог хранилища, а каждый процесс
+открывает его через mmap — страницы общие (page cache ОС), в том числе
+на Windows, где пул запускает процессы через spawn.
+
+Это же — компактная замена json.load всего файла статей в скриптах оценки
+и build_synonyms.py: из статьи берутся только _id, title, abstract и tags
+(authors, affiliations, pdf_url, comment… не читаются), строки лежат
+в UTF-8 буферах и уже приведены к нижнему регистру.
+
+Каталог (.cache/corpus_store/<sha256 файла статей>/):
+    meta.json                      — версия, число статей, источник
+    ids.{bin,off.npy}              — _id статей (UTF-8 + смещения)
+    <field>.units.{bin,off.npy}    — значения поля в нижнем регистре
+    <field>.owners.npy             — номер статьи для каждого значения
+    <field>.ptr.npy                — статья i → значения ptr[i]:ptr[i+1]
+    tags.values.{bin,off.npy}      — теги в исходном регистре (как units)
+    <field>.tokens.{bin,off.npy}   — словарь токенов поля (см. field_index.py)
+    <field>.postings.{ptr,ids}.npy — CSR: токен → номера значений
+    tfidf/                         — TF-IDF базового режима оценки (см. tfidf_index.py)
+    bm25/                          — индекс BM25F (см. bm25_engine.py)
+
+Ключ каталога — хэш содержимого файла статей: изменился корпус — новое хранилище.
+Если рядом с файлом лежит его поток токенов (token_stream.py), словари
+токенов, TF-IDF и BM25F строятся по нему, а текст статей не токенизируется.
+Собрать заранее (или узнать путь): python corpus_store.py <файл статей>
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+STORE_VERSION = 4
+FIELDS = ("tags", "title", "abstract")
+RAW_FIELDS = ("tags",)   # поля, которые нужны и в исходном регистре (ключи словаря синонимов)
+DEFAULT_ROOT = Path(__file__).resolve().parent / ".cache" / "corpus_store"
+HASH_CHUNK = 1 << 20
+
+# === СТРОКОВЫЕ КОЛОНКИ ===
+
+def write_strings(prefix, strings):
+    """Пишет строки как один UTF-8 буфер <prefix>.bin и смещения <prefix>.off.npy."""
+    offsets = [0]
+    with open(f"{prefix}.bin", "wb") as f:
+        for s in strings:
+            data = s.encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(f"{prefix}.off.npy", np.asarray(offsets, dtype=np.int64))
+
+class StringColumn:
+    """Строки из <prefix>.bin/.off.npy; column[i] декодирует одну строку."""
+
+    def __init__(self, prefix):
+        self.offsets = np.load(f"{prefix}.off.npy", mmap_mode="r")
+        size = int(self.offsets[-1])
+        # пустой файл не отображается в память
+        self._blob = np.memmap(f"{prefix}.bin", dtype=np.uint8, mode="r") if size else np.empty(0, np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self._blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+class Postings:
+    """Токен → номера значений поля поверх CSR-массивов (читается как dict)."""
+
+    def __init__(self, prefix):
+        self.tokens = list(StringColumn(f"{prefix}.tokens"))
+        self._pos = {t: k for k, t in enumerate(self.tokens)}
+        self.ptr = np.load(f"{prefix}.postings.ptr.npy", mmap_mode="r")
+        self.ids = np.load(f"{prefix}.postings.ids.npy", mmap_mode="r")
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __getitem__(self, token):
+        k = self._pos[token]
+        return self.ids[self.ptr[k]:self.ptr[k + 1]].tolist()
+
+# === ПОСТРОЕНИЕ ===
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def doc_id(doc):
+    """_id статьи: {"$oid": ...} из mongoexport или строка (build_normalized_articles.py)."""
+    value = doc["_id"]
+    return value["$oid"] if isinstance(value, dict) else value
+
+def field_values(doc, field):
+    """Значения поля списком: тегов — несколько, title/abstract — одно."""
+    value = doc.get(field, "")
+    return value if isinstance(value, list) else [value]
+
+def slim(doc):
+    """Статья без полей, которые не нужны ни хранилищу, ни индексам."""
+    article = {"_id": doc_id(doc)}
+    article.update((field, doc[field]) for field in FIELDS if field in doc)
+    return article
+
+def tfidf_text(doc):
+    """Текст документа для TF-IDF базового режима (title + abstract + теги)."""
+    return " ".join((doc.get("title", ""), doc.get("abstract", ""), " ".join(doc.get("tags", []))))
+
+def build_store(articles, store_dir, source=None, stream=None):
+    """
+    Пишет хранилище для статей (список или поток); каталог заменяется
+    атомарно. В памяти остаются только поля из FIELDS. stream — поток
+    токенов этих же статей (token_stream.py): индекс полей, TF-IDF и BM25F
+    строятся по нему, без разбора текста.
+    """
+    from field_index import FieldIndex
+    import tfidf_index
+    import bm25_engine
+
+    store_dir = Path(store_dir)
+    tmp = store_dir.with_name(store_dir.name + f".tmp{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    try:
+        articles = [slim(doc) for doc in articles]
+        write_strings(tmp / "ids", (doc["_id"] for doc in articles))
+        if stream is not None and stream.n_docs != len(articles):
+            raise ValueError(f"{stream.path}: статей в потоке {stream.n_docs}, в файле {len(articles)}")
+
+        index = FieldIndex(articles, FIELDS) if stream is None else None
+        for field in FIELDS:
+            if stream is None:
+                units, owners, postings = index.columns(field)
+                tokens = list(postings)
+                lists = [postings[t] for t in tokens]
+                post_ptr = np.concatenate(([0], np.cumsum([len(l) for l in lists]))).astype(np.int64)
+                post_ids = np.fromiter((u for l in lists for u in l), dtype=np.int64)
+            else:
+                units = [v.lower() for doc in articles for v in field_values(doc, field)]
+                owners = np.repeat(np.arange(len(articles)), np.diff(stream.ptr(field)))
+                tokens, post_ptr, post_ids = stream.postings(field)
+            owners = np.asarray(owners, dtype=np.int64)
+            write_strings(tmp / f"{field}.units", units)
+            np.save(tmp / f"{field}.owners.npy", owners)
+            np.save(tmp / f"{field}.ptr.npy", np.searchsorted(owners, np.arange(len(articles) + 1)).astype(np.int64))
+            if field in RAW_FIELDS:
+                write_strings(tmp / f"{field}.values", (v for doc in articles for v in field_values(doc, field)))
+            write_strings(tmp / f"{field}.tokens", tokens)
+            np.save(tmp / f"{field}.postings.ptr.npy", post_ptr)
+            np.save(tmp / f"{field}.postings.ids.npy", post_ids)
+
+        if stream is None:
+            tfidf_index.build((tfidf_text(doc) for doc in articles), tmp / "tfidf")
+            bm25_engine.build(articles, tmp / "bm25")
+        else:
+            tfidf_index.build_from_stream(stream, tmp / "tfidf")
+            bm25_engine.build_from_stream(stream, tmp / "bm25")
+
+        meta = {"version": STORE_VERSION, "n_docs": len(articles), "fields": list(FIELDS),
+                "source": str(source) if source else None}
+        (tmp / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        shutil.rmtree(store_dir, ignore_errors=True)
+        os.replace(tmp, store_dir)
+    except BaseException:
+        # недостроенный каталог не оставляем (в том числе при Ctrl+C)
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+# === ЧТЕНИЕ ===
+
+class CorpusStore:
+    """
+    Открытое хранилище; колонки — через mmap, строка декодируется при обращении.
+        store.ids[i]                 — _id статьи i
+        store.doc_units("tags", i)   — теги статьи i в нижнем регистре
+        store.values("tags")         — все теги в исходном регистре
+    """
+
+    def __init__(self, store_dir):
+        self.path = Path(store_dir)
+        self.meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"{self.path}: версия хранилища {self.meta.get('version')}, нужна {STORE_VERSION}")
+        self.n_docs = self.meta["n_docs"]
+        self.ids = StringColumn(self.path / "ids")
+        self._units = {}
+
+    def units(self, field):
+        if field not in self._units:
+            self._units[field] = StringColumn(self.path / f"{field}.units")
+        return self._units[field]
+
+    def values(self, field):
+        """Значения поля в исходном регистре (только RAW_FIELDS)."""
+        return StringColumn(self.path / f"{field}.values")
+
+    def owners(self, field):
+        return np.load(self.path / f"{field}.owners.npy", mmap_mode="r")
+
+    def ptr(self, field):
+        return np.load(self.path / f"{field}.ptr.npy", mmap_mode="r")
+
+    def doc_units(self, field, i):
+        """Значения поля статьи i в нижнем регистре."""
+        units = self.units(field)
+        ptr = self.ptr(field)
+        return [units[u] for u in range(ptr[i], ptr[i + 1])]
+
+    def postings(self, field):
+        return Postings(self.path / field)
+
+    def tfidf(self):
+        """tfidf_index.TfidfIndex базового режима оценки (через mmap)."""
+        from tfidf_index import TfidfIndex
+        return TfidfIndex(self.path / "tfidf")
+
+    def bm25(self):
+        """bm25_engine.BM25Engine по статьям хранилища (через mmap)."""
+        from bm25_engine import BM25Engine
+        return BM25Engine(self.path / "bm25")
+
+def open_or_build(articles_path, root=DEFAULT_ROOT):
+    """Хранилище для файла статей: готовое из кэша или построенное заново."""
+    digest = file_hash(articles_path)
+    store_dir = Path(root) / digest
+    meta = store_dir / "meta.json"
+    if meta.exists():
+        try:
+            return CorpusStore(store_dir)
+        except (ValueError, OSError, KeyError):
+            pass
+    from jsonstream import iter_records
+    from token_stream import open_for, build_stream
+    stream = open_for(articles_path, digest)
+    if stream is None:
+        # потока нет (файл не из build_normalized_articles.py или изменён) —
+        # строим его рядом с файлом, и индексы дальше считаются по номерам токенов
+        try:
+            stream = build_stream(articles_path, digest=digest)
+        except OSError as e:
+            print(f"Поток токенов для {articles_path} не записан ({e}), индексы — по тексту",
+                  file=sys.stderr)
+    build_store(iter_records(articles_path), store_dir, source=articles_path, stream=stream)
+    return CorpusStore(store_dir)
+
+def store_size(store):
+    return sum(p.stat().st_size for p in store.path.rglob("*") if p.is_file())
+
+def main():
+    parser = argparse.ArgumentParser(description="Колоночное хранилище корпуса для скриптов оценки и синонимов.")
+    parser.add_argument("articles", help="файл статей: JSON-массив или JSON Lines, можно .gz")
+    parser.add_argument("--root", default=str(DEFAULT_ROOT), help="каталог хранилищ")
+    args = parser.parse_args()
+    store = open_or_build(args.articles, args.root)
+    print(f"Хранилище: {store.path} (статей: {store.n_docs}, {store_size(store) / 2**20:.1f} МБ)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Метрики оценки поиска сразу для пачки ячеек (запрос × режим × набор полей).
+
+Найденные и релевантные документы — битовые маски по позициям статей
+в корпусе (np.packbits, по строке на ячейку); TP/FP/FN/TN считаются
+popcount'ом по всей пачке за один проход вместо списков y_true/y_pred
+и вызовов sklearn на каждую ячейку.
+
+Формулы совпадают с sklearn (precision_score/recall_score/f1_score,
+zero_division=0): P = TP/(TP+FP), R = TP/(TP+FN), F1 = 2TP/(2TP+FP+FN).
+
+Для режимов с ранжированием (TF-IDF) — P@k, nDCG@k (бинарная
+релевантность) и average precision (MAP — среднее по запросам).
+"""
+import numpy as np
+
+def pack(rows, n_docs):
+    """
+    Битовая матрица (len(rows), ceil(n_docs/8)): строка — набор позиций
+    документов (любой итерируемый набор индексов).
+    """
+    bits = np.zeros((len(rows), n_docs), dtype=bool)
+    for r, positions in enumerate(rows):
+        bits[r, np.fromiter(positions, dtype=np.int64)] = True
+    return np.packbits(bits, axis=1)
+
+def popcount(packed):
+    return np.bitwise_count(packed).sum(axis=1, dtype=np.int64)
+
+def confusion(pred, true, n_docs):
+    """TP, FP, FN, TN по строкам упакованных матриц pred и true."""
+    tp = popcount(pred & true)
+    fp = popcount(pred) - tp
+    fn = popcount(true) - tp
+    tn = n_docs - tp - fp - fn
+    return tp, fp, fn, tn
+
+def _divide(num, den):
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    out = np.zeros(np.broadcast(num, den).shape)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+def prf(tp, fp, fn):
+    """Precision, recall, F1 по массивам счётчиков (0 при делении на ноль)."""
+    return _divide(tp, tp + fp), _divide(tp, tp + fn), _divide(2 * tp, 2 * tp + fp + fn)
+
+def prf_retrieved(tp, fp):
+    """
+    Исторический вариант скриптов оценки: y_true/y_pred строятся только
+    по найденным документам (y_pred — все единицы), поэтому FN = 0:
+    recall = 1 при хотя бы одном попадании, F1 = 2TP/(2TP+FP).
+    """
+    zero = np.zeros_like(np.asarray(tp))
+    return prf(tp, fp, zero)
+
+def relevance_matrix(ranked, relevant, k=None):
+    """
+    Матрица (ячейки × позиции) релевантности ранжированных выдач:
+    ranked — списки позиций документов по убыванию score, relevant —
+    упакованные маски релевантных. Короткие выдачи дополняются False.
+    """
+    width = max((len(r) for r in ranked), default=0)
+    if k is not None:
+        width = min(width, k)
+    rel = np.zeros((len(ranked), width), dtype=bool)
+    for row, docs in enumerate(ranked):
+        docs = np.asarray(docs[:width], dtype=np.int64)
+        if len(docs):
+            rel[row, :len(docs)] = np.unpackbits(relevant[row])[docs].astype(bool)
+    return rel
+
+def precision_at_k(ranked, relevant, k):
+    """Доля релевантных среди первых k (делитель — k, как принято для P@k)."""
+    rel = relevance_matrix(ranked, relevant, k)
+    return rel.sum(axis=1) / k
+
+def ndcg_at_k(ranked, relevant, k):
+    rel = relevance_matrix(ranked, relevant, k)
+    discounts = 1.0 / np.log2(np.arange(2, rel.shape[1] + 2))
+    dcg = (rel * discounts).sum(axis=1)
+    ideal_hits = np.minimum(popcount(relevant), k)
+    ideal_discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    idcg = np.concatenate(([0.0], np.cumsum(ideal_discounts)))[ideal_hits]
+    return _divide(dcg, idcg)
+
+def average_precision(ranked, relevant):
+    """AP по всей выдаче: среднее P@i по позициям попаданий, делённое на число релевантных."""
+    rel = relevance_matrix(ranked, relevant)
+    hits = np.cumsum(rel, axis=1)
+    positions = np.arange(1, rel.shape[1] + 1)
+    precisions = np.where(rel, hits / positions, 0.0).sum(axis=1)
+    return _divide(precisions, popcount(relevant))
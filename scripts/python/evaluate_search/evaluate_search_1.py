@@ -2,11 +2,22 @@
 # # Search Comparison: Basic vs Synonyms vs Synonyms+Lemmatization
 
 # %% jupyter-python
-import json
 import re
+import sys
+from pathlib import Path
+import numpy as np
+import scipy.sparse as sp
 from pymorphy3 import MorphAnalyzer
 from nltk.stem import PorterStemmer
 
+# Общие модули лежат уровнем выше (scripts/python); в Jupyter нет __file__ — берём cwd
+sys.path.insert(0, str((Path(__file__).resolve().parent if "__file__" in globals() else Path.cwd()).parent))
+from lemma_cache import morph_lemma_cache, porter_stem_cache
+from synonym_index import open_or_build
+from field_index import FieldIndex
+import corpus_store
+from tfidf_index import top_k
+
 # === ПУТИ К ФАЙЛАМ ===
 ARTICLES_PATH = "scholar_db.normalized_articles.json"
 SYNONYMS_PATH = "query_synonyms.json"
@@ -16,32 +27,33 @@ TOP_K = 50      # сколько документов взять из выдач
 WEIGHTS = {"title": 3, "abstract": 2, "tags": 1}
 
 # === ЗАГРУЗКА ДАННЫХ ===
-with open(ARTICLES_PATH, encoding="utf-8") as f:
-    ARTICLES = json.load(f)
+# колонки корпуса через mmap (.cache/corpus_store, строится при первом запуске):
+# только _id/title/abstract/tags, уже в нижнем регистре — JSON не разбирается
+STORE = corpus_store.open_or_build(ARTICLES_PATH)
+
+# индекс query_synonyms.idx (пересобирается, если JSON новее)
+SYNONYMS = open_or_build(SYNONYMS_PATH)
 
-with open(SYNONYMS_PATH, encoding="utf-8") as f:
-    SYNONYMS = json.load(f)
+# вхождение термина подстрокой в поле (для тегов — хотя бы в один тег)
+INDEX = FieldIndex.from_store(STORE, tuple(WEIGHTS))
+ARTICLE_IDS = list(STORE.ids)
 
 # === ЛЕММАТИЗАТОР и СТЕММЕР ===
 morph = MorphAnalyzer()
+morph_lemmas = morph_lemma_cache(morph, threshold=0.3)
 def lemmatize_term(term: str) -> str:
-    parsed = morph.parse(term)
-    if parsed and parsed[0].score > 0.3:
-        return parsed[0].normal_form.lower()
-    return term.lower()
+    return morph_lemmas.get(term.lower()).lower()
 
 stemmer = PorterStemmer()
+porter_stems = porter_stem_cache(stemmer)
 def stem_term(term: str) -> str:
-    return stemmer.stem(term.lower())
+    return porter_stems.get(term.lower())
 
 # === ФУНКЦИИ РАСШИРЕНИЯ И НОРМАЛИЗАЦИИ ===
 def expand_query(q: str):
     """Возвращает [(term, weight)] включая исходный + синонимы."""
     out = [(q.lower(), 1.0)]
-    for key, syns in SYNONYMS.items():
-        if key.lower() == q.lower():
-            out += [(s[0].lower(), float(s[1])) for s in syns]
-            break
+    out += [(syn.lower(), w) for syn, w in SYNONYMS.get(q)]
     return out
 
 def normalize_terms(terms: list[str], mode: str) -> list[str]:
@@ -54,48 +66,65 @@ def normalize_terms(terms: list[str], mode: str) -> list[str]:
     raise ValueError(f"Unknown normalization mode: {mode}")
 
 # === СКОРИНГ ДОКУМЕНТОВ ===
-def score_doc(doc: dict, terms_w: list[tuple[str,float]]) -> float:
-    s = 0.0
-    title = doc["title"].lower()
-    abstract = doc["abstract"].lower()
-    tags = [t.lower() for t in doc.get("tags",[])]
-    for term, w in terms_w:
-        if term in title:
-            s += WEIGHTS["title"] * w
-        if term in abstract:
-            s += WEIGHTS["abstract"] * w
-        if any(term in tag for tag in tags):
-            s += WEIGHTS["tags"] * w
-    return s
-
-def retrieve(q: str, expand: bool, norm_mode: str) -> list[tuple[str,float]]:
+# score(doc) = Σ по терминам w × Σ по полям WEIGHTS[поле] × [термин входит в поле].
+# Считается сразу для пачки запросов: матрица «статьи × (термин, поле)»
+# с WEIGHTS в ячейках вхождений умножается на матрицу весов терминов
+# «(термин, поле) × запросы». Столбцы идут в порядке терминов запроса
+# (а внутри термина — title, abstract, tags), так что слагаемые каждой
+# оценки складываются в том же порядке, что и в прежнем score_doc, и
+# оценки совпадают до бита.
+FIELDS = tuple(WEIGHTS)
+
+def query_terms(q: str, expand: bool, norm_mode: str) -> list[tuple[str,float]]:
     # 1) raw terms + веса
     raw = expand_query(q) if expand else [(q.lower(), 1.0)]
     # 2) нормализуем
     terms = [t for t, _ in raw]
     normed = normalize_terms(terms, norm_mode)
-    terms_w = list(zip(normed, [w for _, w in raw]))
-    # 3) считаем score по всем докам
-    scored = []
-    for doc in ARTICLES:
-        sc = score_doc(doc, terms_w)
-        if sc > 0:
-            scored.append((doc["_id"]["$oid"], sc))
-    # 4) сортируем и отбираем топ-K
-    scored.sort(key=lambda x: x[1], reverse=True)
-    return scored[:TOP_K]
+    return list(zip(normed, [w for _, w in raw]))
+
+def score_batch(batch: list[list[tuple[str,float]]]) -> sp.csc_matrix:
+    """Оценки всех статей для пачки запросов [(term, weight)]: разреженная матрица (статьи × запросы)."""
+    rows, cols, vals = [], [], []
+    q_rows, q_cols, q_vals = [], [], []
+    col = 0
+    for qi, terms_w in enumerate(batch):
+        for term, w in terms_w:
+            for field in FIELDS:
+                docs = INDEX.lookup(field, term, "contains")
+                rows.extend(docs)
+                cols.extend([col] * len(docs))
+                vals.extend([WEIGHTS[field]] * len(docs))
+                q_rows.append(col)
+                q_cols.append(qi)
+                q_vals.append(w)
+                col += 1
+    docs_terms = sp.csr_matrix((np.asarray(vals, dtype=np.float64), (rows, cols)),
+                               shape=(STORE.n_docs, col))
+    docs_terms.sort_indices()
+    # по одному ненулю на столбец (термин, поле): память линейна по размеру пачки
+    weights = sp.csr_matrix((np.asarray(q_vals, dtype=np.float64), (q_rows, q_cols)),
+                            shape=(col, len(batch)))
+    return (docs_terms @ weights).tocsc()
+
+def retrieve_batch(requests: list[tuple[str,bool,str]]) -> list[list[tuple[str,float]]]:
+    """Топ-K [(id, score)] для пачки (запрос, expand, norm_mode)."""
+    scores = score_batch([query_terms(q, expand, norm) for q, expand, norm in requests])
+    # положительные оценки по убыванию, при равенстве — в порядке статей (как устойчивая сортировка)
+    results = []
+    for qi in range(scores.shape[1]):
+        column = scores[:, qi].toarray().ravel()
+        results.append([(ARTICLE_IDS[i], float(column[i])) for i in top_k(column, TOP_K)])
+    return results
+
+def retrieve(q: str, expand: bool, norm_mode: str) -> list[tuple[str,float]]:
+    return retrieve_batch([(q, expand, norm_mode)])[0]
 
 # === ГROUND TRUTH НА ОСНОВЕ ПОДСТРОКИ ===
 def ground_truth(q: str) -> set[str]:
     ql = q.lower()
-    ids = {
-        doc["_id"]["$oid"]
-        for doc in ARTICLES
-        if ql in doc["title"].lower()
-        or ql in doc["abstract"].lower()
-        or any(ql in t.lower() for t in doc.get("tags", []))
-    }
-    return ids
+    docs = INDEX.match("title", [ql]) | INDEX.match("abstract", [ql]) | INDEX.match("tags", [ql])
+    return {ARTICLE_IDS[i] for i in docs}
 
 # === ЭВАЛЮАЦИЯ ===
 def eval_run(retrieved: list[tuple[str,float]], relevant: set[str]) -> tuple[float,float,float]:
@@ -117,6 +146,10 @@ if __name__ == "__main__":
         ("Syn+Lemma", True,  "lemma"),
     ]
 
+    # все запросы во всех режимах — одной пачкой
+    retrieved = retrieve_batch([(q, expand, norm) for q in queries for _, expand, norm in modes])
+    retrieved = iter(retrieved)
+
     for q in queries:
         print(f"\n=== Query: «{q}» ===")
         gt = ground_truth(q)
@@ -125,7 +158,7 @@ if __name__ == "__main__":
         base_f1 = None
         stats = []
         for name, expand, norm in modes:
-            res = retrieve(q, expand, norm)
+            res = next(retrieved)
             p, r, f = eval_run(res, gt)
             stats.append((name, len(res), p, r, f))
             print(f"{name:<12}{len(res):>6}{p:8.3f}{r:8.3f}{f:8.3f}")
@@ -136,3 +169,7 @@ if __name__ == "__main__":
         for name, _, _, _, f in stats:
             if name != "Basic":
                 print(f"Δ F1 {name:>10} vs Basic: {f - base_f1:+.3f}")
+
+    print()
+    print(morph_lemmas.report())
+    print(porter_stems.report())
@@ -1,42 +1,46 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import json
+import sys
+from pathlib import Path
 from pymorphy3 import MorphAnalyzer
 from nltk.stem import PorterStemmer
 from sklearn.metrics import precision_score, recall_score, f1_score
 
+# общие модули (lemma_cache и др.) лежат уровнем выше, в scripts/python
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from lemma_cache import morph_lemma_cache, porter_stem_cache
+from synonym_index import open_or_build
+from field_index import FieldIndex
+import corpus_store
+
 # === ПУТИ К ФАЙЛАМ ===
 ARTICLES_PATH = "scholar_db.normalized_articles.json"
 SYNONYMS_PATH = "query_synonyms.json"
 
 # === ЗАГРУЗКА ДАННЫХ ===
-with open(ARTICLES_PATH, encoding="utf-8") as f:
-    ARTICLES = json.load(f)
+# колонки корпуса через mmap (.cache/corpus_store, строится при первом запуске)
+STORE = corpus_store.open_or_build(ARTICLES_PATH)
 
-with open(SYNONYMS_PATH, encoding="utf-8") as f:
-    SYNONYMS = json.load(f)
+# индекс query_synonyms.idx (пересобирается, если JSON новее)
+SYNONYMS = open_or_build(SYNONYMS_PATH)
 
 # === ЛЕММАТИЗАТОР И СТЕММЕР ===
 morph = MorphAnalyzer()
+morph_lemmas = morph_lemma_cache(morph, threshold=0.3)
 def lemmatize_term(term: str) -> str:
-    parsed = morph.parse(term)
-    if parsed and parsed[0].score > 0.3:
-        return parsed[0].normal_form.lower()
-    return term.lower()
+    return morph_lemmas.get(term.lower()).lower()
 
 stemmer = PorterStemmer()
+porter_stems = porter_stem_cache(stemmer)
 def stem_term(term: str) -> str:
-    return stemmer.stem(term.lower())
+    return porter_stems.get(term.lower())
 
 # === РАСШИРЕНИЕ + НОРМАЛИЗАЦИЯ ===
 def expand_query(q: str):
     """Возвращает [(term, weight)] — исходный + синонимы."""
     out = [(q.lower(), 1.0)]
-    for key, syns in SYNONYMS.items():
-        if key.lower() == q.lower():
-            out += [(s[0].lower(), float(s[1])) for s in syns]
-            break
+    out += [(syn.lower(), w) for syn, w in SYNONYMS.get(q)]
     return out
 
 def normalize_terms(terms: list[str], mode: str) -> list[str]:
@@ -48,25 +52,25 @@ def normalize_terms(terms: list[str], mode: str) -> list[str]:
         return [lemmatize_term(t) for t in terms]
     raise ValueError(f"Unknown norm mode: {mode}")
 
-# === ФУНКЦИИ РЕТРИВАЛА ===
-def match_in_tags(doc: dict, terms: list[str]) -> bool:
-    tags = [t.lower() for t in doc.get("tags", [])]
-    return any(t in tags for t in terms)
-
-def match_in_title(doc: dict, terms: list[str]) -> bool:
-    title = doc.get("title", "").lower()
-    return any(t in title for t in terms)
-
-def match_in_abstract(doc: dict, terms: list[str]) -> bool:
-    abs_ = doc.get("abstract", "").lower()
-    return any(t in abs_ for t in terms)
-
-FIELD_MATCHERS = {
-    "tags": match_in_tags,
-    "title": match_in_title,
-    "abstract": match_in_abstract,
+# === ИНДЕКС ПОЛЕЙ ===
+# строится один раз; семантика совпадений — как у прежних match_in_*:
+# теги — точное равенство тегу, title/abstract — подстрока
+INDEX = FieldIndex.from_store(STORE)
+ARTICLE_IDS = list(STORE.ids)
+FIELD_MATCH = {
+    "tags": "equals",
+    "title": "contains",
+    "abstract": "contains",
 }
 
+def match_fields(terms: list[str], fields: list[str]) -> set[int]:
+    """Номера статей, где хотя бы в одном из полей есть любой из терминов."""
+    hits = set()
+    for f in fields:
+        hits |= INDEX.match(f, terms, FIELD_MATCH[f])
+    return hits
+
+# === ФУНКЦИИ РЕТРИВАЛА ===
 def retrieve(q: str, expand: bool, norm_mode: str, fields: list[str]) -> list[str]:
     """
     Возвращает список _id документов, в которых хотя бы в одном из полей
@@ -75,11 +79,7 @@ def retrieve(q: str, expand: bool, norm_mode: str, fields: list[str]) -> list[st
     raw = expand_query(q) if expand else [(q.lower(), 1.0)]
     terms = [t for t,_ in raw]
     normed = normalize_terms(terms, norm_mode)
-    results = []
-    for doc in ARTICLES:
-        if any(FIELD_MATCHERS[f](doc, normed) for f in fields):
-            results.append(doc["_id"]["$oid"])
-    return results
+    return [ARTICLE_IDS[i] for i in sorted(match_fields(normed, fields))]
 
 # === МЕТРИКИ ===
 def eval_run(ret_ids: list[str], gt_ids: set[str]) -> tuple[float,float,float]:
@@ -104,13 +104,7 @@ def ground_truth(q: str) -> set[str]:
     """
     raw = expand_query(q)
     terms = normalize_terms([t for t,_ in raw], "none")
-    gt = set()
-    for doc in ARTICLES:
-        if (match_in_tags(doc, terms)
-            or match_in_title(doc, terms)
-            or match_in_abstract(doc, terms)):
-            gt.add(doc["_id"]["$oid"])
-    return gt
+    return {ARTICLE_IDS[i] for i in match_fields(terms, ["tags", "title", "abstract"])}
 
 # === MAIN ===
 if __name__ == "__main__":
@@ -157,3 +151,6 @@ if __name__ == "__main__":
                 _, _, f = eval_run(ret, gt)
                 print(f"Δ F1 {name:>10} vs Basic: {f - base_f:+.3f}")
             print()
+
+    print(morph_lemmas.report())
+    print(porter_stems.report())
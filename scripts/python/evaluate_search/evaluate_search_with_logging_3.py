@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import sys
 import json
 import logging
 from pathlib import Path
@@ -8,6 +9,13 @@ from pymorphy3 import MorphAnalyzer
 from nltk.stem import PorterStemmer
 from sklearn.metrics import precision_score, recall_score, f1_score
 
+# общие модули (lemma_cache и др.) лежат уровнем выше, в scripts/python
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from lemma_cache import morph_lemma_cache, porter_stem_cache
+from synonym_index import open_or_build
+from field_index import FieldIndex
+import corpus_store
+
 # === КОНФИГУРАЦИЯ ЛОГИРОВАНИЯ ===
 logging.basicConfig(
     level=logging.INFO,
@@ -21,31 +29,28 @@ SYNONYMS_PATH = Path("query_synonyms.json")
 OUTPUT_PATH   = Path("evaluation_results.json")
 
 # === ЗАГРУЗКА ДАННЫХ ===
-logging.info(f"Загрузка статей из {ARTICLES_PATH}")
-ARTICLES = json.loads(ARTICLES_PATH.read_text(encoding="utf-8"))
+# колонки корпуса через mmap (.cache/corpus_store, строится при первом запуске)
+logging.info(f"Открытие хранилища корпуса для {ARTICLES_PATH}")
+STORE = corpus_store.open_or_build(ARTICLES_PATH)
 
 logging.info(f"Загрузка словаря синонимов из {SYNONYMS_PATH}")
-SYNONYMS = json.loads(SYNONYMS_PATH.read_text(encoding="utf-8"))
+SYNONYMS = open_or_build(SYNONYMS_PATH)
 
 # === ЛЕММАТИЗАТОР И СТЕММЕР ===
 morph = MorphAnalyzer()
+morph_lemmas = morph_lemma_cache(morph, threshold=0.3)
 def lemmatize_term(term: str) -> str:
-    parsed = morph.parse(term)
-    if parsed and parsed[0].score > 0.3:
-        return parsed[0].normal_form.lower()
-    return term.lower()
+    return morph_lemmas.get(term.lower()).lower()
 
 stemmer = PorterStemmer()
+porter_stems = porter_stem_cache(stemmer)
 def stem_term(term: str) -> str:
-    return stemmer.stem(term.lower())
+    return porter_stems.get(term.lower())
 
 # === ФУНКЦИИ РАСШИРЕНИЯ И НОРМАЛИЗАЦИИ ===
 def expand_query(q: str):
     out = [(q.lower(), 1.0)]
-    for key, syns in SYNONYMS.items():
-        if key.lower() == q.lower():
-            out += [(s[0].lower(), float(s[1])) for s in syns]
-            break
+    out += [(syn.lower(), w) for syn, w in SYNONYMS.get(q)]
     return out
 
 def normalize_terms(terms: list[str], mode: str) -> list[str]:
@@ -57,47 +62,36 @@ def normalize_terms(terms: list[str], mode: str) -> list[str]:
         return [lemmatize_term(t) for t in terms]
     raise ValueError(f"Unknown normalization mode: {mode}")
 
-# === MATCHERS ДЛЯ ПОЛЕЙ ===
-def match_in_tags(doc, terms):
-    return any(t in (tag.lower() for tag in doc.get("tags", [])) for t in terms)
-
-def match_in_title(doc, terms):
-    title = doc.get("title", "").lower()
-    return any(t in title for t in terms)
-
-def match_in_abstract(doc, terms):
-    abstract = doc.get("abstract", "").lower()
-    return any(t in abstract for t in terms)
-
-FIELD_MATCHERS = {
-    "tags": match_in_tags,
-    "title": match_in_title,
-    "abstract": match_in_abstract,
+# === ИНДЕКС ПОЛЕЙ ===
+# строится один раз; семантика совпадений — как у прежних match_in_*:
+# теги — точное равенство тегу, title/abstract — подстрока
+INDEX = FieldIndex.from_store(STORE)
+ARTICLE_IDS = list(STORE.ids)
+FIELD_MATCH = {
+    "tags": "equals",
+    "title": "contains",
+    "abstract": "contains",
 }
 
+def match_fields(terms, fields):
+    hits = set()
+    for f in fields:
+        hits |= INDEX.match(f, terms, FIELD_MATCH[f])
+    return hits
+
 # === RETRIEVE ===
 def retrieve(q: str, expand: bool, norm_mode: str, fields: list[str]) -> list[str]:
     raw = expand_query(q) if expand else [(q.lower(), 1.0)]
     terms = [t for t,_ in raw]
     normed = normalize_terms(terms, norm_mode)
     logging.debug(f"  Terms for '{q}' [{', '.join(fields)}]: {normed}")
-    result_ids = []
-    for doc in ARTICLES:
-        if any(FIELD_MATCHERS[f](doc, normed) for f in fields):
-            result_ids.append(doc["_id"]["$oid"])
-    return result_ids
+    return [ARTICLE_IDS[i] for i in sorted(match_fields(normed, fields))]
 
 # === GROUND TRUTH ===
 def ground_truth(q: str) -> set[str]:
     raw = expand_query(q)
     terms = normalize_terms([t for t,_ in raw], "none")
-    gt = set()
-    for doc in ARTICLES:
-        if (match_in_tags(doc, terms)
-            or match_in_title(doc, terms)
-            or match_in_abstract(doc, terms)):
-            gt.add(doc["_id"]["$oid"])
-    return gt
+    return {ARTICLE_IDS[i] for i in match_fields(terms, ["tags", "title", "abstract"])}
 
 # === ОЦЕНКА ===
 def eval_run(ids: list[str], gt: set[str]) -> tuple[float,float,float]:
@@ -164,4 +158,6 @@ if __name__ == "__main__":
     # записываем в JSON
     logging.info(f"Сохранение результатов в {OUTPUT_PATH}")
     OUTPUT_PATH.write_text(json.dumps(all_results, ensure_ascii=False, indent=2), encoding="utf-8")
+    logging.info(morph_lemmas.report())
+    logging.info(porter_stems.report())
     logging.info("Готово.")
@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import sys
 import json
 import logging
 from pathlib import Path
 from pymorphy3 import MorphAnalyzer
 from nltk.stem import PorterStemmer
-from sklearn.metrics import precision_score, recall_score, f1_score
+
+# общие модули (lemma_cache и др.) лежат уровнем выше, в scripts/python
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from lemma_cache import morph_lemma_cache, porter_stem_cache
+from synonym_index import open_or_build
+from field_index import FieldIndex
+import corpus_store
+from eval_metrics import pack, confusion, prf
 
 # === КОНФИГУРАЦИЯ ЛОГИРОВАНИЯ ===
 logging.basicConfig(
@@ -21,34 +29,31 @@ SYNONYMS_PATH = Path("query_synonyms.json")
 OUTPUT_PATH   = Path("evaluation_results.json")
 
 # === ЗАГРУЗКА ДАННЫХ ===
-logging.info(f"Загрузка статей из {ARTICLES_PATH}")
-ARTICLES = json.loads(ARTICLES_PATH.read_text(encoding="utf-8"))
+# колонки корпуса через mmap (.cache/corpus_store, строится при первом запуске)
+logging.info(f"Открытие хранилища корпуса для {ARTICLES_PATH}")
+STORE = corpus_store.open_or_build(ARTICLES_PATH)
 
 logging.info(f"Загрузка словаря синонимов из {SYNONYMS_PATH}")
-SYNONYMS = json.loads(SYNONYMS_PATH.read_text(encoding="utf-8"))
+SYNONYMS = open_or_build(SYNONYMS_PATH)
 
 # === Подготовка списка всех ID документов ===
-ALL_IDS = [doc["_id"]["$oid"] for doc in ARTICLES]
+ALL_IDS = list(STORE.ids)
 
 # === ЛЕММАТИЗАТОР И СТЕММЕР ===
 morph = MorphAnalyzer()
+morph_lemmas = morph_lemma_cache(morph, threshold=0.3)
 def lemmatize_term(term: str) -> str:
-    parsed = morph.parse(term)
-    if parsed and parsed[0].score > 0.3:
-        return parsed[0].normal_form.lower()
-    return term.lower()
+    return morph_lemmas.get(term.lower()).lower()
 
 stemmer = PorterStemmer()
+porter_stems = porter_stem_cache(stemmer)
 def stem_term(term: str) -> str:
-    return stemmer.stem(term.lower())
+    return porter_stems.get(term.lower())
 
 # === ФУНКЦИИ РАСШИРЕНИЯ И НОРМАЛИЗАЦИИ ===
 def expand_query(q: str):
     out = [(q.lower(), 1.0)]
-    for key, syns in SYNONYMS.items():
-        if key.lower() == q.lower():
-            out += [(s[0].lower(), float(s[1])) for s in syns]
-            break
+    out += [(syn.lower(), w) for syn, w in SYNONYMS.get(q)]
     return out
 
 def normalize_terms(terms: list[str], mode: str) -> list[str]:
@@ -60,73 +65,65 @@ def normalize_terms(terms: list[str], mode: str) -> list[str]:
         return [lemmatize_term(t) for t in terms]
     raise ValueError(f"Unknown normalization mode: {mode}")
 
-# === MATCHERS ДЛЯ ПОЛЕЙ ===
-def match_in_tags(doc, terms):
-    return any(t in (tag.lower() for tag in doc.get("tags", [])) for t in terms)
-
-def match_in_title(doc, terms):
-    title = doc.get("title", "").lower()
-    return any(t in title for t in terms)
-
-def match_in_abstract(doc, terms):
-    abstract = doc.get("abstract", "").lower()
-    return any(t in abstract for t in terms)
-
-FIELD_MATCHERS = {
-    "tags": match_in_tags,
-    "title": match_in_title,
-    "abstract": match_in_abstract,
+# === ИНДЕКС ПОЛЕЙ ===
+# строится один раз; семантика совпадений — как у прежних match_in_*:
+# теги — точное равенство тегу, title/abstract — подстрока
+INDEX = FieldIndex.from_store(STORE)
+FIELD_MATCH = {
+    "tags": "equals",
+    "title": "contains",
+    "abstract": "contains",
 }
 
+def match_fields(terms, fields):
+    hits = set()
+    for f in fields:
+        hits |= INDEX.match(f, terms, FIELD_MATCH[f])
+    return hits
+
 # === RETRIEVE ===
-def retrieve(q: str, expand: bool, norm_mode: str, fields: list[str]) -> list[str]:
+def retrieve_docs(q: str, expand: bool, norm_mode: str, fields: list[str]) -> list[int]:
+    """Позиции найденных статей в корпусе (по порядку STORE.ids)."""
     raw = expand_query(q) if expand else [(q.lower(), 1.0)]
     terms = [t for t,_ in raw]
     normed = normalize_terms(terms, norm_mode)
     logging.debug(f"  Terms for '{q}' [{','.join(fields)}]: {normed}")
-    result_ids = []
-    for doc in ARTICLES:
-        if any(FIELD_MATCHERS[f](doc, normed) for f in fields):
-            result_ids.append(doc["_id"]["$oid"])
-    return result_ids
+    return sorted(match_fields(normed, fields))
+
+def retrieve(q: str, expand: bool, norm_mode: str, fields: list[str]) -> list[str]:
+    return [ALL_IDS[i] for i in retrieve_docs(q, expand, norm_mode, fields)]
 
 # === GROUND TRUTH ===
-def ground_truth(q: str) -> set[str]:
+def ground_truth_docs(q: str) -> set[int]:
     # считаем, что релевантны все документы, где q или его синонимы встречаются в любом из трёх полей
     raw = expand_query(q)
     terms = normalize_terms([t for t,_ in raw], "none")
-    gt = set()
-    for doc in ARTICLES:
-        if (match_in_tags(doc, terms)
-            or match_in_title(doc, terms)
-            or match_in_abstract(doc, terms)):
-            gt.add(doc["_id"]["$oid"])
-    return gt
+    return match_fields(terms, ["tags", "title", "abstract"])
+
+def ground_truth(q: str) -> set[str]:
+    return {ALL_IDS[i] for i in ground_truth_docs(q)}
 
 # === ОЦЕНКА ПО ВСЕМУ КОРПУСУ ===
-def eval_run(ids: list[str], gt: set[str]) -> dict:
-    y_true = [1 if oid in gt else 0 for oid in ALL_IDS]
-    y_pred = [1 if oid in ids else 0 for oid in ALL_IDS]
-
-    p = precision_score(y_true, y_pred, zero_division=0)
-    r = recall_score(y_true, y_pred, zero_division=0)
-    f = f1_score(y_true, y_pred, zero_division=0)
-
-    # дополнительные счётчики
-    tp = sum(1 for yt,yp in zip(y_true, y_pred) if yt==1 and yp==1)
-    fp = sum(1 for yt,yp in zip(y_true, y_pred) if yt==0 and yp==1)
-    fn = sum(1 for yt,yp in zip(y_true, y_pred) if yt==1 and yp==0)
-    tn = sum(1 for yt,yp in zip(y_true, y_pred) if yt==0 and yp==0)
-
-    return {
-        "precision": round(p,3),
-        "recall":    round(r,3),
-        "f1":        round(f,3),
-        "tp": tp,
-        "fp": fp,
-        "fn": fn,
-        "tn": tn,
-    }
+def eval_cells(retrieved: list[list[int]], truths: list[set[int]]) -> list[dict]:
+    """
+    Метрики для пачки ячеек (запрос × набор полей × режим) за один проход:
+    найденные и релевантные — битовые маски по всему корпусу.
+    """
+    n_docs = len(ALL_IDS)
+    tp, fp, fn, tn = confusion(pack(retrieved, n_docs), pack(truths, n_docs), n_docs)
+    precision, recall, f1 = prf(tp, fp, fn)
+    return [
+        {
+            "precision": round(float(precision[c]),3),
+            "recall":    round(float(recall[c]),3),
+            "f1":        round(float(f1[c]),3),
+            "tp": int(tp[c]),
+            "fp": int(fp[c]),
+            "fn": int(fn[c]),
+            "tn": int(tn[c]),
+        }
+        for c in range(len(retrieved))
+    ]
 
 # === MAIN ===
 if __name__ == "__main__":
@@ -142,13 +139,25 @@ if __name__ == "__main__":
         ("[3] Tags + Title + Abstract", ["tags","title","abstract"]),
     ]
 
-    all_results = []
-
+    # Сначала выдачи всех ячеек, затем метрики одним векторным проходом
+    gts = []
+    truths = []
+    retrieved = []
     for q in queries:
         logging.info(f"\n=== Processing query: «{q}» ===")
-        gt = ground_truth(q)
+        gt = ground_truth_docs(q)
         logging.info(f"Ground-truth count: {len(gt)} / {len(ALL_IDS)} docs")
+        gts.append(gt)
+        for label, fields in field_sets:
+            for name, expand, norm in modes:
+                retrieved.append(retrieve_docs(q, expand, norm, fields))
+                truths.append(gt)
+
+    cell_stats = iter(eval_cells(retrieved, truths))
+    cell_docs = iter(retrieved)
+    all_results = []
 
+    for q, gt in zip(queries, gts):
         query_res = {
             "query": q,
             "ground_truth_count": len(gt),
@@ -156,13 +165,13 @@ if __name__ == "__main__":
         }
 
         for label, fields in field_sets:
-            logging.info(f"--- Field set: {label} ---")
+            logging.info(f"--- «{q}», field set: {label} ---")
             fs_res = {"label": label, "results": [], "delta_f1": {}}
             base_f1 = None
 
             for name, expand, norm in modes:
-                ids = retrieve(q, expand, norm, fields)
-                stats = eval_run(ids, gt)
+                ids = next(cell_docs)
+                stats = next(cell_stats)
                 logging.info(
                     f"{name:<10} → Ret={len(ids):>4}  "
                     f"P={stats['precision']:.3f}  "
@@ -191,4 +200,6 @@ if __name__ == "__main__":
     # сохраняем в JSON
     logging.info(f"\nСохранение результатов в {OUTPUT_PATH}")
     OUTPUT_PATH.write_text(json.dumps(all_results, ensure_ascii=False, indent=2), encoding="utf-8")
+    logging.info(morph_lemmas.report())
+    logging.info(porter_stems.report())
     logging.info("Готово.")
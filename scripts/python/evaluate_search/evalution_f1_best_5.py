@@ -1,17 +1,27 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+import sys
 import json
 import logging
+import argparse
 from pathlib import Path
+from multiprocessing import Pool
 from pymorphy3 import MorphAnalyzer
 from nltk.stem import PorterStemmer
-from sklearn.metrics import precision_score, recall_score, f1_score
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import linear_kernel
 from statistics import mean
 import numpy as np
 
+# shared modules (lemma_cache etc.) live one level up, in scripts/python
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from lemma_cache import morph_lemma_cache, porter_stem_cache
+from synonym_index import open_or_build
+from field_index import FieldIndex
+import corpus_store
+from eval_metrics import (pack, confusion, prf_retrieved,
+                          precision_at_k, ndcg_at_k, average_precision)
+
 # === CONFIGURE LOGGING ===
 logging.basicConfig(
     level=logging.INFO,
@@ -27,30 +37,35 @@ OUTPUT_PATH    = SCRIPT_DIR / "evaluation_results.json"
 SUMMARY_PATH   = SCRIPT_DIR / "metrics_summary.json"
 
 # === LOAD DATA ===
-logging.info(f"Loading articles from {ARTICLES_PATH}")
-ARTICLES = json.loads(ARTICLES_PATH.read_text(encoding="utf-8"))
+# Articles are not parsed at import: pool workers (spawned processes on
+# Windows) re-import this module. The parent converts the JSON once into
+# an mmap'd corpus_store and every process opens that (see init_worker).
+STORE       = None
+INDEX       = None
+ARTICLE_IDS = None
+TFIDF       = None
+BM25        = None
+
 logging.info(f"Loading synonyms from {SYNONYMS_PATH}")
-SYNONYMS = json.loads(SYNONYMS_PATH.read_text(encoding="utf-8"))
+SYNONYMS = open_or_build(SYNONYMS_PATH)
 
 # === LEMMATIZER & STEMMER ===
 morph = MorphAnalyzer()
+morph_lemmas = morph_lemma_cache(morph, threshold=0.3)
 def lemmatize_term(term: str) -> str:
-    parsed = morph.parse(term)
-    return parsed[0].normal_form.lower() if parsed and parsed[0].score > 0.3 else term.lower()
+    return morph_lemmas.get(term.lower()).lower()
 
 stemmer = PorterStemmer()
+porter_stems = porter_stem_cache(stemmer)
 def stem_term(term: str) -> str:
-    return stemmer.stem(term.lower())
+    return porter_stems.get(term.lower())
 
 # === EXPAND & NORMALIZE ===
 def expand_query(q: str, weight_threshold: float = 0.2):
     out = [(q.lower(), 1.0)]
-    for key, syns in SYNONYMS.items():
-        if key.lower() == q.lower():
-            for syn, w in syns:
-                if float(w) >= weight_threshold:
-                    out.append((syn.lower(), float(w)))
-            break
+    for syn, w in SYNONYMS.get(q):
+        if w >= weight_threshold:
+            out.append((syn.lower(), w))
     return out
 
 def normalize_terms(terms: list[str], mode: str) -> list[str]:
@@ -62,109 +77,219 @@ def normalize_terms(terms: list[str], mode: str) -> list[str]:
         return [lemmatize_term(t) for t in terms]
     raise ValueError(f"Unknown normalization mode: {mode}")
 
-# === FIELD MATCHERS ===
-def match_in_tags(doc, terms):
-    return any(t in tag.lower() for t in terms for tag in doc.get("tags", []))
-
-def match_in_title(doc, terms):
-    title = " " + doc.get("title", "").lower() + " "
-    return any(f" {t} " in title for t in terms)
-
-def match_in_abstract(doc, terms):
-    return any(t in doc.get("abstract", "").lower() for t in terms)
-
-FIELD_MATCHERS = {
-    "tags":     match_in_tags,
-    "title":    match_in_title,
-    "abstract": match_in_abstract,
+# === FIELD INDEX ===
+# opened from the corpus store; match semantics are those of the former
+# match_in_* helpers: tags and abstract — substring, title — whole-word
+# phrase (" term " in " title ")
+FIELD_MATCH = {
+    "tags":     "contains",
+    "title":    "words",
+    "abstract": "contains",
 }
 
+def match_fields(terms, fields):
+    hits = set()
+    for f in fields:
+        hits |= INDEX.match(f, terms, FIELD_MATCH[f])
+    return hits
+
 # === RETRIEVE ===
-def retrieve(q: str, expand: bool, norm_mode: str, fields: list[str]) -> list[str]:
+def retrieve_docs(q: str, expand: bool, norm_mode: str, fields: list[str]) -> list[int]:
+    """Positions of matching articles in the corpus (corpus order)."""
     raw_terms = expand_query(q) if expand else [(q.lower(), 1.0)]
     terms = normalize_terms([t for t,_ in raw_terms], norm_mode)
-    ids = []
-    for doc in ARTICLES:
-        if any(FIELD_MATCHERS[f](doc, terms) for f in fields):
-            ids.append(doc["_id"]["$oid"])
-    return ids
+    return sorted(match_fields(terms, fields))
+
+def retrieve(q: str, expand: bool, norm_mode: str, fields: list[str]) -> list[str]:
+    return [ARTICLE_IDS[i] for i in retrieve_docs(q, expand, norm_mode, fields)]
 
 # === GROUND TRUTH ===
-def ground_truth(q: str) -> set[str]:
+def ground_truth_docs(q: str) -> set[int]:
     terms = normalize_terms([t for t,_ in expand_query(q)], "none")
-    gt = set()
-    for doc in ARTICLES:
-        if (match_in_tags(doc, terms)
-            or match_in_title(doc, terms)
-            or match_in_abstract(doc, terms)):
-            gt.add(doc["_id"]["$oid"])
-    return gt
+    return match_fields(terms, ["tags", "title", "abstract"])
+
+def ground_truth(q: str) -> set[str]:
+    return {ARTICLE_IDS[i] for i in ground_truth_docs(q)}
 
 # === EVALUATION ===
-def eval_run(ids: list[str], gt: set[str]):
-    tp = sum(1 for i in ids if i in gt)
-    fp = len(ids) - tp
-    fn = len(gt) - tp
-    tn = len(ARTICLES) - tp - fp - fn
-    if not ids:
-        return 0.0, 0.0, 0.0, tp, fp, fn, tn
-    y_true = [1 if i in gt else 0 for i in ids]
-    y_pred = [1] * len(ids)
-    p = precision_score(y_true, y_pred, zero_division=0)
-    r = recall_score(   y_true, y_pred, zero_division=0)
-    f = f1_score(       y_true, y_pred, zero_division=0)
+RANK_K = 10   # cutoff for P@k / nDCG@k of ranked (scored) modes
+
+def eval_cells(retrieved: list[list[int]], truths: list[set[int]]):
+    """
+    Metrics for a batch of (query, field set, mode) cells in one pass over
+    packed document bitsets. P/R/F1 keep this script's historical
+    semantics (y_true/y_pred over retrieved docs only, see prf_retrieved);
+    TP/FP/FN/TN are corpus-wide.
+    """
+    n_docs = STORE.n_docs
+    tp, fp, fn, tn = confusion(pack(retrieved, n_docs), pack(truths, n_docs), n_docs)
+    p, r, f = prf_retrieved(tp, fp)
     return p, r, f, tp, fp, fn, tn
 
+def eval_ranked(ranked: list[list[int]], truths: list[set[int]]):
+    """P@k, nDCG@k and average precision for ranked result lists."""
+    relevant = pack(truths, STORE.n_docs)
+    return (precision_at_k(ranked, relevant, RANK_K),
+            ndcg_at_k(ranked, relevant, RANK_K),
+            average_precision(ranked, relevant))
+
 # === TF-IDF BASELINE ===
-logging.info("Building TF-IDF baseline…")
-corpus = [
-    " ".join((doc.get("title",""), doc.get("abstract",""), " ".join(doc.get("tags",[]))))
-    for doc in ARTICLES
+# fitted once when the corpus store is built (tfidf_index.py) and mmap'd
+# from it; all queries are scored together in one sparse product
+def tfidf_rank_batch(queries: list[str], k: int | None = None) -> list[list[int]]:
+    """Per query: positions of articles with a positive score, best first."""
+    return TFIDF.search(queries, k)
+
+def tfidf_rank(q: str, k: int | None = None) -> list[int]:
+    return tfidf_rank_batch([q], k)[0]
+
+def tfidf_search(q: str, k: int | None = None):
+    return [ARTICLE_IDS[i] for i in tfidf_rank(q, k)]
+
+# === BM25F ===
+# bm25_engine index from the corpus store; query terms are the expanded
+# and lemmatized ones (as in "Syn+Lemma"), each with its synonym weight
+def bm25_terms(q: str) -> list[tuple[str, float]]:
+    raw = expand_query(q)
+    return list(zip(normalize_terms([t for t,_ in raw], "lemma"), [w for _,w in raw]))
+
+def bm25_rank_batch(queries: list[str], k: int | None = None) -> list[list[int]]:
+    """Per query: positions of articles with a positive BM25F score, best first."""
+    return [[d for d,_ in BM25.search(bm25_terms(q), k)] for q in queries]
+
+# === EVALUATION GRID ===
+QUERIES    = ["machine learning", "optimization", "neural networks"]
+MODES      = [
+    ("Basic",     None,        False, "none"),
+    ("Synonyms",  None,        True,  "none"),
+    ("Syn+Lemma", None,        True,  "lemma"),
+    ("TF-IDF",    tfidf_rank_batch, None, None),
 ]
-vectorizer = TfidfVectorizer().fit(corpus)
-tfidf_matrix = vectorizer.transform(corpus)
-def tfidf_search(q: str):
-    qv = vectorizer.transform([q])
-    sim = linear_kernel(qv, tfidf_matrix).flatten()
-    idxs = [i for i,v in enumerate(sim) if v>0]
-    idxs.sort(key=lambda i: sim[i], reverse=True)
-    return [ARTICLES[i]["_id"]["$oid"] for i in idxs]
+# opt-in (--bm25): appended after the baseline modes; the summary
+# distributions stay over the baseline modes only
+BM25_MODE  = ("BM25F",     bm25_rank_batch,  None, None)
+BASE_MODES = [name for name, *_ in MODES]
+FIELD_SETS = [
+    ("[1] Tags only",               ["tags"]),
+    ("[2] Tags + Title",            ["tags","title"]),
+    ("[3] Tags + Title + Abstract", ["tags","title","abstract"]),
+]
+
+# === WORKERS ===
+def init_worker(store_dir, bm25=False):
+    """Open the shared corpus store (mmap) in this process."""
+    global STORE, INDEX, ARTICLE_IDS, TFIDF, BM25, MODES
+    STORE       = corpus_store.CorpusStore(store_dir)
+    INDEX       = FieldIndex.from_store(STORE)
+    ARTICLE_IDS = STORE.ids
+    TFIDF       = STORE.tfidf()
+    if bm25:
+        BM25    = STORE.bm25()
+        MODES   = [m for m in MODES if m[0] in BASE_MODES] + [BM25_MODE]
+
+def run_task(task):
+    """
+    One unit of work, given as indices into the grid:
+    ("gt", query) -> ground truth, ("cell", query, mode, field set) -> retrieved
+    positions, ("ranked", mode) -> rankings of all queries by a ranked mode
+    (fields do not apply).
+    Returns the result plus this process's lemma/stem cache stats.
+    """
+    kind, qi, mi, fi = task
+    if kind == "ranked":
+        result = MODES[mi][1](QUERIES)
+    elif kind == "gt":
+        result = sorted(ground_truth_docs(QUERIES[qi]))
+    else:
+        name, fn, expand, norm = MODES[mi]
+        result = retrieve_docs(QUERIES[qi], expand, norm, FIELD_SETS[fi][1])
+    # pool workers exit without atexit handlers: persist new lemmas now
+    morph_lemmas.flush()
+    porter_stems.flush()
+    return result, os.getpid(), (morph_lemmas.stats(), porter_stems.stats())
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Search quality evaluation (F1, TF-IDF baseline).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes for evaluation cells; 0 = all cores (default 1)")
+    parser.add_argument("--bm25", action="store_true",
+                        help="also evaluate the BM25F engine (extra mode, not in the summary distributions)")
+    return parser.parse_args()
 
 # === MAIN ===
 if __name__ == "__main__":
-    queries    = ["machine learning", "optimization", "neural networks"]
-    modes      = [
-        ("Basic",     None,        False, "none"),
-        ("Synonyms",  None,        True,  "none"),
-        ("Syn+Lemma", None,        True,  "lemma"),
-        ("TF-IDF",    tfidf_search, None, None),
-    ]
-    field_sets = [
-        ("[1] Tags only",               ["tags"]),
-        ("[2] Tags + Title",            ["tags","title"]),
-        ("[3] Tags + Title + Abstract", ["tags","title","abstract"]),
-    ]
+    args = parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    logging.info(f"Opening corpus store for {ARTICLES_PATH}")
+    store = corpus_store.open_or_build(ARTICLES_PATH)
+    init_worker(store.path, args.bm25)
+    queries, modes, field_sets = QUERIES, MODES, FIELD_SETS
 
-    all_results = []
-    for q in queries:
+    # Grid in the serial order: each ranked mode for all queries at once,
+    # then per query its ground truth and the field set × mode cells
+    tasks = [("ranked", None, mi, None) for mi, mode in enumerate(modes) if mode[1]]
+    for qi in range(len(queries)):
+        tasks.append(("gt", qi, None, None))
+        for fi in range(len(field_sets)):
+            for mi, (name, fn, expand, norm) in enumerate(modes):
+                if not fn:
+                    tasks.append(("cell", qi, mi, fi))
+
+    logging.info(f"Evaluating {len(tasks)} tasks with {workers} process(es)…")
+    if workers <= 1:
+        outputs = [run_task(t) for t in tasks]
+    else:
+        with Pool(processes=workers, initializer=init_worker, initargs=(str(store.path), args.bm25)) as pool:
+            outputs = pool.map(run_task, tasks, chunksize=1)   # results come back in task order
+    worker_stats = {pid: stats for _, pid, stats in outputs}
+    results = iter(result for result, _, _ in outputs)
+    ranked_by_mode = {mi: next(results) for mi, mode in enumerate(modes) if mode[1]}
+
+    # Every cell is retrieved; score the whole batch at once
+    gts, truths, retrieved = [], [], []
+    ranked, ranked_cells = [], []
+    for qi, q in enumerate(queries):
         logging.info(f"=== Processing «{q}» ===")
-        gt = ground_truth(q)
+        gt = set(next(results))
+        gts.append(gt)
+        for label, fields in field_sets:
+            for mi, (name, fn, expand, norm) in enumerate(modes):
+                docs = ranked_by_mode[mi][qi] if fn else next(results)
+                if fn:
+                    ranked_cells.append(len(retrieved))
+                    ranked.append(docs)
+                retrieved.append(docs)
+                truths.append(gt)
+
+    P, R, F, TP, FP, FN, TN = eval_cells(retrieved, truths)
+    ranked_metrics = eval_ranked(ranked, [truths[c] for c in ranked_cells])
+    ranked_stats = {c: [m[k] for m in ranked_metrics] for k, c in enumerate(ranked_cells)}
+
+    all_results = []
+    c = 0
+    for q, gt in zip(queries, gts):
         query_res = {"query": q, "ground_truth_count": len(gt), "field_sets": []}
         for label, fields in field_sets:
             fs_res = {"label": label, "results": [], "delta_f1": {}}
             base_f1 = None
             for name, fn, expand, norm in modes:
-                ids = fn(q) if fn else retrieve(q, expand, norm, fields)
-                p,r,f, tp,fp,fn_,tn = eval_run(ids, gt)
-                fs_res["results"].append({
+                f = float(F[c])
+                res = {
                     "mode":      name,
-                    "retrieved": len(ids),
-                    "precision": round(p,3),
-                    "recall":    round(r,3),
+                    "retrieved": len(retrieved[c]),
+                    "precision": round(float(P[c]),3),
+                    "recall":    round(float(R[c]),3),
                     "f1":        round(f,3),
-                    "tp": tp, "fp": fp, "fn": fn_, "tn": tn
-                })
+                    "tp": int(TP[c]), "fp": int(FP[c]), "fn": int(FN[c]), "tn": int(TN[c])
+                }
+                if c in ranked_stats:
+                    p_k, ndcg_k, ap = ranked_stats[c]
+                    res[f"p_at_{RANK_K}"]    = round(float(p_k),3)
+                    res[f"ndcg_at_{RANK_K}"] = round(float(ndcg_k),3)
+                    res["ap"]                = round(float(ap),3)
+                fs_res["results"].append(res)
                 if name=="Basic": base_f1 = f
+                c += 1
             for r in fs_res["results"]:
                 if r["mode"]!="Basic":
                     fs_res["delta_f1"][r["mode"]] = round(r["f1"] - base_f1, 3)
@@ -200,8 +325,9 @@ if __name__ == "__main__":
     # fill quartiles for each metric
     for key in ("precision", "recall", "f1"):
         arr = []
-        for mets in modes_data.values():
-            arr.extend(mets[key])
+        for mode, mets in modes_data.items():
+            if mode in BASE_MODES:
+                arr.extend(mets[key])
         pct = np.percentile(arr, [0,25,50,75,100])
         summary["distributions"][key.capitalize()] = {
             "low":    round(float(pct[0]), 3),
@@ -216,4 +342,8 @@ if __name__ == "__main__":
         json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8"
     )
 
+    for pid, (lemma_stats, stem_stats) in sorted(worker_stats.items()):
+        for st in (lemma_stats, stem_stats):
+            logging.info(f"[pid {pid}] lemma_cache [{st['namespace']}]: {st['lookups']} lookups, "
+                         f"hit rate {st['hit_rate']:.1%}")
     logging.info("All done.")
@@ -1,5 +1,65 @@
-import arxiv
+"""
+Сбор статей arXiv по темам TOPICS в arxiv_dataset.json.
+
+Путь датасета — --output, иначе переменная окружения ARXIV_DATASET_PATH,
+иначе storage/app/arxiv_dataset.json проекта.
+Формат — по расширению (см. jsonstream.py): .json — массив по статье на
+строку, .jsonl — JSON Lines, суффикс .gz включает сжатие.
+
+Темы качаются параллельно (--workers потоков), но все запросы к API
+проходят через общий ограничитель частоты (--rate запросов в секунду;
+arXiv просит не чаще одного запроса в 3 секунды), так что параллельность
+перекрывает только ожидание ответов. Неудачные запросы (сеть, 429/5xx,
+неожиданно пустая страница) повторяются с экспоненциальной задержкой.
+
+Сбор инкрементальный. Рядом с датасетом лежат:
+    <output>.state.json     — по каждой теме: время updated самой свежей
+                              уже собранной статьи (водяной знак) и, для
+                              незаконченного прохода, смещение следующей страницы;
+    <output>.pending/       — журнал статей, скачанных, но ещё не слитых
+                              в датасет: файл на тему, дописывается после
+                              каждой страницы.
+Первый проход по теме — MAX_RESULTS статей по релевантности, как раньше.
+Следующие запуски идут по теме в порядке lastUpdatedDate и останавливаются
+на первой статье старше водяного знака (сколько бы страниц до неё ни было) —
+качаются только новые и обновлённые статьи; статьи с временем, равным знаку,
+берутся заново (время — с точностью до секунды). После прерывания запуск продолжает с
+сохранённого смещения, уже скачанное берётся из журнала.
+
+В конце журнал сливается с датасетом: повторы определяются по arxiv_id
+(без версии vN), более свежая версия заменяет запись на её месте, новые
+статьи дописываются в порядке TOPICS, внутри темы — в порядке выдачи.
+Слияние потоковое: журнал читается по файлу темы в порядке TOPICS, в памяти
+только индекс arxiv_id → (updated, файл, смещение) самой свежей версии;
+старый датасет читается по записи и переписывается во временный файл,
+статьи из журнала достаются по смещению. Затем продвигаются водяные знаки
+законченных тем и удаляется журнал.
+--full игнорирует водяные знаки и собирает темы заново.
+
+Для проверки без сети — заглушка API arxiv_stub.py:
+    python arxiv_stub.py --port 8790 &
+    python fetch_arxiv.py --api-url http://127.0.0.1:8790/api/query --rate 20 --output /tmp/arxiv.json
+"""
+import os
+import re
+import sys
 import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+from urllib.parse import urlencode
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+
+import feedparser
+
+from jsonstream import iter_records, RecordWriter
 
 CATEGORY_MAP = {
     "cs.AI": "Artificial Intelligence",
@@ -61,51 +121,404 @@ TOPICS = [
     "data mining"
 ]
 
-client = arxiv.Client()
-articles = []
-seen_titles = set()
-
-for topic in TOPICS:
-    print(f"Собираем статьи по теме: {topic}")
-    search = arxiv.Search(
-        query=topic,
-        max_results=500,
-        sort_by=arxiv.SortCriterion.Relevance
-    )
-    for result in client.results(search):
-        readable_tags = [CATEGORY_MAP.get(cat) for cat in result.categories if CATEGORY_MAP.get(cat)]
-        if not readable_tags:
-            continue
-
-        if result.title in seen_titles:
-            continue
-
-        seen_titles.add(result.title)
-
-        article_data = {
-            "title": result.title,
-            "abstract": result.summary.replace('\n', ' ').strip(),
-            "tags": readable_tags,
-            "authors": [a.name for a in result.authors] if result.authors else [],
-            "affiliations": [getattr(a, 'affiliation', '') for a in result.authors] if result.authors else [],
-            "date": result.published.strftime("%Y-%m-%dT%H:%M:%S") if result.published else None,
-            "updated": result.updated.strftime("%Y-%m-%dT%H:%M:%S") if hasattr(result, 'updated') and result.updated else None,
-            "arxiv_id": result.entry_id,  # Это ссылка на статью, типа "http://arxiv.org/abs/XXXX"
-            "primary_category": CATEGORY_MAP.get(result.primary_category, result.primary_category),
-            "categories": [CATEGORY_MAP.get(cat, cat) for cat in result.categories],
-            "doi": getattr(result, "doi", None),
-            "pdf_url": result.pdf_url if hasattr(result, "pdf_url") else None,
-            "comment": getattr(result, "comment", None),
-            "journal_ref": getattr(result, "journal_ref", None),
-            "lang": "en"
-        }
-
-        articles.append(article_data)
-
-print(f"\nВсего загружено статей: {len(articles)}")
-
-output_path = r"D:\projects\nummy\storage\app\arxiv_dataset.json"
-with open(output_path, "w", encoding="utf-8") as f:
-    json.dump(articles, f, ensure_ascii=False, indent=2)
-
-print(f"Файл {output_path} успешно сохранён.")
+# как в pipeline.py: storage/app проекта, если не задан ARXIV_DATASET_PATH
+OUTPUT_PATH = os.environ.get("ARXIV_DATASET_PATH",
+                             str(Path(__file__).resolve().parents[2] / "storage" / "app" / "arxiv_dataset.json"))
+API_URL = "https://export.arxiv.org/api/query"
+MAX_RESULTS = 500        # статей на тему
+PAGE_SIZE = 100          # статей в одном запросе к API (как у arxiv.Client)
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 1 / 3     # запросов в секунду на всех (правила arXiv API)
+RETRIES = 4
+BACKOFF = 2.0            # задержка перед k-м повтором: BACKOFF * 2**k (+ случайная добавка)
+TIMEOUT = 60
+USER_AGENT = "nummy-fetch-arxiv/1.0"
+STATE_VERSION = 1
+SORT_RELEVANCE = "relevance"         # sortBy API (как arxiv.SortCriterion)
+SORT_UPDATED = "lastUpdatedDate"
+
+# === ОГРАНИЧЕНИЕ ЧАСТОТЫ ===
+
+class RateLimiter:
+    """Общий для потоков интервал между началами запросов: не чаще rate в секунду."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class FetchError(Exception):
+    pass
+
+# === ЗАГРУЗКА ===
+
+def page_url(api_url, topic, start, page_size, sort_by=SORT_RELEVANCE):
+    args = {
+        "search_query": topic,
+        "id_list": "",
+        "sortBy": sort_by,
+        "sortOrder": "descending",
+        "start": start,
+        "max_results": page_size,
+    }
+    return f"{api_url}?{urlencode(args)}"
+
+def fetch_feed(url, limiter, first_page, retries=RETRIES, backoff=BACKOFF):
+    """Одна страница Atom-выдачи с повторами; пустая не первая страница — тоже повод повторить."""
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        delay = backoff * 2 ** attempt * (1 + random.random() / 2)
+        try:
+            request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+            with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+                feed = feedparser.parse(response.read())
+            if feed.entries or first_page:
+                return feed
+            error = "пустая страница"
+        except urllib.error.HTTPError as e:
+            if e.code != 429 and e.code < 500:
+                raise FetchError(f"{url}: HTTP {e.code}") from e
+            retry_after = e.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            error = f"HTTP {e.code}"
+        except (urllib.error.URLError, OSError) as e:
+            error = str(e)
+        if attempt < retries:
+            print(f"  повтор через {delay:.1f} с ({error}): {url}")
+            time.sleep(delay)
+    raise FetchError(f"{url}: {error}, попыток: {retries + 1}")
+
+# === СОСТОЯНИЕ И ЖУРНАЛ ===
+
+def state_path(output):
+    return f"{output}.state.json"
+
+def journal_path(output):
+    return f"{output}.pending"
+
+def write_json_atomic(path, data, indent=None):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class HarvestState:
+    """
+    Состояние тем в <output>.state.json; сохраняется целиком после каждого
+    изменения (запись атомарная — прерывание не портит файл).
+        watermark  — updated самой свежей статьи, уже слитой в датасет
+        pass       — незаконченный проход: mode (full/update), since, offset,
+                     run_max (самое свежее updated прохода), done
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.topics = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == STATE_VERSION:
+                self.topics = data.get("topics", {})
+        self._lock = threading.Lock()
+
+    def get(self, topic):
+        with self._lock:
+            return dict(self.topics.get(topic, {}))
+
+    def update(self, topic, **fields):
+        with self._lock:
+            self.topics.setdefault(topic, {}).update(fields)
+            write_json_atomic(self.path, {"version": STATE_VERSION, "topics": self.topics}, indent=2)
+            return dict(self.topics[topic])
+
+class Journal:
+    """
+    Скачанные, но не слитые статьи: каталог path, по файлу на тему, строка
+    JSON на статью, дозапись с fsync. Тема качается одним потоком, так что
+    файл темы — в порядке выдачи. count и bytes — сколько записей и байт
+    дописано за этот запуск.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._migrate(f"{path}.jsonl")
+
+    def topic_path(self, topic):
+        slug = re.sub(r"\W+", "_", topic).strip("_")[:40]
+        digest = hashlib.md5(topic.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.path, f"{slug}-{digest}.jsonl")
+
+    def append(self, topic, records):
+        if not records:
+            return
+        lines = "".join(json.dumps({"topic": topic, "pos": pos, "article": article}, ensure_ascii=False) + "\n"
+                        for pos, article in records)
+        data = lines.encode("utf-8")
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(self.topic_path(topic), "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self.count += len(records)
+            self.bytes += len(data)
+
+    def files(self, topics):
+        """Файлы журнала: темы topics по порядку, затем прочие (темы прошлых запусков) по имени."""
+        if not os.path.isdir(self.path):
+            return []
+        known = [self.topic_path(t) for t in topics]
+        names = sorted(n for n in os.listdir(self.path) if n.endswith(".jsonl"))
+        other = [p for p in (os.path.join(self.path, n) for n in names) if p not in known]
+        return [p for p in known if os.path.exists(p)] + other
+
+    @staticmethod
+    def scan(path):
+        """(смещение строки, запись) по порядку файла."""
+        with open(path, "rb") as f:
+            offset = 0
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break   # недописанная последняя строка после аварии
+                yield offset, record
+                offset += len(line)
+
+    def clear(self):
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+
+    def _migrate(self, legacy):
+        """Общий журнал прежних версий (<output>.pending.jsonl) — по файлам тем."""
+        if not os.path.exists(legacy):
+            return
+        for _, record in self.scan(legacy):
+            self.append(record["topic"], [(record["pos"], record["article"])])
+        self.count = self.bytes = 0
+        os.remove(legacy)
+
+def paper_key(arxiv_id):
+    """arxiv_id без версии: http://arxiv.org/abs/2401.00001v2 → 2401.00001."""
+    return re.sub(r"v\d+$", "", (arxiv_id or "").rsplit("/abs/", 1)[-1])
+
+def timestamp(entry, field):
+    """Время записи Atom (updated/published, UTC) как в датасете; "" — нет поля."""
+    parsed = entry.get(f"{field}_parsed")
+    return time.strftime("%Y-%m-%dT%H:%M:%S", parsed) if parsed else ""
+
+# === ЗАГРУЗКА ТЕМЫ ===
+
+def harvest_topic(topic, limiter, state, journal, api_url=API_URL, max_results=MAX_RESULTS,
+                  page_size=PAGE_SIZE, full=False):
+    """
+    Проход по теме с продолжением после прерывания: статьи каждой страницы
+    пишутся в журнал, смещение — в состояние. Возвращает число новых статей.
+
+    Полный проход ограничен max_results. Проход обновления идёт до водяного
+    знака или конца выдачи без ограничения: иначе статьи между max_results
+    новыми и водяным знаком пропали бы, а знак всё равно продвинулся бы.
+    """
+    st = state.get(topic)
+    run = st.get("pass")
+    if not run or (full and run["mode"] != "full"):
+        since = None if full else st.get("watermark")
+        run = {"mode": "update" if since else "full", "since": since, "offset": 0,
+               "run_max": since, "done": False}
+        state.update(topic, **{"pass": run})
+    elif run["offset"]:
+        print(f"Продолжаем тему {topic} со смещения {run['offset']}")
+    if run["done"]:
+        return 0
+
+    sort_by = SORT_UPDATED if run["mode"] == "update" else SORT_RELEVANCE
+    since, start, run_max = run["since"], run["offset"], run["run_max"]
+    limit = max_results if run["mode"] == "full" else None
+    fetched = 0
+    reached_watermark = False
+    while not reached_watermark and (limit is None or start < limit):
+        size = page_size if limit is None else min(page_size, limit - start)
+        feed = fetch_feed(page_url(api_url, topic, start, size, sort_by), limiter, first_page=start == 0)
+        if not feed.entries:
+            break
+        records = []
+        for pos, entry in enumerate(feed.entries, start):
+            if "id" not in entry:
+                continue
+            updated = timestamp(entry, "updated")
+            run_max = max(run_max or "", updated)
+            if since and updated < since:
+                reached_watermark = True   # дальше по lastUpdatedDate — только уже собранное
+                continue
+            # updated == since: в ту же секунду могла обновиться и не собранная статья —
+            # берём заново, повтор уберёт слияние (paper_key)
+            article = to_article(entry)
+            if article is not None:
+                records.append((pos, article))
+        journal.append(topic, records)
+        fetched += len(records)
+        start += len(feed.entries)
+        total = int(feed.feed.get("opensearch_totalresults", 0))
+        run = state.update(topic, **{"pass": dict(run, offset=start, run_max=run_max)})["pass"]
+        if start >= total:
+            break
+
+    state.update(topic, **{"pass": dict(run, done=True)})
+    print(f"Собраны статьи по теме: {topic} (новых: {fetched}; "
+          f"в журнале за запуск: {journal.count}, {journal.bytes / 2**20:.1f} МБ)")
+    return fetched
+
+def to_article(entry):
+    """
+    Запись arxiv_dataset.json из записи Atom (feedparser); None, если у
+    статьи нет известных категорий. Поля — те же, что давал arxiv.Result
+    (его разбор выдачи — закрытый API пакета arxiv, поэтому здесь свой).
+    """
+    categories = [tag.get("term") for tag in entry.get("tags", [])]
+    readable_tags = [CATEGORY_MAP.get(cat) for cat in categories if CATEGORY_MAP.get(cat)]
+    if not readable_tags:
+        return None
+    authors = [a.get("name") for a in entry.get("authors", [])]
+    primary = entry.get("arxiv_primary_category", {}).get("term")
+    pdf_urls = [link.get("href") for link in entry.get("links", []) if link.get("title") == "pdf"]
+    return {
+        "title": re.sub(r"\s+", " ", entry.get("title", "0")),
+        "abstract": entry.get("summary", "").replace('\n', ' ').strip(),
+        "tags": readable_tags,
+        "authors": authors,
+        # аффилиаций arxiv.Result не разбирал — в датасете всегда пустые строки
+        "affiliations": ["" for _ in authors],
+        "date": timestamp(entry, "published") or None,
+        "updated": timestamp(entry, "updated") or None,
+        "arxiv_id": entry.get("id"),  # Это ссылка на статью, типа "http://arxiv.org/abs/XXXX"
+        "primary_category": CATEGORY_MAP.get(primary, primary),
+        "categories": [CATEGORY_MAP.get(cat, cat) for cat in categories],
+        "doi": entry.get("arxiv_doi"),
+        "pdf_url": pdf_urls[0] if pdf_urls else None,
+        "comment": entry.get("arxiv_comment"),
+        "journal_ref": entry.get("arxiv_journal_ref"),
+        "lang": "en"
+    }
+
+# === СЛИЯНИЕ С ДАТАСЕТОМ ===
+
+def load_dataset(path):
+    """Статьи датасета по одной (JSON-массив или JSON Lines, в т.ч. .gz)."""
+    if not os.path.exists(path):
+        return iter(())
+    return iter_records(path)
+
+def merge_pending(dataset, journal, topics, writer):
+    """
+    Журнал + датасет → writer: статьи датасета по порядку, уже известная
+    статья заменяется более свежей версией на своём месте, новые — в конец
+    (порядок тем, затем выдачи). Оба читаются потоком: в памяти только
+    индекс ключ → (updated, файл, смещение) самой свежей версии.
+    """
+    files = journal.files(topics)
+    fresh = {}   # порядок словаря — первое появление ключа
+    for i, path in enumerate(files):
+        for offset, record in journal.scan(path):
+            article = record["article"]
+            key = paper_key(article.get("arxiv_id"))
+            updated = article.get("updated") or ""
+            if key not in fresh or updated > fresh[key][0]:
+                fresh[key] = (updated, i, offset)
+
+    with ExitStack() as stack:
+        handles = [stack.enter_context(open(path, "rb")) for path in files]
+
+        def read(i, offset):
+            handles[i].seek(offset)
+            return json.loads(handles[i].readline())["article"]
+
+        replaced = 0
+        for article in dataset:
+            newer = fresh.pop(paper_key(article.get("arxiv_id")), None)
+            if newer is not None and newer[0] > (article.get("updated") or ""):
+                article = read(*newer[1:])
+                replaced += 1
+            writer.write(article)
+        for _, i, offset in fresh.values():
+            writer.write(read(i, offset))
+    return len(fresh), replaced
+
+def harvest(topics, output, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, api_url=API_URL,
+            max_results=MAX_RESULTS, page_size=PAGE_SIZE, full=False):
+    """
+    Инкрементальный сбор по всем темам в датасет output. Темы качаются
+    параллельно; слияние и продвижение водяных знаков — в одном потоке.
+    Возвращает (добавлено, обновлено, размер датасета, темы с ошибками).
+    """
+    limiter = RateLimiter(rate)
+    state = HarvestState(state_path(output))
+    journal = Journal(journal_path(output))
+
+    def run(topic):
+        try:
+            harvest_topic(topic, limiter, state, journal, api_url, max_results, page_size, full)
+            return None
+        except FetchError as e:
+            print(f"Тема {topic} не докачана, продолжится при следующем запуске: {e}")
+            return topic
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        failed = [t for t in pool.map(run, topics) if t]
+
+    with RecordWriter(output) as writer:
+        added, replaced = merge_pending(load_dataset(output), journal, topics, writer)
+    print(f"Записано статей: {writer.count}, {writer.bytes / 2**20:.1f} МБ JSON "
+          f"(на диске {os.path.getsize(output) / 2**20:.1f} МБ)")
+
+    # датасет уже содержит всё из журнала — теперь можно продвинуть водяные знаки
+    for topic in topics:
+        run_state = state.get(topic).get("pass")
+        if run_state and run_state["done"]:
+            state.update(topic, watermark=run_state["run_max"], **{"pass": None})
+    journal.clear()
+    return added, replaced, writer.count, failed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Сбор статей arXiv по темам TOPICS.")
+    parser.add_argument("--output", default=OUTPUT_PATH,
+                        help="датасет: .json, .jsonl, можно с .gz "
+                             "(по умолчанию $ARXIV_DATASET_PATH или storage/app/arxiv_dataset.json)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="тем одновременно")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help="запросов к API в секунду на все потоки")
+    parser.add_argument("--api-url", default=API_URL, help="адрес API (например, заглушки arxiv_stub.py)")
+    parser.add_argument("--max-results", type=int, default=MAX_RESULTS,
+                        help="статей на тему при полном проходе (обновление идёт до водяного знака)")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="статей в одном запросе")
+    parser.add_argument("--full", action="store_true",
+                        help="собрать темы заново, не останавливаясь на уже собранном")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    started = time.monotonic()
+    added, replaced, total, failed = harvest(TOPICS, args.output, args.workers, args.rate, args.api_url,
+                                             args.max_results, args.page_size, args.full)
+    print(f"\nНовых статей: {added}, обновлено: {replaced}, всего в датасете: {total} "
+          f"({time.monotonic() - started:.1f} с)")
+    print(f"Файл {args.output} успешно сохранён.")
+    if failed:
+        print(f"Не докачаны темы: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
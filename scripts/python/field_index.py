@@ -0,0 +1,124 @@
+"""
+Индекс полей статей (tags, title, abstract) для скриптов оценки поиска.
+
+Прежние матчеры проверяли каждый термин подстрокой в каждом документе:
+запросы × режимы × наборы полей × корпус. Здесь корпус индексируется
+один раз: для каждого поля — словарь токенов (по пробельным символам)
+и списки значений поля, где токен встречается.
+
+Семантика та же, что у матчеров, — подстрока, а не токен. Если термин
+входит в текст подстрокой, то каждый его кусок без пробелов лежит внутри
+одного токена текста; поэтому кандидаты — значения, где для каждого куска
+есть содержащий его токен (поиск по словарю, он много меньше корпуса),
+а окончательно кандидаты проверяются той же проверкой `term in text`.
+
+Режимы сравнения (how):
+    contains — term in value              (title/abstract; tags в _5)
+    equals   — term == value              (tags: t in [tag.lower() ...])
+    words    — f" {term} " in f" {value} " (title в _5)
+"""
+from collections import defaultdict
+
+class FieldIndex:
+
+    def __init__(self, articles, fields=("tags", "title", "abstract")):
+        self.n_docs = len(articles)
+        self._units = {}      # поле → значения в нижнем регистре
+        self._owners = {}     # поле → номер статьи для каждого значения
+        self._postings = {}   # поле → токен → номера значений
+        self._exact = {}      # поле → значение → номера статей (строится по требованию)
+        self._cache = {}
+
+        for field in fields:
+            units, owners = [], []
+            for i, doc in enumerate(articles):
+                value = doc.get(field, "")
+                for v in (value if isinstance(value, list) else [value]):
+                    units.append(v.lower())
+                    owners.append(i)
+
+            postings = defaultdict(list)
+            for u, text in enumerate(units):
+                for token in set(text.split()):
+                    postings[token].append(u)
+
+            self._units[field] = units
+            self._owners[field] = owners
+            self._postings[field] = dict(postings)
+
+    @classmethod
+    def from_store(cls, store, fields=("tags", "title", "abstract")):
+        """Индекс поверх готовых колонок corpus_store.CorpusStore (mmap, без перестройки)."""
+        index = cls([], ())
+        index.n_docs = store.n_docs
+        for field in fields:
+            index._units[field] = store.units(field)
+            index._owners[field] = store.owners(field)
+            index._postings[field] = store.postings(field)
+        return index
+
+    def columns(self, field):
+        """(значения поля, номера их статей, токен → номера значений) — для corpus_store."""
+        return self._units[field], self._owners[field], self._postings[field]
+
+    def _exact_values(self, field):
+        if field not in self._exact:
+            exact = defaultdict(set)
+            for text, owner in zip(self._units[field], self._owners[field]):
+                exact[text].add(int(owner))
+            self._exact[field] = {k: frozenset(v) for k, v in exact.items()}
+        return self._exact[field]
+
+    def _tokens_containing(self, field, piece):
+        """Значения поля, где какой-то токен содержит piece."""
+        key = (field, "piece", piece)
+        if key not in self._cache:
+            units = set()
+            postings = self._postings[field]
+            for token in postings:
+                if piece in token:
+                    units.update(postings[token])
+            self._cache[key] = units
+        return self._cache[key]
+
+    def _candidates(self, field, term):
+        pieces = sorted(set(term.split()), key=len, reverse=True)
+        if not pieces:
+            return range(len(self._units[field]))
+        candidates = None
+        for piece in pieces:
+            units = self._tokens_containing(field, piece)
+            candidates = set(units) if candidates is None else candidates & units
+            if not candidates:
+                break
+        return candidates
+
+    def lookup(self, field, term, how="contains"):
+        """Номера статей, где поле совпадает с термином в режиме how."""
+        key = (field, how, term)
+        if key in self._cache:
+            return self._cache[key]
+
+        if how == "equals":
+            docs = self._exact_values(field).get(term, frozenset())
+        else:
+            units = self._units[field]
+            owners = self._owners[field]
+            if how == "contains":
+                docs = frozenset(int(owners[u]) for u in self._candidates(field, term) if term in units[u])
+            elif how == "words":
+                padded = f" {term} "
+                docs = frozenset(int(owners[u]) for u in self._candidates(field, term)
+                                 if padded in f" {units[u]} ")
+            else:
+                raise ValueError(f"Unknown match mode: {how}")
+
+        self._cache[key] = docs
+        return docs
+
+    def match(self, field, terms, how="contains"):
+        """Статьи, где поле совпадает хотя бы с одним из терминов."""
+        docs = set()
+        for term in terms:
+            docs |= self.lookup(field, term, how)
+        return docs
@@ -0,0 +1,173 @@
+"""
+Потоковое чтение/запись наборов записей (статей) для python-скриптов.
+
+Вход: JSON-массив (читается инкрементально, без json.load всего файла)
+или JSON Lines — формат определяется по первому непробельному символу.
+Выход: по расширению — .jsonl (запись на строку) или .json (массив,
+по записи на строку; такой файл читают сидеры и контроллеры Laravel).
+Суффикс .gz на входе и выходе включает gzip-сжатие.
+"""
+import os
+import gzip
+import json
+
+READ_CHUNK = 1 << 16
+
+_decoder = json.JSONDecoder()
+
+def is_gzip(path):
+    return str(path).endswith(".gz")
+
+def is_jsonl(path):
+    name = str(path)
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return name.endswith(".jsonl") or name.endswith(".ndjson")
+
+def open_text(path, mode="r", compress=None):
+    """Открывает текстовый файл, прозрачно распаковывая/сжимая .gz."""
+    encoding = "utf-8-sig" if "r" in mode else "utf-8"
+    if compress is None:
+        compress = is_gzip(path)
+    if compress:
+        return gzip.open(path, mode + "t", encoding=encoding, newline="")
+    return open(path, mode, encoding=encoding, newline="")
+
+def _skip(buf, pos, chars):
+    n = len(buf)
+    while pos < n and buf[pos] in chars:
+        pos += 1
+    return pos
+
+def _iter_array(f, buf):
+    """Элементы JSON-массива по одному; buf — уже прочитанное начало после '['."""
+    pos = 0
+    eof = False
+    while True:
+        pos = _skip(buf, pos, " \t\r\n,")
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("неожиданный конец файла внутри JSON-массива")
+            chunk = f.read(READ_CHUNK)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            item, end = _decoder.raw_decode(buf, pos)
+            if end == len(buf) and not eof:
+                # число/литерал на границе буфера может быть обрезано
+                raise json.JSONDecodeError("incomplete", buf, end)
+        except json.JSONDecodeError:
+            # Элемент прочитан не целиком — дочитываем и пробуем снова
+            if eof:
+                raise
+            chunk = f.read(READ_CHUNK)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        pos = end
+        if pos > READ_CHUNK:
+            buf = buf[pos:]
+            pos = 0
+
+def iter_records(path):
+    """Записи из JSON-массива или JSON Lines (в т.ч. .gz), по одной."""
+    with open_text(path, "r") as f:
+        head = f.read(READ_CHUNK)
+        stripped = head.lstrip()
+        while not stripped and head:
+            head = f.read(READ_CHUNK)
+            stripped = head.lstrip()
+        if not stripped:
+            return
+        if stripped[0] == "[":
+            yield from _iter_array(f, stripped[1:])
+            return
+
+        # JSON Lines
+        rest = ""
+        chunk = stripped
+        while True:
+            lines = (rest + chunk).split("\n")
+            rest = lines.pop()
+            for line in lines:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                break
+        if rest.strip():
+            yield json.loads(rest)
+
+class RecordWriter:
+    """
+    Пишет записи по мере поступления. Формат — по расширению пути
+    (.jsonl/.json, опционально .gz). Файл пишется во временный
+    <path>.tmp и атомарно заменяет path только при успешном закрытии.
+
+    count — число записей, bytes — объём несжатых данных.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = str(path)
+        self.jsonl = is_jsonl(path)
+        self.append = append and self.jsonl
+        self.count = 0
+        self.bytes = 0
+        if self.append:
+            self._target = self.path
+            self._f = open_text(self.path, "a")
+        else:
+            self._target = self.path + ".tmp"
+            self._f = open_text(self._target, "w", compress=is_gzip(self.path))
+            if not self.jsonl:
+                self._write("[")
+
+    def _write(self, text):
+        self._f.write(text)
+        self.bytes += len(text.encode("utf-8"))
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        if self.jsonl:
+            self._write(line + "\n")
+        else:
+            self._write(("\n" if self.count == 0 else ",\n") + line)
+        self.count += 1
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        if self._f is None:
+            return
+        if not self.jsonl:
+            self._write("\n]\n" if self.count else "]\n")
+        self._f.close()
+        self._f = None
+        if self._target != self.path:
+            os.replace(self._target, self.path)
+
+    def abort(self):
+        """Закрыть без замены целевого файла (при ошибке)."""
+        if self._f is None:
+            return
+        self._f.close()
+        self._f = None
+        if self._target != self.path and os.path.exists(self._target):
+            os.remove(self._target)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
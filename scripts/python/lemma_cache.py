@@ -0,0 +1,194 @@
+"""
+Общий кэш токен → лемма/стем для python-скриптов проекта.
+
+In-process LRU стоит перед постоянным хранилищем SQLite, так что повторные
+прогоны нормализации и оценки почти не вызывают morph.parse / stemmer.stem.
+Ключ пространства имён — (анализатор с версией, режим, порог score):
+смена версии pymorphy3 или порога автоматически даёт «чистый» кэш.
+
+Путь к базе: переменная окружения LEMMA_CACHE_PATH или .cache/lemma_cache.sqlite3
+рядом со скриптами. LEMMA_CACHE_PATH=off отключает диск (остаётся только LRU).
+"""
+import os
+import sys
+import atexit
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_PATH = Path(__file__).resolve().parent / ".cache" / "lemma_cache.sqlite3"
+DEFAULT_LRU_SIZE = 200_000   # сколько токенов держим в памяти процесса
+FLUSH_EVERY = 1000           # новые значения пишем на диск пачками
+
+def _default_path():
+    env = os.environ.get("LEMMA_CACHE_PATH")
+    if env and env.lower() == "off":
+        return None
+    return Path(env) if env else DEFAULT_PATH
+
+class LemmaCache:
+    """
+    Мемоизация функции compute(token) -> str.
+
+    Потокобезопасен (нужно для normalize_query.py --serve): блокировка
+    держится только на время работы со словарями LRU и _pending, запрос
+    к SQLite и compute идут без неё — медленный токен не задерживает
+    остальные потоки. Соединение с SQLite — под своей блокировкой. В каждом
+    процессе — своё соединение с SQLite; база в режиме WAL, поэтому
+    параллельные воркеры могут писать одновременно.
+    """
+
+    def __init__(self, analyzer, mode, threshold, compute,
+                 path="default", lru_size=DEFAULT_LRU_SIZE):
+        self.namespace = f"{analyzer}|{mode}|{threshold}"
+        self.compute = compute
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()      # _lru, _pending, счётчики
+        self._db_lock = threading.Lock()   # соединение с SQLite
+        self._conn = None
+        self.hits = 0        # найдено в LRU
+        self.disk_hits = 0   # найдено в SQLite
+        self.misses = 0      # пришлось считать
+
+        if path == "default":
+            path = _default_path()
+        if path is not None:
+            self._open(Path(path))
+        atexit.register(self.close)
+
+    def _open(self, path):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS lemmas ("
+                " namespace TEXT NOT NULL,"
+                " token TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " PRIMARY KEY (namespace, token)"
+                ") WITHOUT ROWID"
+            )
+            conn.commit()
+            self._conn = conn
+        except sqlite3.Error as e:
+            # Нет прав на запись и т.п. — работаем только с LRU
+            print(f"lemma_cache: диск недоступен ({path}): {e}", file=sys.stderr)
+            self._conn = None
+
+    def get(self, token):
+        with self._lock:
+            value = self._lru.get(token)
+            if value is not None:
+                self._lru.move_to_end(token)
+                self.hits += 1
+                return value
+            value = self._pending.get(token)
+
+        computed = False
+        if value is None:
+            value = self._disk_get(token)
+        if value is None:
+            value = self.compute(token)
+            computed = True
+
+        batch = None
+        with self._lock:
+            if computed:
+                self.misses += 1
+                if self._conn is not None:
+                    self._pending[token] = value
+                    if len(self._pending) >= FLUSH_EVERY:
+                        batch, self._pending = self._pending, {}
+            else:
+                self.disk_hits += 1
+            self._lru[token] = value
+            self._lru.move_to_end(token)
+            if len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+        if batch:
+            self._write(batch)
+        return value
+
+    __call__ = get
+
+    def _disk_get(self, token):
+        with self._db_lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT value FROM lemmas WHERE namespace = ? AND token = ?",
+                (self.namespace, token)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def _write(self, batch):
+        with self._db_lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO lemmas (namespace, token, value) VALUES (?, ?, ?)",
+                    [(self.namespace, t, v) for t, v in batch.items()]
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"lemma_cache: не удалось сохранить кэш: {e}", file=sys.stderr)
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        self.flush()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "lookups": lookups,
+            "memory_hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def report(self):
+        s = self.stats()
+        return (f"lemma_cache [{s['namespace']}]: {s['lookups']} обращений, "
+                f"hit rate {s['hit_rate']:.1%} (память {s['memory_hits']}, "
+                f"диск {s['disk_hits']}, вычислено {s['misses']})")
+
+# === ГОТОВЫЕ КЭШИ ДЛЯ ИСПОЛЬЗУЕМЫХ АНАЛИЗАТОРОВ ===
+
+def morph_lemma_cache(morph, threshold=0.3, **kwargs):
+    """Лемма pymorphy3: normal_form лучшего разбора, если его score > threshold, иначе сам токен."""
+    import pymorphy3
+
+    def compute(word):
+        parsed = morph.parse(word)
+        if parsed and parsed[0].score > threshold:
+            return parsed[0].normal_form
+        return word
+
+    return LemmaCache(f"pymorphy3-{pymorphy3.__version__}", "lemma", threshold, compute, **kwargs)
+
+def porter_stem_cache(stemmer, **kwargs):
+    """Стем nltk PorterStemmer."""
+    import nltk
+    return LemmaCache(f"nltk-porter-{nltk.__version__}", "stem", None, stemmer.stem, **kwargs)
+
+def wordnet_lemma_cache(lemmatizer, **kwargs):
+    """Лемма nltk WordNetLemmatizer (pos по умолчанию — существительное)."""
+    import nltk
+    return LemmaCache(f"nltk-wordnet-{nltk.__version__}", "lemma", None, lemmatizer.lemmatize, **kwargs)
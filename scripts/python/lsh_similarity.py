@@ -0,0 +1,127 @@
+"""
+Приближённый поиск top-k соседей по косинусу (LSH) для больших словарей.
+
+Сигнатуры — случайные проекции (SimHash) строк TF-IDF матрицы: бит = знак
+скалярного произведения со случайным гауссовым вектором. Сигнатура режется
+на bands полос по rows бит; строки, совпавшие хотя бы в одной полосе,
+становятся кандидатами. Кандидаты переранжируются точным скалярным
+произведением, так что веса в результате — те же, что в точном режиме;
+теряться могут только сами соседи (см. recall_against_exact).
+
+Вероятность попасть в кандидаты для пары с углом θ: 1 - (1 - (1-θ/π)^rows)^bands.
+Больше rows — меньше корзины и кандидатов (быстрее), больше bands — выше recall.
+
+Режим по умолчанию в build_synonyms.py — точный (--mode exact): теги
+короткие, матрица TF-IDF очень разреженная, и точный top-k дешевле LSH.
+Замер на 42 тыс. тегов (recall@TOP_N на 1000 терминах):
+    exact           1.5 с
+    24 × 14         6 с,   recall 0.35
+    24 × 12        19 с,   recall 0.53
+    48 × 12        39 с,   recall 0.72   (по умолчанию)
+    64 × 12        65 с,   recall 0.80
+LSH имеет смысл, только когда точному режиму не хватает памяти или
+времени (словари на порядки больше); recall стоит проверять --recall-sample.
+"""
+import numpy as np
+from sklearn.preprocessing import normalize
+
+from topk_similarity import topk_row, topk_pairs
+
+DEFAULT_BANDS = 48
+DEFAULT_ROWS = 12
+DEFAULT_MAX_BUCKET = 64      # большие корзины режутся на группы такого размера
+PROJECTION_BLOCK = 8192      # строк матрицы на одно умножение при расчёте сигнатур
+PAIR_BLOCK = 1_000_000       # пар на одно точное переранжирование
+
+def signatures(X, n_bits, seed=0):
+    """Биты знаков случайных проекций: матрица bool (N, n_bits)."""
+    rng = np.random.default_rng(seed)
+    R = rng.standard_normal((X.shape[1], n_bits)).astype(np.float32)
+    bits = np.empty((X.shape[0], n_bits), dtype=bool)
+    for start in range(0, X.shape[0], PROJECTION_BLOCK):
+        stop = min(start + PROJECTION_BLOCK, X.shape[0])
+        bits[start:stop] = np.asarray(X[start:stop] @ R) > 0
+    return bits
+
+def band_pairs(keys, ids, max_bucket):
+    """
+    Пары (i, j) из строк с одинаковым ключом полосы. Корзина сортируется
+    и режется на группы по max_bucket, пары — только внутри группы,
+    так что работа не больше len(ids) * max_bucket.
+    """
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    ids = ids[order]
+    m = len(ids)
+    new_bucket = np.ones(m, dtype=bool)
+    new_bucket[1:] = keys[1:] != keys[:-1]
+    bucket_start = np.maximum.accumulate(np.where(new_bucket, np.arange(m), 0))
+    group = bucket_start * max_bucket + (np.arange(m) - bucket_start) // max_bucket
+    out = []
+    for d in range(1, max_bucket):
+        same = group[d:] == group[:-d]
+        if not same.any():
+            break
+        out.append((ids[:-d][same], ids[d:][same]))
+    return out
+
+def candidate_pairs(bits, active, bands, rows, max_bucket):
+    """Уникальные упорядоченные пары (i, j), i != j, совпавшие хотя бы в одной полосе."""
+    n = bits.shape[0]
+    weights = (1 << np.arange(rows, dtype=np.uint64)).astype(np.uint64)
+    pair_keys = []
+    for b in range(bands):
+        keys = bits[active, b * rows:(b + 1) * rows].astype(np.uint64) @ weights
+        for I, J in band_pairs(keys, active, max_bucket):
+            pair_keys.append(I.astype(np.int64) * n + J)
+            pair_keys.append(J.astype(np.int64) * n + I)
+    if not pair_keys:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pair_keys = np.unique(np.concatenate(pair_keys))
+    return pair_keys // n, pair_keys % n
+
+def pair_scores(X, I, J):
+    """Точный косинус для пар строк (строки X уже L2-нормированы)."""
+    out = np.empty(len(I), dtype=np.float64)
+    for start in range(0, len(I), PAIR_BLOCK):
+        stop = min(start + PAIR_BLOCK, len(I))
+        prod = X[I[start:stop]].multiply(X[J[start:stop]])
+        out[start:stop] = np.asarray(prod.sum(axis=1)).ravel()
+    return out
+
+def topk_cosine_lsh(X, top_n, min_score=0.0, bands=DEFAULT_BANDS, rows=DEFAULT_ROWS,
+                    max_bucket=DEFAULT_MAX_BUCKET, seed=0):
+    """
+    Приближённый аналог topk_similarity.topk_cosine: тот же формат результата
+    (список пар (индексы, scores) на каждую строку), но сравниваются только
+    кандидаты LSH. Возвращает (результат, число пар-кандидатов).
+    """
+    X = normalize(X.tocsr(), norm="l2", copy=True)
+    n = X.shape[0]
+    active = np.flatnonzero(np.diff(X.indptr) > 0)   # пустые строки ни с чем не похожи
+    bits = signatures(X, bands * rows, seed)
+    I, J = candidate_pairs(bits, active, bands, rows, max_bucket)
+    n_candidates = len(I)
+    scores = pair_scores(X, I, J)
+
+    I, J, scores = topk_pairs(I, J, scores, n, top_n, min_score)
+
+    bounds = np.searchsorted(I, np.arange(1, n))
+    return list(zip(np.split(J, bounds), np.split(scores, bounds))), n_candidates
+
+def recall_against_exact(X, approx, top_n, min_score=0.0, sample=200, seed=0):
+    """
+    Доля точных top-k соседей, найденных приближённым режимом,
+    на случайной выборке из sample строк. Возвращает (recall, размер выборки).
+    """
+    X = normalize(X.tocsr(), norm="l2", copy=True)
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(X.shape[0], size=min(sample, X.shape[0]), replace=False))
+    S = (X[rows] @ X.T).tocsr()
+    found = total = 0
+    for k, row in enumerate(rows):
+        lo, hi = S.indptr[k], S.indptr[k + 1]
+        exact, _ = topk_row(S.indices[lo:hi], S.data[lo:hi], row, top_n, min_score)
+        total += len(exact)
+        found += len(np.intersect1d(exact, approx[row][0]))
+    return (found / total if total else 1.0), len(rows)
@@ -1,7 +1,15 @@
 import sys
+import os
 import re
 import json
+import time
+import signal
+import argparse
+import socketserver
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from pymorphy3 import MorphAnalyzer
+from lemma_cache import morph_lemma_cache, wordnet_lemma_cache
+from tokenizer import Tokenizer
 
 try:
     import nltk
@@ -11,42 +19,311 @@ except ImportError:
 
 morph = MorphAnalyzer()
 
+# Токен → лемма с кэшем (LRU + SQLite), см. lemma_cache.py
+ru_lemmas = morph_lemma_cache(morph, threshold=0.3)
+en_lemmas = wordnet_lemma_cache(WordNetLemmatizer()) if nltk else None
+
 # Простейшие списки стоп-слов для обоих языков
 RU_STOPWORDS = {"и", "в", "на", "с", "для", "по", "от", "или", "что"}
 EN_STOPWORDS = {"the", "and", "or", "of", "in", "on", "to", "for", "is", "by"}
 
+# Параметры режима сервера (--serve)
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_TIMEOUT = 5.0          # сколько секунд ждём лемматизацию одного запроса
+DEFAULT_IDLE_TIMEOUT = 300.0   # через сколько секунд тишины закрываем соединение клиента
+DEFAULT_WORKERS = 4
+
+# Параметры пакетного режима (--batch)
+BATCH_CHUNK = 10000            # строк, разбираемых за один проход
+
+# Как до tokenizer.py: pymorphy3 — только слова целиком из кириллицы, всё
+# остальное (латиница, «gpt-4», но и «какая-то», «из-за») — WordNet, если
+# доступен; он оставляет такие слова как есть. Маршрут tokenizer.py по любой
+# кириллице изменил бы леммы запросов («какая-то» → «какой-то»), а они должны
+# совпадать с прежними. Числа и стоп-слова до анализаторов не доходят.
+CYRILLIC_RE = re.compile(r"[а-яё]+")
+
+def en_lemma(word):
+    return en_lemmas.get(word) if en_lemmas else word
+
+def ru_lemma(word):
+    return ru_lemmas.get(word) if CYRILLIC_RE.fullmatch(word) else en_lemma(word)
+
+def make_tokenizer():
+    return Tokenizer(
+        ru=ru_lemma,
+        en=en_lemma,
+        other=en_lemma,
+        stopwords=RU_STOPWORDS | EN_STOPWORDS,
+        clean_re=re.compile(r"[^а-яА-Яa-zA-Z0-9ёЁ\s\-]"),
+    )
+
+tokenizer = make_tokenizer()
+
 def clean(text):
-    return re.sub(r"[^а-яА-Яa-zA-Z0-9ёЁ\s\-]", "", text.lower())
+    return tokenizer.clean_re.sub("", text.lower())
 
-def is_cyrillic(word):
-    return bool(re.match(r'^[а-яё]+$', word, re.IGNORECASE))
+def word_lemma(word):
+    """Лемма слова после clean(); None — стоп-слово."""
+    return tokenizer.lemma(word)
 
 def lemmatize(text):
-    words = clean(text).split()
-    lemmas = []
-
-    # Для английских лемматизация (если есть nltk)
-    lemmatizer = WordNetLemmatizer() if nltk else None
-
-    for word in words:
-        if is_cyrillic(word):
-            parsed = morph.parse(word)
-            if parsed and parsed[0].score > 0.3:
-                lemma = parsed[0].normal_form
-            else:
-                lemma = word
-            if lemma not in RU_STOPWORDS:
-                lemmas.append(lemma)
+    return tokenizer.lemmas(text)
+
+# === РЕЖИМ СЕРВЕРА ===
+# Протокол — JSON Lines: одна строка запроса → одна строка ответа.
+# Запрос:  {"id": 1, "query": "нейронные сети"}  или  {"id": 1, "terms": ["neural", "networks"]}
+#          (допускается и просто JSON-строка: "нейронные сети")
+# Ответ:   {"id": 1, "lemmas": ["нейронный", "сеть"]}
+#          при ошибке/таймауте: {"id": 1, "lemmas": [], "error": "..."}
+# "lemmas" совпадает с тем, что печатает CLI-режим для того же запроса.
+
+def parse_request(line):
+    """Разбирает строку запроса, возвращает (id, query)."""
+    request = json.loads(line)
+    if isinstance(request, str):
+        return None, request
+    if not isinstance(request, dict):
+        raise ValueError("request must be a JSON object or string")
+    req_id = request.get("id")
+    if "terms" in request:
+        terms = request["terms"]
+        if not isinstance(terms, list):
+            raise ValueError("'terms' must be a list")
+        return req_id, " ".join(str(t) for t in terms)
+    query = request.get("query")
+    if not isinstance(query, str):
+        raise ValueError("missing 'query'")
+    return req_id, query
+
+def handle_line(line, executor, timeout):
+    """Обрабатывает одну строку протокола и возвращает словарь-ответ."""
+    req_id = None
+    try:
+        req_id, query = parse_request(line)
+        future = executor.submit(lemmatize, query)
+        return {"id": req_id, "lemmas": future.result(timeout=timeout)}
+    except FutureTimeout:
+        # Поток-исполнитель не прервать, но клиент не ждёт дольше timeout
+        return {"id": req_id, "lemmas": [], "error": "timeout"}
+    except Exception as e:
+        return {"id": req_id, "lemmas": [], "error": str(e)}
+
+def encode_response(response):
+    return (json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8")
+
+class NormalizeHandler(socketserver.StreamRequestHandler):
+    """Одно соединение клиента: читает запросы построчно, пока клиент не закроет сокет."""
+
+    def setup(self):
+        self.timeout = self.server.idle_timeout
+        super().setup()
+
+    def handle(self):
+        while True:
+            try:
+                raw = self.rfile.readline()
+            except OSError:
+                break  # idle-таймаут или обрыв соединения
+            if not raw:
+                break
+            line = raw.decode("utf-8", errors="replace").strip()
+            if not line:
+                continue
+            response = handle_line(line, self.server.executor, self.server.request_timeout)
+            try:
+                self.wfile.write(encode_response(response))
+                self.wfile.flush()
+            except OSError:
+                break
+
+class _ServerMixin:
+    daemon_threads = True
+    allow_reuse_address = True
+
+class ThreadingTCPNormalizeServer(_ServerMixin, socketserver.ThreadingTCPServer):
+    pass
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class ThreadingUnixNormalizeServer(_ServerMixin, socketserver.ThreadingUnixStreamServer):
+        pass
+else:
+    ThreadingUnixNormalizeServer = None  # Windows: только TCP или stdio
+
+def serve_stdio(executor, timeout):
+    """Один клиент через stdin/stdout (например, как дочерний процесс)."""
+    for raw in sys.stdin:
+        line = raw.strip()
+        if not line:
+            continue
+        response = handle_line(line, executor, timeout)
+        sys.stdout.write(json.dumps(response, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+# === ПАКЕТНЫЙ РЕЖИМ ===
+# Те же строки запросов и ответов, что у сервера, но без сокета и потоков:
+# строки читаются пачками по --chunk, слова всех запросов собираются вместе,
+# и каждое уникальное слово лемматизируется один раз за весь запуск.
+# Ответы — по строке на каждую непустую строку входа, в том же порядке;
+# битая строка даёт ответ с "error", остальные обрабатываются как обычно.
+
+def lemmatize_batch(lines, memo):
+    """
+    Ответы на пачку строк протокола. memo — слово → лемма (None для
+    стоп-слова, исключение — если лемматизация слова упала); общий для
+    всех пачек запуска.
+    """
+    parsed = []
+    for line in lines:
+        try:
+            req_id, query = parse_request(line)
+            parsed.append((req_id, clean(query).split(), None))
+        except Exception as e:
+            parsed.append((None, None, str(e)))
+
+    for _, words, _ in parsed:
+        for word in words or ():
+            if word not in memo:
+                try:
+                    memo[word] = word_lemma(word)
+                except Exception as e:
+                    memo[word] = e
+
+    responses = []
+    for req_id, words, error in parsed:
+        if error is None:
+            lemmas = [memo[w] for w in words]
+            failed = next((l for l in lemmas if isinstance(l, Exception)), None)
+            if failed is None:
+                responses.append({"id": req_id, "lemmas": [l for l in lemmas if l is not None]})
+                continue
+            error = str(failed)
+        responses.append({"id": req_id, "lemmas": [], "error": error})
+    return responses
+
+def read_chunks(f, size):
+    chunk = []
+    for raw in f:
+        line = raw.strip()
+        if line:
+            chunk.append(line)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+def batch(args):
+    started = time.monotonic()
+    inp = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8-sig")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="\n")
+    for stream in (inp, out):
+        if stream in (sys.stdin, sys.stdout):
+            stream.reconfigure(encoding="utf-8")   # на Windows консоль по умолчанию не в UTF-8
+
+    memo = {}
+    n_lines = n_errors = 0
+    try:
+        for chunk in read_chunks(inp, max(1, args.chunk)):
+            responses = lemmatize_batch(chunk, memo)
+            out.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in responses))
+            n_lines += len(responses)
+            n_errors += sum(1 for r in responses if "error" in r)
+        out.flush()
+    finally:
+        if inp is not sys.stdin:
+            inp.close()
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.monotonic() - started
+    print(f"normalize_query --batch: запросов {n_lines} (ошибок {n_errors}), "
+          f"уникальных слов {len(memo)}, {elapsed:.2f} с, {n_lines / max(elapsed, 1e-9):.0f} запросов/с",
+          file=sys.stderr)
+    for cache in (ru_lemmas, en_lemmas):
+        if cache:
+            print(cache.report(), file=sys.stderr)
+
+def parse_batch_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="normalize_query.py --batch",
+        description="Лемматизация многих запросов за один запуск (JSON Lines, как у --serve)."
+    )
+    parser.add_argument("input", nargs="?", default="-", help="файл запросов (по умолчанию stdin)")
+    parser.add_argument("--output", "-o", default="-", help="куда писать ответы (по умолчанию stdout)")
+    parser.add_argument("--chunk", type=int, default=BATCH_CHUNK, help="строк в одной пачке")
+    return parser.parse_args(argv)
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def serve(args):
+    # Прогреваем анализатор до приёма первых клиентов
+    try:
+        lemmatize("прогрев warmup")
+    except Exception as e:
+        print(f"normalize_query: прогрев не удался: {e}", file=sys.stderr)
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        if not args.socket and args.port is None:
+            serve_stdio(executor, args.timeout)
+            return
+
+        if args.socket:
+            if ThreadingUnixNormalizeServer is None:
+                raise SystemExit("Unix-сокеты недоступны на этой платформе, используйте --port")
+            if os.path.exists(args.socket):
+                os.remove(args.socket)
+            server = ThreadingUnixNormalizeServer(args.socket, NormalizeHandler)
+            address = args.socket
         else:
-            # Английский: нижний регистр + nltk-лемматизация, если доступно
-            lemma = word.lower()
-            if lemmatizer:
-                lemma = lemmatizer.lemmatize(lemma)
-            if lemma not in EN_STOPWORDS:
-                lemmas.append(lemma)
-    return lemmas
+            server = ThreadingTCPNormalizeServer((args.host, args.port), NormalizeHandler)
+            address = f"{args.host}:{server.server_address[1]}"
+
+        server.executor = executor
+        server.request_timeout = args.timeout
+        server.idle_timeout = args.idle_timeout
+        print(f"normalize_query: слушаем {address}", file=sys.stderr, flush=True)
+        # SIGTERM (kill, supervisor) завершает так же, как Ctrl+C — с удалением сокета
+        signal.signal(signal.SIGTERM, _raise_interrupt)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if args.socket and os.path.exists(args.socket):
+                os.remove(args.socket)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        for cache in (ru_lemmas, en_lemmas):
+            if cache:
+                print(cache.report(), file=sys.stderr)
+
+def parse_server_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="normalize_query.py --serve",
+        description="Долгоживущий процесс лемматизации запросов (JSON Lines)."
+    )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--socket", help="путь к Unix-сокету")
+    target.add_argument("--port", type=int, help="TCP-порт (для Windows)")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="адрес для --port")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="таймаут обработки одного запроса, сек")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help="закрывать соединение после стольких секунд тишины")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="потоков для обработки запросов")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        serve(parse_server_args(sys.argv[2:]))
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        batch(parse_batch_args(sys.argv[2:]))
+        sys.exit(0)
     try:
         if len(sys.argv) < 2:
             print("[]")
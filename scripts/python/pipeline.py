@@ -0,0 +1,396 @@
+"""
+Обновление данных поиска одной командой вместо ручной цепочки из README:
+
+    fetch ─ import ─ export ─ normalize ─┬─ tag_synonyms ─ synonyms
+                                         └─ import_normalized
+
+    fetch             fetch_arxiv.py → arxiv_dataset.json (ARXIV_DATASET_PATH)
+    import            php artisan articles:import → коллекция articles
+    export            php artisan articles:export → articles_export.jsonl
+    normalize         build_normalized_articles.py → normalized_articles.json
+                      (+ поток токенов normalized_articles.json.tokens)
+    tag_synonyms      build_synonyms.py → tag_synonyms.json (+ .idx)
+    synonyms          build_cooccurrence_synonyms.py --merge tag_synonyms.json
+                      → query_synonyms.json (+ .idx)
+    import_normalized php artisan articles:import-normalized → normalized_articles
+
+Все файлы — сразу в storage/app, переносить ничего не нужно.
+
+У стадии объявлены входы и выходы: файлы или «виртуальные» артефакты
+(mongo:* — коллекции). Ключ стадии — sha256 от команды, хэшей входов и
+хэшей кода (скрипт, сидер). Стадия пропускается, если ключ совпадает с
+ключом последнего успешного запуска и выходы не менялись после него.
+Хэши файлов кэшируются по (размер, mtime): неизменённый файл не
+перечитывается. fetch запускается всегда (источник внешний; сам он
+инкрементальный) — --skip fetch, чтобы работать с уже скачанным.
+
+Стадии, чьи входы готовы, идут параллельно (--jobs). По каждой стадии
+печатаются время и пиковая память (RSS самого большого процесса стадии,
+через os.wait4; на Windows недоступна). Состояние — .cache/pipeline/
+state.json, история запусков — .cache/pipeline/runs.jsonl, вывод стадий —
+.cache/pipeline/logs/<стадия>.log.
+
+    python pipeline.py                       # всё, что устарело
+    python pipeline.py synonyms --skip fetch # только до словаря синонимов
+    python pipeline.py --dry-run             # что будет запущено
+    php artisan pipeline:refresh -- --skip fetch
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from synonym_index import index_path
+from token_stream import tokens_path
+
+SCRIPTS = Path(__file__).resolve().parent
+ROOT = SCRIPTS.parents[1]
+STORAGE = ROOT / "storage" / "app"
+STATE_DIR = SCRIPTS / ".cache" / "pipeline"
+STATE_VERSION = 1
+HASH_CHUNK = 1 << 20
+DEFAULT_JOBS = 2
+
+_print_lock = threading.Lock()
+
+# === СТАДИИ ===
+
+class Stage:
+    """
+    Шаг конвейера. inputs/outputs — пути файлов или виртуальные имена
+    (mongo:...); code — файлы, изменение которых тоже требует перезапуска.
+    always — запускать при каждом прогоне.
+    """
+
+    def __init__(self, name, command, inputs=(), outputs=(), code=(), always=False):
+        self.name = name
+        self.command = [str(c) for c in command]
+        self.inputs = [str(p) for p in inputs]
+        self.outputs = [str(p) for p in outputs]
+        self.code = [str(p) for p in code]
+        self.always = always
+
+def is_virtual(artifact):
+    return artifact.startswith("mongo:")
+
+def default_stages(python, php, dataset):
+    artisan = ROOT / "artisan"
+    export = STORAGE / "articles_export.jsonl"
+    normalized = STORAGE / "normalized_articles.json"
+    # поток токенов рядом с normalized (token_stream.py); meta.json хранит хэш normalized
+    tokens = tokens_path(normalized) / "meta.json"
+    tags = STORAGE / "tag_synonyms.json"
+    synonyms = STORAGE / "query_synonyms.json"
+    script = lambda name: SCRIPTS / name
+    return [
+        Stage("fetch", [python, script("fetch_arxiv.py"), "--output", dataset],
+              outputs=[dataset], code=[script("fetch_arxiv.py")], always=True),
+        Stage("import", [php, artisan, "articles:import"],
+              inputs=[dataset], outputs=["mongo:articles"],
+              code=[ROOT / "database" / "seeders" / "ArticleSeeder.php",
+                    ROOT / "app" / "Services" / "ArticleDataset.php"]),
+        Stage("export", [php, artisan, "articles:export", export],
+              inputs=["mongo:articles"], outputs=[export],
+              code=[ROOT / "routes" / "console.php"]),
+        Stage("normalize", [python, script("build_normalized_articles.py"), export, normalized, "--workers", "0"],
+              inputs=[export], outputs=[normalized, tokens],
+              code=[script("build_normalized_articles.py"), script("tokenizer.py"), script("jsonstream.py"),
+                    script("token_stream.py")]),
+        Stage("tag_synonyms", [python, script("build_synonyms.py"), normalized, tags],
+              inputs=[normalized, tokens], outputs=[tags, index_path(tags)],
+              code=[script("build_synonyms.py"), script("lsh_similarity.py"),
+                    script("topk_similarity.py"), script("synonym_index.py"), script("token_stream.py")]),
+        Stage("synonyms", [python, script("build_cooccurrence_synonyms.py"), normalized, synonyms, "--merge", tags],
+              inputs=[normalized, tokens, tags], outputs=[synonyms, index_path(synonyms)],
+              code=[script("build_cooccurrence_synonyms.py"), script("synonym_index.py"),
+                    script("token_stream.py")]),
+        Stage("import_normalized", [php, artisan, "articles:import-normalized"],
+              inputs=[normalized], outputs=["mongo:normalized_articles"],
+              code=[ROOT / "database" / "seeders" / "NormalizedArticleSeeder.php"]),
+    ]
+
+def producers(stages):
+    """Артефакт → стадия, которая его пишет."""
+    made_by = {}
+    for stage in stages:
+        for artifact in stage.outputs:
+            if artifact in made_by:
+                raise ValueError(f"{artifact}: пишут стадии {made_by[artifact].name} и {stage.name}")
+            made_by[artifact] = stage
+    return made_by
+
+def dependencies(stages):
+    """Стадия → имена стадий, от выходов которых она зависит; проверяет отсутствие циклов."""
+    made_by = producers(stages)
+    deps = {s.name: sorted({made_by[a].name for a in s.inputs if a in made_by}) for s in stages}
+    done, visiting = set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"цикл в зависимостях через стадию {name}")
+        visiting.add(name)
+        for dep in deps[name]:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for stage in stages:
+        visit(stage.name)
+    return deps
+
+def upstream(targets, deps):
+    """targets и всё, от чего они зависят."""
+    selected, stack = set(), list(targets)
+    while stack:
+        name = stack.pop()
+        if name not in selected:
+            selected.add(name)
+            stack.extend(deps[name])
+    return selected
+
+# === ОТПЕЧАТКИ И СОСТОЯНИЕ ===
+
+def write_json_atomic(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+class PipelineState:
+    """
+    state.json:
+        files    — путь → [размер, mtime_ns, sha256] (кэш хэшей)
+        virtual  — виртуальный артефакт → ключ стадии, которая его создала
+        stages   — стадия → key и хэши выходов последнего успешного запуска
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        data = {}
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") != STATE_VERSION:
+                data = {}
+        self.files = data.get("files", {})
+        self.virtual = data.get("virtual", {})
+        self.stages = data.get("stages", {})
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(self.path, {"version": STATE_VERSION, "files": self.files,
+                                      "virtual": self.virtual, "stages": self.stages})
+
+    def file_hash(self, path):
+        """sha256 файла или None, если его нет; при тех же размере и mtime — из кэша."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.files.pop(path, None)
+            return None
+        cached = self.files.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(block)
+        self.files[path] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+    def fingerprint(self, artifact):
+        if is_virtual(artifact):
+            return self.virtual.get(artifact)
+        return self.file_hash(artifact)
+
+    def stage_key(self, stage):
+        payload = {
+            "command": stage.command,
+            "inputs": {a: self.fingerprint(a) for a in stage.inputs},
+            "code": {p: self.file_hash(p) for p in stage.code},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def up_to_date(self, stage, key):
+        last = self.stages.get(stage.name)
+        if stage.always or not last or last["key"] != key:
+            return False
+        return all(self.fingerprint(a) is not None and self.fingerprint(a) == last["outputs"].get(a)
+                   for a in stage.outputs)
+
+    def record(self, stage, key, seconds, peak_rss):
+        for artifact in stage.outputs:
+            if is_virtual(artifact):
+                self.virtual[artifact] = key
+        self.stages[stage.name] = {
+            "key": key,
+            "outputs": {a: self.fingerprint(a) for a in stage.outputs},
+            "finished": datetime.now().isoformat(timespec="seconds"),
+            "seconds": round(seconds, 3),
+            "peak_rss": peak_rss,
+        }
+        self.save()
+
+# === ЗАПУСК ===
+
+def run_stage(stage, env, log_dir):
+    """
+    Запускает команду стадии, вывод — в консоль с префиксом и в лог.
+    Возвращает (код возврата, секунды, пиковый RSS в байтах или None).
+    """
+    started = time.monotonic()
+    log_dir.mkdir(parents=True, exist_ok=True)
+    with open(log_dir / f"{stage.name}.log", "w", encoding="utf-8") as log:
+        try:
+            proc = subprocess.Popen(stage.command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    env=env, cwd=ROOT, text=True, encoding="utf-8", errors="replace")
+        except OSError as e:
+            log.write(f"{e}\n")
+            with _print_lock:
+                print(f"[{stage.name}] не удалось запустить: {e}", flush=True)
+            return 127, time.monotonic() - started, None
+        for line in proc.stdout:
+            log.write(line)
+            with _print_lock:
+                print(f"[{stage.name}] {line}", end="", flush=True)
+        proc.stdout.close()
+
+    peak_rss = None
+    if hasattr(os, "wait4"):
+        # rusage именно этого процесса; ru_maxrss учитывает и дождавшихся его потомков
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    else:
+        proc.wait()
+    return proc.returncode, time.monotonic() - started, peak_rss
+
+def run_pipeline(stages, state, targets=None, skip=(), force=(), jobs=DEFAULT_JOBS, dry_run=False,
+                 env=None, log_dir=STATE_DIR / "logs"):
+    """
+    Проходит стадии в порядке зависимостей, готовые к запуску — параллельно.
+    Возвращает список {"stage", "status", "seconds", "peak_rss"}; status —
+    ran / up-to-date / skipped / failed / blocked (упала зависимость) /
+    would-run (для dry_run).
+    """
+    by_name = {s.name: s for s in stages}
+    deps = dependencies(stages)
+    unknown = [n for n in [*(targets or []), *skip, *force] if n not in by_name]
+    if unknown:
+        raise ValueError(f"неизвестные стадии: {', '.join(unknown)}")
+    selected = upstream(targets or list(by_name), deps)
+    pending = [s for s in stages if s.name in selected]
+    status = {}
+    results = []
+
+    def finish(stage, st, seconds=0.0, peak_rss=None):
+        status[stage.name] = st
+        results.append({"stage": stage.name, "status": st, "seconds": round(seconds, 3), "peak_rss": peak_rss})
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        running = {}
+        while pending or running:
+            progressed = True
+            while progressed:
+                progressed = False
+                for stage in list(pending):
+                    dep_status = [status.get(d) for d in deps[stage.name] if d in selected]
+                    if any(st in ("failed", "blocked") for st in dep_status):
+                        pending.remove(stage)
+                        finish(stage, "blocked")
+                        progressed = True
+                    elif all(st is not None for st in dep_status):
+                        pending.remove(stage)
+                        progressed = True
+                        if stage.name in skip:
+                            finish(stage, "skipped")
+                            continue
+                        key = state.stage_key(stage)
+                        if stage.name not in force and state.up_to_date(stage, key) \
+                                and "would-run" not in dep_status:
+                            finish(stage, "up-to-date")
+                        elif dry_run:
+                            finish(stage, "would-run")
+                        else:
+                            print(f"=== {stage.name}: {' '.join(stage.command)}", flush=True)
+                            running[pool.submit(run_stage, stage, env, log_dir)] = (stage, key)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, key = running.pop(future)
+                code, seconds, peak_rss = future.result()
+                if code == 0:
+                    state.record(stage, key, seconds, peak_rss)
+                    finish(stage, "ran", seconds, peak_rss)
+                else:
+                    print(f"=== {stage.name}: код возврата {code}, лог: {log_dir / (stage.name + '.log')}",
+                          flush=True)
+                    finish(stage, "failed", seconds, peak_rss)
+    state.save()
+    return results
+
+def format_report(results):
+    lines = [f"{'стадия':<18} {'статус':<12} {'время, с':>9} {'пик RSS, МБ':>12}"]
+    for r in results:
+        rss = f"{r['peak_rss'] / 2**20:.0f}" if r["peak_rss"] else "—"
+        seconds = f"{r['seconds']:.1f}" if r["status"] in ("ran", "failed") else ""
+        lines.append(f"{r['stage']:<18} {r['status']:<12} {seconds:>9} {rss:>12}")
+    return "\n".join(lines)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Обновление данных поиска: только устаревшие стадии.")
+    parser.add_argument("targets", nargs="*",
+                        help="стадии, которые нужно довести до актуального состояния (по умолчанию все)")
+    parser.add_argument("--skip", action="append", default=[], metavar="STAGE",
+                        help="не запускать стадию, считать её выходы готовыми (например, --skip fetch)")
+    parser.add_argument("--force", action="append", default=[], metavar="STAGE",
+                        help="запустить стадию, даже если она актуальна")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="стадий одновременно")
+    parser.add_argument("--dry-run", action="store_true", help="только показать, что будет запущено")
+    parser.add_argument("--python", default=sys.executable, help="интерпретатор для python-стадий")
+    parser.add_argument("--php", default=os.environ.get("PHP_BINARY", "php"), help="php для artisan")
+    parser.add_argument("--dataset", default=os.environ.get("ARXIV_DATASET_PATH", str(STORAGE / "arxiv_dataset.json")),
+                        help="датасет fetch_arxiv.py (по умолчанию $ARXIV_DATASET_PATH)")
+    parser.add_argument("--state-dir", default=str(STATE_DIR), help="каталог состояния и логов")
+    parser.add_argument("--report", help="сохранить отчёт о запуске в JSON")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    state_dir = Path(args.state_dir)
+    stages = default_stages(args.python, args.php, args.dataset)
+    state = PipelineState(state_dir / "state.json")
+    # дочерние процессы пишут в пайп: без этого на Windows print по-русски падает
+    env = dict(os.environ, ARXIV_DATASET_PATH=args.dataset, PYTHONIOENCODING="utf-8")
+
+    started = datetime.now().isoformat(timespec="seconds")
+    t0 = time.monotonic()
+    try:
+        results = run_pipeline(stages, state, args.targets, args.skip, args.force, args.jobs,
+                               args.dry_run, env, state_dir / "logs")
+    except ValueError as e:
+        raise SystemExit(f"pipeline: {e}")
+    report = {"started": started, "seconds": round(time.monotonic() - t0, 3),
+              "dry_run": args.dry_run, "stages": results}
+
+    print("\n" + format_report(results))
+    print(f"Всего: {report['seconds']:.1f} с")
+    if not args.dry_run:
+        with open(state_dir / "runs.jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps(report, ensure_ascii=False) + "\n")
+    if args.report:
+        write_json_atomic(args.report, report)
+    if any(r["status"] in ("failed", "blocked") for r in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Кэш результатов поиска перед расширением запроса, лемматизацией и BM25F.
+
+Популярные запросы приходят в /api/search весь день, и каждый раз заново
+идут расширение синонимами, лемматизация и поиск. Здесь результат
+запроса — нормализованные термины, расширение и ранжированные номера
+статей с оценками — хранится в памяти процесса (bm25_engine.py --serve):
+
+    ключ     — (запрос в нижнем регистре без лишних пробелов, expand, lemmas, k);
+               регистр и пробелы не меняют ни поиск синонимов, ни леммы
+    LRU      — при превышении лимита памяти (--cache-mb) вытесняются
+               давно не запрошенные записи
+    TTL      — запись старше --cache-ttl секунд считается промахом
+    поколение — файл поколения данных поиска; стадии, меняющие корпус или
+               синонимы (build_normalized_articles.py, build_synonyms.py,
+               build_cooccurrence_synonyms.py), увеличивают его номер.
+               SearchService (bm25_engine.py) при смене поколения заново
+               открывает хранилище корпуса и синонимы и только после этого
+               сбрасывает кэш (clear) — иначе в него попали бы ответы по
+               старым данным
+
+Путь к файлу поколения: переменная окружения SEARCH_GENERATION_PATH или
+storage/app/search_generation.json. Смена файла видна по (размер, mtime)
+(generation_stamp) — одним stat на запрос.
+
+    python query_cache.py              # текущее поколение
+    python query_cache.py bump         # сбросить кэши вручную (правка данных)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_GENERATION_PATH = Path(__file__).resolve().parents[2] / "storage" / "app" / "search_generation.json"
+DEFAULT_MEMORY_MB = 64
+DEFAULT_TTL = 3600          # секунд
+ENTRY_OVERHEAD = 400        # байт на запись сверх её данных: ключ, узел OrderedDict, объект
+
+def generation_path(path=None):
+    if path:
+        return Path(path)
+    env = os.environ.get("SEARCH_GENERATION_PATH")
+    return Path(env) if env else DEFAULT_GENERATION_PATH
+
+def read_generation(path=None):
+    """{"generation": номер, "updated": время, "by": кто увеличил}; без файла — поколение 0."""
+    try:
+        return json.loads(generation_path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"generation": 0, "updated": None, "by": None}
+
+def generation_stamp(path=None):
+    """(размер, mtime_ns) файла поколения; None — файла нет."""
+    try:
+        st = os.stat(generation_path(path))
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+def bump_generation(by, path=None):
+    """
+    Увеличивает номер поколения (файл заменяется атомарно). Если две
+    стадии увеличат его одновременно, номер может совпасть, но запись
+    всё равно изменится (время, by) — кэш сравнивает её целиком.
+    """
+    path = generation_path(path)
+    record = {
+        "generation": int(read_generation(path).get("generation") or 0) + 1,
+        "updated": datetime.now().isoformat(timespec="microseconds"),
+        "by": by,
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+        tmp.write_text(json.dumps(record, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as e:
+        # данные уже записаны; без поколения кэш доживёт до TTL
+        print(f"Не удалось обновить поколение поиска {path}: {e}", file=sys.stderr)
+        return None
+    return record["generation"]
+
+def query_key(query, expand, lemmas, k):
+    return (" ".join(query.lower().split()), bool(expand), bool(lemmas), k)
+
+class CachedResult:
+    """
+    Результат поиска без первого термина расширения (это сам запрос):
+    expanded — [(синоним, вес)], normalized — термины после нормализации,
+    docs/scores — номера статей и оценки по убыванию (numpy).
+    """
+
+    __slots__ = ("expanded", "normalized", "docs", "scores", "nbytes")
+
+    def __init__(self, expanded, normalized, docs, scores):
+        self.expanded = expanded
+        self.normalized = normalized
+        self.docs = docs
+        self.scores = scores
+        strings = sum(sys.getsizeof(t) + 64 for t, _ in expanded) + sum(sys.getsizeof(t) + 8 for t in normalized)
+        self.nbytes = ENTRY_OVERHEAD + strings + docs.nbytes + scores.nbytes
+
+class QueryCache:
+    """
+    LRU с лимитом памяти и TTL. Поколение данных, по которым посчитаны
+    записи, задаёт владелец кэша (clear); put с результатом другого
+    поколения игнорируется. Потокобезопасен (ThreadingHTTPServer в bm25_engine.py).
+    """
+
+    def __init__(self, memory_mb=DEFAULT_MEMORY_MB, ttl=DEFAULT_TTL):
+        self.capacity = int(memory_mb * (1 << 20))
+        self.ttl = ttl
+        self._entries = OrderedDict()   # ключ → (время записи, CachedResult)
+        self._lock = threading.Lock()
+        self.generation = None          # запись файла поколения (read_generation)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0        # из промахов: запись была, но старше TTL
+        self.evictions = 0      # вытеснено по лимиту памяти
+        self.invalidations = 0  # сбросов по смене поколения
+
+    def clear(self, generation):
+        """Сбрасывает все записи: данные поиска теперь поколения generation."""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.bytes = 0
+            self.generation = generation
+
+    def get(self, key, generation=None):
+        """generation — поколение данных, по которым ищет вызывающий (None — любое)."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.misses += 1
+                return None
+            item = self._entries.get(key)
+            if item is not None and time.monotonic() - item[0] > self.ttl:
+                self._remove(key)
+                self.expired += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, result, generation=None):
+        """generation — поколение данных, по которым посчитан result (None — текущее)."""
+        if result.nbytes > self.capacity:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return   # посчитан по данным до перезагрузки
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), result)
+            self.bytes += result.nbytes
+            while self.bytes > self.capacity:
+                old, _ = next(iter(self._entries.items()))
+                self._remove(old)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, result = self._entries.pop(key)
+        self.bytes -= result.nbytes
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "capacity": self.capacity,
+                "ttl": self.ttl,
+                "generation": self.generation.get("generation") if self.generation else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+def main():
+    parser = argparse.ArgumentParser(description="Поколение данных поиска (сброс кэша результатов).")
+    parser.add_argument("command", nargs="?", choices=["show", "bump"], default="show")
+    parser.add_argument("--path", help="файл поколения (по умолчанию SEARCH_GENERATION_PATH "
+                                       "или storage/app/search_generation.json)")
+    args = parser.parse_args()
+    if args.command == "bump":
+        bump_generation("query_cache.py bump", args.path)
+    print(json.dumps(read_generation(args.path), ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Компактный бинарный индекс словаря синонимов (query_synonyms.json → .idx).
+
+Ключи нормализуются так же, как QueryExpander::normalize (нижний регистр,
+без дефисов, подчёркиваний и пробелов), и лежат в хэш-таблице с открытой
+адресацией. Поиск — один хэш и несколько чтений из mmap, файл целиком
+не разбирается. Формат читает и PHP (app/Services/QueryExpander.php).
+
+Формат (little-endian):
+    заголовок, 32 байта: magic "NUMSYN01", n_entries, n_slots,
+                         entries_off, synonyms_off, strings_off, 0   (uint32)
+    слоты,   12 байт:    8 байт md5(ключ) + номер записи + 1 (0 — пусто)
+    записи,  16 байт:    key_off, key_len, syn_start, syn_count      (uint32)
+    синонимы, 16 байт:   term_off, term_len (uint32), weight (float64)
+    строки:              UTF-8, смещения — от strings_off
+
+Если несколько ключей нормализуются одинаково, остаётся первый
+(как в цикле QueryExpander::expandWithWeights).
+"""
+import os
+import json
+import mmap
+import struct
+import hashlib
+from pathlib import Path
+
+MAGIC = b"NUMSYN01"
+HEADER = struct.Struct("<8s6I")
+SLOT = struct.Struct("<8sI")
+ENTRY = struct.Struct("<4I")
+SYNONYM = struct.Struct("<2Id")
+
+def normalize_key(key):
+    """Как QueryExpander::normalize: "Multi-Agent_Systems" → "multiagentsystems"."""
+    key = key.lower()
+    for ch in ("-", "_", " "):
+        key = key.replace(ch, "")
+    return key
+
+def key_hash(norm_key):
+    return hashlib.md5(norm_key.encode("utf-8")).digest()[:8]
+
+def index_path(json_path):
+    """query_synonyms.json → query_synonyms.idx"""
+    return Path(json_path).with_suffix(".idx")
+
+def build_index(synonyms, path):
+    """Пишет индекс для словаря {ключ: [[термин, вес], ...]} (атомарно, через .tmp)."""
+    strings = bytearray()
+    entries = []
+    synonyms_table = []
+    seen = set()
+
+    def add_string(text):
+        data = text.encode("utf-8")
+        offset = len(strings)
+        strings.extend(data)
+        return offset, len(data)
+
+    for key, syns in synonyms.items():
+        norm = normalize_key(key)
+        if norm in seen:
+            continue
+        seen.add(norm)
+        key_off, key_len = add_string(norm)
+        entries.append((norm, key_off, key_len, len(synonyms_table), len(syns)))
+        for term, weight in syns:
+            term_off, term_len = add_string(term)
+            synonyms_table.append((term_off, term_len, float(weight)))
+
+    n_slots = 8
+    while n_slots < 2 * len(entries):
+        n_slots *= 2
+    slots = [(bytes(8), 0)] * n_slots
+    for i, (norm, *_rest) in enumerate(entries):
+        h = key_hash(norm)
+        pos = int.from_bytes(h, "little") & (n_slots - 1)
+        while slots[pos][1]:
+            pos = (pos + 1) & (n_slots - 1)
+        slots[pos] = (h, i + 1)
+
+    entries_off = HEADER.size + n_slots * SLOT.size
+    synonyms_off = entries_off + len(entries) * ENTRY.size
+    strings_off = synonyms_off + len(synonyms_table) * SYNONYM.size
+
+    tmp = str(path) + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries), n_slots, entries_off, synonyms_off, strings_off, 0))
+        f.write(b"".join(SLOT.pack(h, e) for h, e in slots))
+        f.write(b"".join(ENTRY.pack(*e[1:]) for e in entries))
+        f.write(b"".join(SYNONYM.pack(*s) for s in synonyms_table))
+        f.write(strings)
+    os.replace(tmp, path)
+    return len(entries)
+
+class SynonymIndex:
+    """Чтение индекса через mmap: get(запрос) → [(термин, вес), ...] за O(1)."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.n_entries, self.n_slots, self._entries_off,
+         self._synonyms_off, self._strings_off, _) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{self.path}: не индекс синонимов")
+
+    def _string(self, offset, length):
+        start = self._strings_off + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def _find(self, norm):
+        h = key_hash(norm)
+        pos = int.from_bytes(h, "little") & (self.n_slots - 1)
+        while True:
+            slot_hash, entry = SLOT.unpack_from(self._mm, HEADER.size + pos * SLOT.size)
+            if not entry:
+                return None
+            if slot_hash == h:
+                key_off, key_len, syn_start, syn_count = ENTRY.unpack_from(
+                    self._mm, self._entries_off + (entry - 1) * ENTRY.size)
+                if self._string(key_off, key_len) == norm:
+                    return syn_start, syn_count
+            pos = (pos + 1) & (self.n_slots - 1)
+
+    def get(self, query):
+        """Синонимы с весами для запроса; [] если ключа нет."""
+        found = self._find(normalize_key(query))
+        if found is None:
+            return []
+        syn_start, syn_count = found
+        out = []
+        for k in range(syn_start, syn_start + syn_count):
+            term_off, term_len, weight = SYNONYM.unpack_from(
+                self._mm, self._synonyms_off + k * SYNONYM.size)
+            out.append((self._string(term_off, term_len), weight))
+        return out
+
+    def __contains__(self, query):
+        return self._find(normalize_key(query)) is not None
+
+    def __len__(self):
+        return self.n_entries
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def open_or_build(json_path, path=None):
+    """
+    Открывает индекс рядом с query_synonyms.json; если его нет или JSON
+    новее (словарь правили вручную), индекс сначала пересобирается.
+    """
+    path = Path(path) if path else index_path(json_path)
+    if not path.exists() or path.stat().st_mtime < Path(json_path).stat().st_mtime:
+        with open(json_path, encoding="utf-8") as f:
+            build_index(json.load(f), path)
+    return SynonymIndex(path)
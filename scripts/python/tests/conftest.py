@@ -0,0 +1,5 @@
+"""Общее для тестов python-скриптов: скрипты импортируются как модули из scripts/python."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,121 @@
+import math
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import bm25_engine
+import corpus_store
+from bm25_engine import BM25Engine, tokenize, WEIGHTS, K1, B
+from jsonstream import RecordWriter
+from query_cache import QueryCache, bump_generation
+
+QUERIES = [
+    [("machine learning", 1.0)],
+    [("neural network", 1.0), ("deep models", 0.5)],
+    [("graph", 1.0), ("search retrieval", 0.3), ("quantum", 0.9)],
+    [("data", 1.0)],
+    [("обучение сеть", 1.0), ("робот", 0.4)],
+    [("multi-agent systems", 1.0)],
+    [("absent", 1.0)],
+    "learning",
+]
+
+WORDS = ["learning", "machine", "neural", "network", "graph", "optimization", "quantum", "deep",
+         "models", "data", "search", "retrieval", "multi-agent", "systems", "обучение", "сеть", "робот"]
+
+@pytest.fixture(scope="module")
+def articles():
+    """Частоты слов по Ципфу: есть и частые, и редкие токены, пустые поля и теги."""
+    rng = random.Random(0)
+    weights = [1 / (i + 1) for i in range(len(WORDS))]
+    text = lambda k: " ".join(rng.choices(WORDS, weights, k=k))
+    return [{"_id": f"{i:024x}", "title": text(rng.randint(0, 8)), "abstract": text(rng.randint(0, 40)),
+             "tags": [text(2) for _ in range(rng.randint(0, 2))]} for i in range(300)]
+
+@pytest.fixture
+def engine(tmp_path, articles):
+    bm25_engine.build(articles, tmp_path / "bm25")
+    return BM25Engine(tmp_path / "bm25")
+
+def exhaustive(articles, terms):
+    """BM25F по определению, без индекса: [(статья, оценка)] по убыванию."""
+    fields = list(WEIGHTS)
+    tokens = [{f: bm25_engine.field_tokens(doc, f) for f in fields} for doc in articles]
+    avg = {f: (sum(len(t[f]) for t in tokens) / len(tokens)) or 1.0 for f in fields}
+    weights = {}
+    for text, w in terms:
+        for token in tokenize(text):
+            weights[token] = max(weights.get(token, 0.0), w)
+    n = len(articles)
+    scores = Counter()
+    for token, w in weights.items():
+        df = sum(any(token in t[f] for f in fields) for t in tokens)
+        if not df:
+            continue
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for d, t in enumerate(tokens):
+            tf = sum(WEIGHTS[f] * t[f].count(token) / (1 - B + B * len(t[f]) / avg[f]) for f in fields)
+            if tf:
+                scores[d] += w * idf * tf / (K1 + tf)
+    return sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("k", [1, 3, 10, 50])
+def test_maxscore_top_k_equals_full_ranking(engine, query, k):
+    full = engine.search(query, k=None)
+    assert engine.search(query, k=k) == full[:k]
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_full_ranking_matches_definition(engine, articles, query):
+    terms = [(query, 1.0)] if isinstance(query, str) else query
+    got = engine.search(query, k=None)
+    expected = dict(exhaustive(articles, terms))
+    # impact хранится во float32: оценки совпадают с точностью до округления
+    assert {d: pytest.approx(s, rel=1e-5) for d, s in got} == expected
+    assert got == sorted(got, key=lambda x: (-x[1], x[0]))
+
+def test_empty_and_nonpositive(engine):
+    assert engine.search([], k=10) == []
+    assert engine.search("learning", k=0) == []
+    assert engine.search([("learning", 0.0)], k=10) == []
+
+def test_max_impact_with_empty_terms(tmp_path):
+    # токены 0, 2 и 4 без постингов — в середине и в конце словаря
+    vocab = ["a", "b", "c", "d", "e"]
+    terms, docs = np.array([1, 1, 3, 3, 3]), np.array([0, 1, 0, 1, 2])
+    field_ids, counts = np.zeros(5, dtype=np.int64), np.array([1, 3, 2, 1, 5])
+    lengths = np.array([[4.0, 0, 0], [6.0, 0, 0], [5.0, 0, 0]])
+    bm25_engine.write_index(tmp_path / "bm25", vocab, terms, docs, field_ids, counts, lengths, WEIGHTS, K1, B)
+    engine = BM25Engine(tmp_path / "bm25")
+    assert list(engine.ptr) == [0, 0, 2, 2, 5, 5]
+    for t in range(len(vocab)):
+        lo, hi = engine.ptr[t], engine.ptr[t + 1]
+        assert engine.max_impact[t] == (engine.impact[lo:hi].max() if hi > lo else 0)
+    assert engine.search("d", k=1) == engine.search("d", k=None)[:1]
+
+def test_service_reloads_on_generation_change(tmp_path, monkeypatch, articles):
+    open_or_build = corpus_store.open_or_build
+    monkeypatch.setattr(corpus_store, "open_or_build", lambda path: open_or_build(path, tmp_path / "stores"))
+    path, generation = tmp_path / "normalized_articles.json", tmp_path / "search_generation.json"
+
+    def write(items):
+        with RecordWriter(path) as writer:
+            for article in items:
+                writer.write(article)
+
+    write(articles)
+    bump_generation("test", generation)
+    service = bm25_engine.SearchService(path, cache=QueryCache(1, 60), generation_file=generation)
+    before = service.search("learning", lemmas=False, k=5)
+    assert service.search("learning", lemmas=False, k=5)["cached"]
+
+    write(articles[:50])
+    bump_generation("test", generation)
+    after = service.search("learning", lemmas=False, k=5)
+    assert service.data.engine.n_docs == 50 and service.reloads == 1
+    assert not after["cached"]
+    assert after["results"] == [{"id": service.data.ids[d], "score": round(s, 6)}
+                                for d, s in service.data.engine.search([("learning", 1.0)], 5)]
+    assert before["results"] != after["results"]
@@ -0,0 +1,132 @@
+import json
+import math
+import random
+import sys
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import build_cooccurrence_synonyms as cooc
+import token_stream
+from jsonstream import RecordWriter
+
+WORDS = ["нейронный", "сеть", "graph", "network", "learning", "deep", "quantum", "state",
+         "agent", "policy", "reward", "image", "vision", "search", "ranking", "query"]
+TOPICS = [["нейронный", "сеть", "deep", "learning"], ["quantum", "state"],
+          ["agent", "policy", "reward"], ["image", "vision"], ["search", "ranking", "query"]]
+
+def make_articles(n=200, seed=0):
+    """Тема статьи задаёт часто встречающиеся вместе слова, остальные — шум."""
+    rng = random.Random(seed)
+    articles = []
+    for i in range(n):
+        topic = rng.choice(TOPICS)
+        text = lambda k: " ".join(rng.choice(topic) if rng.random() < 0.6 else rng.choice(WORDS)
+                                  for _ in range(k))
+        articles.append({"_id": f"{i:024x}", "title": text(rng.randint(0, 6)),
+                         "abstract": text(rng.randint(0, 30)) + (" 2024 x" if i % 7 == 0 else "")})
+    return articles
+
+def naive(articles, window, min_count, max_df, min_pair_count):
+    """Определение: NPMI пар слов в окне, top-5 с весом >= 0.1."""
+    docs = [cooc.tokens(a) for a in articles]
+    df = Counter(w for d in docs for w in set(d))
+    words = sorted((w for w, c in df.items() if min_count <= c <= max_df * len(docs)), key=lambda w: (-df[w], w))
+    index = {w: i for i, w in enumerate(words)}
+    pairs = Counter()
+    for d in docs:
+        seq = [w for w in d if w in index]
+        for p in range(len(seq)):
+            for q in range(p + 1, min(p + window + 1, len(seq))):
+                if seq[p] != seq[q]:
+                    pairs[seq[p], seq[q]] += 1
+                    pairs[seq[q], seq[p]] += 1
+    marginal = Counter()
+    for (a, _), c in pairs.items():
+        marginal[a] += c
+    total = sum(marginal.values())
+    result = {}
+    for a in words:
+        scored = []
+        for (x, b), c in pairs.items():
+            if x != a or c < min_pair_count:
+                continue
+            p = c / total
+            pmi = math.log(p) - math.log(marginal[a] / total) - math.log(marginal[b] / total)
+            score = max(pmi / -math.log(p), 0.0) if p < 1 else 0.0
+            if score >= cooc.MIN_SCORE:
+                scored.append((-score, index[b], b))
+        if scored:
+            result[a] = [[b, round(-s, 4)] for s, _, b in sorted(scored)[:cooc.TOP_N]]
+    return result
+
+def run(tmp_path, monkeypatch, *extra):
+    out = tmp_path / "query_synonyms.json"
+    monkeypatch.setenv("SEARCH_GENERATION_PATH", str(tmp_path / "search_generation.json"))
+    monkeypatch.setattr(sys, "argv", ["build_cooccurrence_synonyms.py", str(tmp_path / "normalized_articles.json"),
+                                      str(out), "--min-count", "2", "--max-df", "0.9",
+                                      "--min-pair-count", "2", "--tmp-dir", str(tmp_path), *extra])
+    cooc.main()
+    return json.loads(out.read_text(encoding="utf-8"))
+
+def assert_same(got, expected):
+    assert list(got) == list(expected)
+    for key in expected:
+        assert [t for t, _ in got[key]] == [t for t, _ in expected[key]], key
+        assert [w for _, w in got[key]] == pytest.approx([w for _, w in expected[key]], abs=1e-4)
+
+@pytest.fixture
+def articles(tmp_path):
+    articles = make_articles()
+    with RecordWriter(tmp_path / "normalized_articles.json") as writer:
+        for article in articles:
+            writer.write(article)
+    return articles
+
+def test_matches_definition(tmp_path, monkeypatch, articles):
+    got = run(tmp_path, monkeypatch)
+    assert got
+    assert_same(got, naive(articles, cooc.DEFAULT_WINDOW, 2, 0.9, 2))
+    assert list(tmp_path.glob("cooc-*")) == []
+
+def test_token_stream_gives_same_result(tmp_path, monkeypatch, articles):
+    text = run(tmp_path, monkeypatch, "--window", "3")
+    token_stream.build_stream(tmp_path / "normalized_articles.json")
+    assert run(tmp_path, monkeypatch, "--window", "3") == text
+
+def test_spilled_counts_equal_in_memory_counts(tmp_path):
+    rng = np.random.default_rng(0)
+    V = 50
+    batches = [(rng.integers(0, V, 5000), rng.integers(0, V, 5000)) for _ in range(6)]
+    expected = Counter()
+    for I, J in batches:
+        expected.update(zip(I.tolist(), J.tolist()))
+
+    counter = cooc.PairCounter(V, memory_mb=0, partitions=4, tmp_dir=tmp_path)
+    counter.capacity = 3000                           # несколько сбросов на диск на каждую пачку
+    counter.buffer = np.empty(counter.capacity, dtype=np.int64)
+    for I, J in batches:
+        counter.add(I, J)
+    got = Counter()
+    for I, J, counts in counter.partitions_iter():
+        assert len(set((I % 4).tolist())) == 1         # часть — строки с одним остатком
+        got.update(dict(zip(zip(I.tolist(), J.tolist()), counts.tolist())))
+    assert counter.spills > 6
+    assert got == expected
+    assert counter.marginals.tolist() == np.bincount(np.concatenate([I for I, _ in batches]), minlength=V).tolist()
+    counter.close()
+
+def test_npmi_bounds():
+    marginals = np.array([10, 10, 10, 30])
+    I, J = np.array([0, 0, 1]), np.array([1, 3, 3])
+    scores = cooc.npmi(I, J, np.array([10, 1, 10]), marginals, 60)
+    assert all((0 <= s <= 1) for s in scores)
+    assert scores[0] > scores[2] > scores[1] == 0   # всегда вместе > часто > реже, чем случайно
+
+def test_merge_keeps_best_weight():
+    base = {"learning": [["deep learning", 0.5], ["ml", 0.2]], "graph": [["network", 0.3]]}
+    extra = {"learning": [["ml", 0.4], ["neural", 0.1]], "vision": [["image", 0.6]]}
+    merged = cooc.merge_dictionaries(base, extra, top_n=2)
+    assert merged == {"learning": [["deep learning", 0.5], ["ml", 0.4]],
+                      "graph": [["network", 0.3]], "vision": [["image", 0.6]]}
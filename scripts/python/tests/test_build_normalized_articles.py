@@ -0,0 +1,112 @@
+import argparse
+
+import pytest
+
+import build_normalized_articles as bna
+from jsonstream import iter_records, RecordWriter
+
+normalize_article = bna.normalize_article
+
+ARTICLES = [
+    {"id": f"{i:024x}", "title": title, "abstract": abstract, "tags": tags}
+    for i, (title, abstract, tags) in enumerate([
+        ("Нейронные сети для графов", "Мы изучаем свёрточные сети", ["Машинное обучение"]),
+        ("Deep Learning Models", "We study networks of graphs", ["Machine Learning"]),
+        ("Квантовые вычисления", "Кубиты и алгоритмы, gpt-4 и tf-idf", []),
+        ("Multi-Agent Systems", "Agents learn to cooperate in 2d worlds", ["Robotics"]),
+        ("Поиск информации", "Ранжирование документов по запросу", ["Information Retrieval"]),
+        ("Computer Vision", "Images and models", ["Computer Vision", "Роботы"]),
+        ("Обучение с подкреплением", "Агенты и награды", ["Reinforcement Learning"]),
+    ])
+]
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.setenv("LEMMA_CACHE_PATH", "off")
+    monkeypatch.setenv("SEARCH_GENERATION_PATH", str(tmp_path / "search_generation.json"))
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Сколько раз статья реально нормализовалась, по id."""
+    calls = []
+    def counting(article):
+        calls.append(article.get("id"))
+        return normalize_article(article)
+    monkeypatch.setattr(bna, "normalize_article", counting)
+    return calls
+
+def write(path, articles):
+    with RecordWriter(path) as writer:
+        for article in articles:
+            writer.write(article)
+
+def run(tmp_path, articles, full=False):
+    src, out = tmp_path / "articles_export.json", tmp_path / "normalized_articles.json"
+    write(src, articles)
+    args = argparse.Namespace(input_file=str(src), output_file=str(out), full=full, chunk_size=2)
+    bna.normalize_incremental(args, 1, str(tmp_path / "state.sqlite3"))
+    return list(iter_records(out))
+
+def single_pass(articles):
+    """Однопроходный режим (--no-state) для сравнения."""
+    bna.init_worker()
+    return [n for n in map(normalize_article, articles) if n is not None]
+
+def test_second_run_reuses_state(tmp_path, calls):
+    first = run(tmp_path, ARTICLES)
+    assert first == single_pass(ARTICLES)
+    assert len(calls) == len(ARTICLES)
+    calls.clear()
+    assert run(tmp_path, ARTICLES) == first
+    assert calls == []
+
+def test_only_changed_articles_are_normalized(tmp_path, calls):
+    run(tmp_path, ARTICLES)
+    calls.clear()
+    changed = [dict(a) for a in ARTICLES]
+    changed[1]["title"] = "Новые нейронные сети"
+    del changed[3]                                            # удалена из выгрузки
+    changed.insert(0, {"id": "f" * 24, "title": "Новая статья", "abstract": "", "tags": []})
+    out = run(tmp_path, changed)
+    assert sorted(calls) == sorted([changed[0]["id"], changed[2]["id"]])
+    assert out == single_pass(changed)
+
+def test_normalizer_version_change_renormalizes_all(tmp_path, calls, monkeypatch):
+    run(tmp_path, ARTICLES)
+    calls.clear()
+    monkeypatch.setattr(bna, "NORMALIZER_VERSION", bna.NORMALIZER_VERSION + "-next")
+    run(tmp_path, ARTICLES)
+    assert len(calls) == len(ARTICLES)
+
+def test_full_ignores_state(tmp_path, calls):
+    run(tmp_path, ARTICLES)
+    calls.clear()
+    run(tmp_path, ARTICLES, full=True)
+    assert len(calls) == len(ARTICLES)
+
+def test_interrupted_run_resumes(tmp_path, calls, monkeypatch):
+    monkeypatch.setattr(bna, "CHECKPOINT_EVERY", 2)
+    normalize = bna.normalize_article
+    def failing(article):
+        if len(calls) > 5:
+            raise KeyboardInterrupt
+        return normalize(article)
+    monkeypatch.setattr(bna, "normalize_article", failing)
+    with pytest.raises(KeyboardInterrupt):
+        run(tmp_path, ARTICLES)
+    assert len(calls) == 6
+    assert not (tmp_path / "normalized_articles.json").exists()
+
+    monkeypatch.setattr(bna, "normalize_article", normalize)
+    calls.clear()
+    assert run(tmp_path, ARTICLES) == single_pass(ARTICLES)
+    # посчитанное до прерывания зафиксировано в состоянии — досчитывается только седьмая
+    assert calls == [ARTICLES[6]["id"]]
+
+def test_invalid_and_repeated_ids(tmp_path, capsys):
+    articles = ARTICLES[:3] + [{"id": "short", "title": "x"}, {"title": "без id"}, dict(ARTICLES[0], title="повтор")]
+    out = run(tmp_path, articles)
+    assert [a["_id"] for a in out] == [a["id"] for a in ARTICLES[:3]]
+    assert out[0] == single_pass(ARTICLES[:1])[0]             # остаётся первая статья с этим id
+    printed = capsys.readouterr().out
+    assert "пропущено без id: 2" in printed and "повторов id: 1" in printed
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from sklearn.metrics import precision_score, recall_score, f1_score, ndcg_score, average_precision_score
+
+from eval_metrics import pack, confusion, prf, prf_retrieved, precision_at_k, ndcg_at_k, average_precision
+
+N_DOCS = 203                      # не кратно 8: проверяются хвостовые биты
+
+def cells(n=60, seed=0):
+    """Пары (найденные, релевантные) наборов позиций, включая пустые и совпадающие."""
+    rng = np.random.default_rng(seed)
+    out = [(set(), set()), (set(), {1, 2}), ({3, 4}, set()), ({5, 6}, {5, 6}), (set(range(N_DOCS)), {0})]
+    for _ in range(n):
+        pred = set(rng.choice(N_DOCS, rng.integers(0, 40), replace=False).tolist())
+        true = set(rng.choice(N_DOCS, rng.integers(0, 40), replace=False).tolist())
+        out.append((pred, true))
+    return out
+
+def vector(positions):
+    y = np.zeros(N_DOCS, dtype=int)
+    y[list(positions)] = 1
+    return y
+
+def test_prf_matches_sklearn():
+    data = cells()
+    pred = pack([p for p, _ in data], N_DOCS)
+    true = pack([t for _, t in data], N_DOCS)
+    tp, fp, fn, tn = confusion(pred, true, N_DOCS)
+    assert (tp + fp + fn + tn == N_DOCS).all()
+    precision, recall, f1 = prf(tp, fp, fn)
+    for r, (p, t) in enumerate(data):
+        y_pred, y_true = vector(p), vector(t)
+        assert precision[r] == pytest.approx(precision_score(y_true, y_pred, zero_division=0))
+        assert recall[r] == pytest.approx(recall_score(y_true, y_pred, zero_division=0))
+        assert f1[r] == pytest.approx(f1_score(y_true, y_pred, zero_division=0))
+
+def test_prf_retrieved_matches_old_scripts():
+    # прежние скрипты: y_pred — единицы по найденным, y_true — их релевантность
+    data = cells(seed=1)
+    tp, fp, _, _ = confusion(pack([p for p, _ in data], N_DOCS), pack([t for _, t in data], N_DOCS), N_DOCS)
+    precision, recall, f1 = prf_retrieved(tp, fp)
+    for r, (p, t) in enumerate(data):
+        if not p:
+            assert precision[r] == recall[r] == f1[r] == 0   # раньше такая ячейка давала нули
+            continue
+        y_pred = [1] * len(p)
+        y_true = [int(d in t) for d in sorted(p)]
+        assert precision[r] == pytest.approx(precision_score(y_true, y_pred, zero_division=0))
+        assert recall[r] == pytest.approx(recall_score(y_true, y_pred, zero_division=0))
+        assert f1[r] == pytest.approx(f1_score(y_true, y_pred, zero_division=0))
+
+def rankings(n=40, seed=2, min_length=0):
+    rng = np.random.default_rng(seed)
+    ranked, relevant = [], []
+    for _ in range(n):
+        length = int(rng.integers(min_length, N_DOCS + 1)) if min_length else int(rng.integers(0, 30))
+        ranked.append(rng.permutation(N_DOCS)[:length].tolist())
+        relevant.append(set(rng.choice(N_DOCS, int(rng.integers(1, 30)), replace=False).tolist()))
+    return ranked, relevant
+
+def scores_of(docs):
+    """Оценки для sklearn: по убыванию позиции в выдаче, не попавшие — ниже всех."""
+    y = np.full(N_DOCS, -1.0)
+    y[docs] = np.arange(len(docs), 0, -1)
+    return y
+
+@pytest.mark.parametrize("k", [1, 5, 10, 50])
+def test_ndcg_matches_sklearn(k):
+    # выдачи не короче k: не попавшие в выдачу документы в top-k не входят и у sklearn
+    ranked, relevant = rankings(min_length=50)
+    got = ndcg_at_k(ranked, pack(relevant, N_DOCS), k)
+    for r, (docs, rel) in enumerate(zip(ranked, relevant)):
+        assert got[r] == pytest.approx(ndcg_score([vector(rel)], [scores_of(docs)], k=k))
+
+def test_average_precision_matches_sklearn():
+    ranked, relevant = rankings(min_length=N_DOCS)
+    got = average_precision(ranked, pack(relevant, N_DOCS))
+    for r, (docs, rel) in enumerate(zip(ranked, relevant)):
+        assert got[r] == pytest.approx(average_precision_score(vector(rel), scores_of(docs)))
+
+def test_precision_at_k():
+    ranked, relevant = rankings(seed=3)
+    got = precision_at_k(ranked, pack(relevant, N_DOCS), 10)
+    for r, (docs, rel) in enumerate(zip(ranked, relevant)):
+        assert got[r] == pytest.approx(len(set(docs[:10]) & rel) / 10)
@@ -0,0 +1,195 @@
+import os
+import json
+import functools
+import threading
+import time
+
+import feedparser
+import pytest
+
+import arxiv_stub
+import fetch_arxiv as fa
+from jsonstream import iter_records
+
+TOPICS = ["robotics", "genomics", "data mining"]
+
+@pytest.fixture
+def stub():
+    server = arxiv_stub.make_server(arxiv_stub.parse_args(["--port", "0", "--latency", "0", "--total", "120"]))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/api/query"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(fa, "fetch_feed", functools.partial(fa.fetch_feed, backoff=0.01))
+
+def expected_articles(topics, total):
+    """Что должно оказаться в датасете: статьи тем по порядку выдачи, общие — один раз."""
+    seen, out = set(), []
+    for topic in topics:
+        for entry in feedparser.parse(arxiv_stub.feed_xml(topic, 0, total, total)).entries:
+            article = fa.to_article(entry)
+            key = fa.paper_key(entry.id)
+            if article is not None and key not in seen:
+                seen.add(key)
+                out.append(article)
+    return out
+
+def harvest(stub, path, **kwargs):
+    kwargs = {"workers": 3, "rate": 200, "page_size": 25, **kwargs}
+    return fa.harvest(TOPICS, str(path), api_url=stub.url, **kwargs)
+
+def test_to_article_fields():
+    entry = feedparser.parse(arxiv_stub.feed_xml("robotics", 0, 2, 2)).entries[1]
+    assert fa.to_article(entry) == {
+        "title": "Robotics study 1",
+        "abstract": "Abstract of Robotics study 1. Second line.",
+        "tags": ["Artificial Intelligence", "Computation and Language"],
+        "authors": ["Author 1"],
+        "affiliations": [""],
+        "date": "2024-01-01T01:00:00",
+        "updated": "2024-01-01T01:00:00",
+        "arxiv_id": entry.id,
+        "primary_category": "Artificial Intelligence",
+        "categories": ["Artificial Intelligence", "Computation and Language"],
+        "doi": None,
+        "pdf_url": entry.id.replace("/abs/", "/pdf/"),
+        "comment": None,
+        "journal_ref": None,
+        "lang": "en",
+    }
+    unknown = feedparser.parse(arxiv_stub.feed_xml("robotics", 3, 1, 4)).entries[0]
+    assert fa.to_article(unknown) is None                  # только hep-th
+
+def test_concurrent_harvest_with_failures(stub, tmp_path):
+    stub.args.fail_rate = 0.5
+    added, replaced, total, failed = harvest(stub, tmp_path / "arxiv.json", max_results=100)
+    assert failed == [] and replaced == 0
+    assert list(iter_records(tmp_path / "arxiv.json")) == expected_articles(TOPICS, 100)
+    assert added == total == len(expected_articles(TOPICS, 100))
+    assert stub.stats["failed"] > 0
+
+def test_shared_rate_limit(stub, tmp_path):
+    # интервал ограничителя 40 мс, заглушка отказывает при < 20 мс: запас на сетевой разброс
+    stub.args.min_interval = 0.02
+    harvest(stub, tmp_path / "arxiv.json", workers=4, rate=25, max_results=100)
+    assert stub.stats["rate_limited"] == 0
+    assert stub.stats["min_interval"] >= 0.02
+
+def test_rate_limiter_spacing():
+    limiter = fa.RateLimiter(50)
+    started = time.monotonic()
+    threads = [threading.Thread(target=lambda: [limiter.acquire() for _ in range(5)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 20 запросов из четырёх потоков: первый сразу, остальные — не чаще раза в 20 мс
+    assert time.monotonic() - started >= 19 * 0.02
+
+def ids(path):
+    return [fa.paper_key(a["arxiv_id"]) for a in iter_records(path)]
+
+def keys(articles):
+    return sorted(fa.paper_key(a["arxiv_id"]) for a in articles)
+
+def test_update_fetches_only_new(stub, tmp_path):
+    path = tmp_path / "arxiv.json"
+    harvest(stub, path, max_results=500)
+    before = ids(path)
+    requests = stub.stats["requests"]
+
+    stub.args.total = 180
+    added, replaced, total, failed = harvest(stub, path, max_results=500)
+    assert ids(path)[:len(before)] == before                       # старые статьи — на своих местах
+    assert sorted(ids(path)) == keys(expected_articles(TOPICS, 180))
+    assert added == total - len(before) and replaced == 0 and failed == []
+    # по lastUpdatedDate до водяного знака: 60 новых статей — три страницы по 25 на тему
+    assert stub.stats["requests"] - requests == 3 * len(TOPICS)
+
+def test_update_pages_past_max_results(stub, tmp_path):
+    path = tmp_path / "arxiv.json"
+    stub.args.total = 50
+    harvest(stub, path, max_results=50)
+    stub.args.total = 300                                          # новых больше, чем max_results
+    harvest(stub, path, max_results=50)
+    assert sorted(ids(path)) == keys(expected_articles(TOPICS, 300))
+
+def test_article_in_watermark_second_is_fetched(stub, tmp_path):
+    # статьи 2k и 2k+1 обновлены в одну секунду; первый проход берёт 0..48,
+    # водяной знак — секунда статей 48 и 49, а 49 ещё не собрана
+    stub.args.step = 0.5
+    path = tmp_path / "arxiv.json"
+    harvest(stub, path, max_results=49)
+    assert sorted(ids(path)) == keys(expected_articles(TOPICS, 49))
+    harvest(stub, path, max_results=49)
+    assert sorted(ids(path)) == keys(expected_articles(TOPICS, 120))
+
+def test_interrupted_topic_resumes(stub, tmp_path, monkeypatch):
+    stub.args.total = 100
+    path = tmp_path / "arxiv.json"
+    fetch = fa.fetch_feed
+    def failing(url, *args, **kwargs):
+        if "genomics" in url and "start=50" in url:
+            raise fa.FetchError("нет сети")
+        return fetch(url, *args, **kwargs)
+    monkeypatch.setattr(fa, "fetch_feed", failing)
+    _, _, _, failed = harvest(stub, path, max_results=100)
+    assert failed == ["genomics"]
+    state = fa.HarvestState(fa.state_path(str(path))).get("genomics")
+    assert state["pass"]["offset"] == 50 and "watermark" not in state
+
+    monkeypatch.setattr(fa, "fetch_feed", fetch)
+    requests = stub.stats["requests"]
+    harvest(stub, path, max_results=100)
+    # genomics — две оставшиеся страницы; остальные темы — по странице до водяного знака
+    assert stub.stats["requests"] - requests == 2 + 2
+    # начало genomics слито ещё первым запуском, остальное дописано в конец
+    assert sorted(ids(path)) == keys(expected_articles(TOPICS, 100))
+    assert not (tmp_path / "arxiv.json.pending").exists()
+
+def paper(n, updated, title=None):
+    return {"arxiv_id": f"http://arxiv.org/abs/2401.{n:05d}v1", "updated": updated, "title": title or f"paper {n}"}
+
+class ListWriter(list):
+    write = list.append
+
+def test_merge_pending_streams_topics_in_order(tmp_path):
+    journal = fa.Journal(fa.journal_path(str(tmp_path / "arxiv.json")))
+    # темы дописаны в обратном порядке — слияние всё равно идёт по порядку topics
+    journal.append("b", [(0, paper(3, "2024-01-03", "b3")), (1, paper(1, "2024-01-05", "b1 new"))])
+    journal.append("a", [(0, paper(4, "2024-01-01", "a4")), (1, paper(3, "2024-01-02", "a3 old")),
+                         (2, paper(2, "2023-12-01", "a2 old"))])
+    assert journal.files(["a", "b"]) == [journal.topic_path("a"), journal.topic_path("b")]
+    dataset = [paper(1, "2024-01-01", "d1"), paper(2, "2024-01-01", "d2"), paper(9, "2024-01-01", "d9")]
+    out = ListWriter()
+    added, replaced = fa.merge_pending(iter(dataset), journal, ["a", "b"], out)
+    # 1 заменена более свежей, 2 в журнале старее датасета; новые — в порядке первого появления
+    assert [a["title"] for a in out] == ["b1 new", "d2", "d9", "a4", "b3"]
+    assert (added, replaced) == (2, 1)
+    journal.clear()
+    assert not (tmp_path / "arxiv.json.pending").exists()
+
+def test_merge_pending_skips_torn_line(tmp_path):
+    journal = fa.Journal(str(tmp_path / "arxiv.json.pending"))
+    journal.append("a", [(0, paper(1, "2024-01-01")), (1, paper(2, "2024-01-01"))])
+    with open(journal.topic_path("a"), "ab") as f:
+        f.write(b'{"topic": "a", "pos": 2, "arti')
+    out = ListWriter()
+    assert fa.merge_pending(iter(()), journal, ["a"], out) == (2, 0)
+    assert [a["title"] for a in out] == ["paper 1", "paper 2"]
+
+def test_legacy_journal_is_split_by_topic(tmp_path):
+    path = str(tmp_path / "arxiv.json.pending")
+    with open(f"{path}.jsonl", "w", encoding="utf-8") as f:
+        for topic, pos, n in [("b", 0, 1), ("a", 0, 2), ("b", 1, 3)]:
+            f.write(json.dumps({"topic": topic, "pos": pos, "article": paper(n, "2024-01-01")}) + "\n")
+    journal = fa.Journal(path)
+    assert not os.path.exists(f"{path}.jsonl")
+    out = ListWriter()
+    assert fa.merge_pending(iter(()), journal, ["a", "b"], out) == (3, 0)
+    assert [a["title"] for a in out] == ["paper 2", "paper 1", "paper 3"]
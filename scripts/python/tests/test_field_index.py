@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from corpus_store import build_store, CorpusStore
+from field_index import FieldIndex
+
+WORDS = ["learning", "machine", "neural", "network", "networks", "graph", "optimization",
+         "quantum", "vision", "language", "model", "deep", "search", "retrieval",
+         "multi-agent", "systems", "робот", "обучение", "сеть", "x", "2d"]
+TAGS = ["Machine Learning", "Statistical Machine Learning", "Computer Vision",
+        "Multi-Agent Systems", "Information Retrieval", "Robotics", "Нейронные сети"]
+
+@pytest.fixture(scope="module")
+def articles():
+    """Статьи с повторяющимися словами, пустыми полями и тегами в разном регистре."""
+    rng = random.Random(0)
+    text = lambda k: " ".join(rng.choices(WORDS, k=k))
+    return [{"_id": f"{i:024x}", "title": text(rng.randint(0, 8)).title() if i % 5 == 0 else text(rng.randint(0, 8)),
+             "abstract": text(rng.randint(0, 40)), "tags": rng.sample(TAGS, rng.randint(0, 3))}
+            for i in range(300)]
+
+def naive(articles, field, term, how):
+    """Прежние матчеры скриптов оценки: перебор всех значений поля."""
+    found = set()
+    for i, doc in enumerate(articles):
+        value = doc.get(field, "")
+        for v in (value if isinstance(value, list) else [value]):
+            v = v.lower()
+            if how == "contains" and term in v \
+                    or how == "equals" and term == v \
+                    or how == "words" and f" {term} " in f" {v} ":
+                found.add(i)
+    return found
+
+def terms(seed=1):
+    rng = random.Random(seed)
+    out = {"", " ", "learn", "ing ma", "network", "networks", "multi-agent systems",
+           "нейронные", "machine learning", "vision x"}
+    out |= {t.lower() for t in TAGS}
+    for _ in range(60):
+        words = rng.sample(WORDS, rng.randint(1, 3))
+        phrase = " ".join(words)
+        # кусок фразы с произвольных позиций — подстрока, а не целые токены
+        a = rng.randint(0, len(phrase) - 1)
+        out.add(phrase)
+        out.add(phrase[a:a + rng.randint(1, 12)])
+    return sorted(out)
+
+@pytest.mark.parametrize("field", ["title", "abstract", "tags"])
+@pytest.mark.parametrize("how", ["contains", "equals", "words"])
+def test_lookup_matches_substring_scan(articles, field, how):
+    index = FieldIndex(articles)
+    for term in terms():
+        assert index.lookup(field, term, how) == naive(articles, field, term, how), term
+
+def test_index_from_store_matches(tmp_path, articles):
+    build_store(articles, tmp_path / "store")
+    index, stored = FieldIndex(articles), FieldIndex.from_store(CorpusStore(tmp_path / "store"))
+    for field in ("title", "tags"):
+        for term in terms():
+            for how in ("contains", "equals", "words"):
+                assert stored.lookup(field, term, how) == index.lookup(field, term, how), (field, term, how)
+
+def test_match_is_union(articles):
+    index = FieldIndex(articles)
+    some = ["machine", "graph search", "robotics"]
+    expected = set().union(*(naive(articles, "title", t, "contains") for t in some))
+    assert index.match("title", some) == expected
+
+def test_unknown_mode(articles):
+    with pytest.raises(ValueError):
+        FieldIndex(articles).lookup("title", "graph", how="regex")
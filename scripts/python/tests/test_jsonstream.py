@@ -0,0 +1,61 @@
+import gzip
+
+import pytest
+
+import jsonstream
+from jsonstream import iter_records, RecordWriter
+
+RECORDS = [
+    {"title": "Ёлка и «кавычки»", "tags": ["a", "b"], "n": 1},
+    {"title": "x" * (jsonstream.READ_CHUNK + 17), "n": 123456789},   # запись больше буфера чтения
+    {"nested": {"list": [1, 2.5, None, True]}, "n": -0.5},
+    {},
+]
+
+@pytest.mark.parametrize("name", ["out.json", "out.jsonl", "out.json.gz", "out.jsonl.gz"])
+def test_round_trip(tmp_path, name):
+    path = tmp_path / name
+    with RecordWriter(path) as writer:
+        for record in RECORDS:
+            writer.write(record)
+    assert writer.count == len(RECORDS)
+    assert list(iter_records(path)) == RECORDS
+    if name.endswith(".gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            assert f.read(1) in "[{"
+
+def test_array_read_in_small_chunks(tmp_path, monkeypatch):
+    # числа и строки на границах буфера дочитываются, а не обрезаются
+    path = tmp_path / "out.json"
+    with RecordWriter(path) as writer:
+        for i in range(50):
+            writer.write({"i": i * 1000003, "s": "ж" * i})
+    monkeypatch.setattr(jsonstream, "READ_CHUNK", 7)
+    assert [r["i"] for r in iter_records(path)] == [i * 1000003 for i in range(50)]
+
+def test_empty_inputs(tmp_path):
+    for name, content in [("a.json", "[]\n"), ("b.jsonl", ""), ("c.json", "  \n")]:
+        (tmp_path / name).write_text(content, encoding="utf-8")
+        assert list(iter_records(tmp_path / name)) == []
+    with RecordWriter(tmp_path / "d.json"):
+        pass
+    assert list(iter_records(tmp_path / "d.json")) == []
+
+def test_jsonl_append(tmp_path):
+    path = tmp_path / "log.jsonl"
+    with RecordWriter(path) as writer:
+        writer.write(RECORDS[0])
+    with RecordWriter(path, append=True) as writer:
+        writer.write(RECORDS[2])
+    assert list(iter_records(path)) == [RECORDS[0], RECORDS[2]]
+
+def test_failed_write_keeps_old_file(tmp_path):
+    path = tmp_path / "out.json"
+    with RecordWriter(path) as writer:
+        writer.write(RECORDS[0])
+    with pytest.raises(RuntimeError):
+        with RecordWriter(path) as writer:
+            writer.write(RECORDS[2])
+            raise RuntimeError
+    assert list(iter_records(path)) == [RECORDS[0]]
+    assert not (tmp_path / "out.json.tmp").exists()
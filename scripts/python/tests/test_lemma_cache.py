@@ -0,0 +1,90 @@
+import threading
+
+import lemma_cache
+from lemma_cache import LemmaCache
+
+class Counting:
+    """compute, который считает вызовы по токенам."""
+    def __init__(self):
+        self.calls = {}
+
+    def __call__(self, token):
+        self.calls[token] = self.calls.get(token, 0) + 1
+        return token.upper()
+
+def test_memoizes_in_memory():
+    compute = Counting()
+    cache = LemmaCache("test", "lemma", 0.3, compute, path=None)
+    assert [cache.get(t) for t in ["a", "b", "a", "a"]] == ["A", "B", "A", "A"]
+    assert compute.calls == {"a": 1, "b": 1}
+    stats = cache.stats()
+    assert (stats["lookups"], stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (4, 2, 0, 2)
+
+def test_persists_between_processes(tmp_path):
+    path = tmp_path / "lemma_cache.sqlite3"
+    first = LemmaCache("test", "lemma", 0.3, Counting(), path=path)
+    for token in ["машина", "обучение"]:
+        first.get(token)
+    first.close()
+
+    compute = Counting()
+    second = LemmaCache("test", "lemma", 0.3, compute, path=path)
+    assert second.get("машина") == "МАШИНА" and second.get("обучение") == "ОБУЧЕНИЕ"
+    assert compute.calls == {}
+    assert second.stats()["disk_hits"] == 2
+    second.close()
+
+def test_namespace_separates_analyzers(tmp_path):
+    path = tmp_path / "lemma_cache.sqlite3"
+    LemmaCache("pymorphy3-1", "lemma", 0.3, Counting(), path=path).close()
+    first = LemmaCache("pymorphy3-1", "lemma", 0.3, Counting(), path=path)
+    first.get("сеть")
+    first.close()
+    # другой порог (или версия анализатора) — значения из старого пространства не берутся
+    compute = Counting()
+    other = LemmaCache("pymorphy3-1", "lemma", 0.5, compute, path=path)
+    other.get("сеть")
+    assert compute.calls == {"сеть": 1}
+    other.close()
+
+def test_pending_written_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(lemma_cache, "FLUSH_EVERY", 3)
+    path = tmp_path / "lemma_cache.sqlite3"
+    cache = LemmaCache("test", "lemma", None, Counting(), path=path)
+    for token in "abcd":
+        cache.get(token)
+    assert sorted(cache._pending) == ["d"]          # a, b, c уже на диске
+    reader = LemmaCache("test", "lemma", None, Counting(), path=path)
+    assert [reader._disk_get(t) for t in "abcd"] == ["A", "B", "C", None]
+    cache.flush()
+    assert reader._disk_get("d") == "D"
+    cache.close()
+    reader.close()
+
+def test_lru_bound():
+    compute = Counting()
+    cache = LemmaCache("test", "lemma", None, compute, path=None, lru_size=2)
+    for token in ["a", "b", "a", "c", "b"]:
+        cache.get(token)
+    # b вытеснена при добавлении c (a была запрошена позже), поэтому считается снова
+    assert compute.calls == {"a": 1, "b": 2, "c": 1}
+    assert list(cache._lru) == ["c", "b"]
+
+def test_concurrent_gets_return_own_values(tmp_path):
+    cache = LemmaCache("test", "lemma", None, lambda t: t[::-1], path=tmp_path / "c.sqlite3")
+    tokens = [f"tok{i % 50}" for i in range(2000)]
+    errors = []
+
+    def worker(offset):
+        for token in tokens[offset:] + tokens[:offset]:
+            if cache.get(token) != token[::-1]:
+                errors.append(token)
+
+    threads = [threading.Thread(target=worker, args=(i * 97,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert cache.stats()["lookups"] == 8 * len(tokens)
+    cache.close()
@@ -0,0 +1,61 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+from lsh_similarity import topk_cosine_lsh, recall_against_exact, band_pairs
+from topk_similarity import topk_cosine
+
+def matrix(n=400, m=60, seed=0):
+    X = sp.random(n, m, density=0.08, random_state=seed, format="csr")
+    rows = [X[i] for i in range(n)]
+    rows[7] = sp.csr_matrix((1, m))                    # пустая строка
+    return sp.vstack(rows).tocsr()
+
+def test_scores_are_exact_and_ordered():
+    X = matrix()
+    approx, _ = topk_cosine_lsh(X, 5, 0.1, bands=16, rows=6)
+    Xn = normalize(X, norm="l2")
+    for i, (cols, scores) in enumerate(approx):
+        assert len(cols) <= 5 and i not in cols
+        assert all(scores >= 0.1)
+        exact = np.array([Xn[i].multiply(Xn[j]).sum() for j in cols])
+        np.testing.assert_allclose(scores, exact, rtol=1e-6)
+        assert list(zip(-scores, cols)) == sorted(zip(-scores, cols))
+    assert len(approx[7][0]) == 0
+
+def test_wide_bands_recover_exact_result():
+    # много коротких полос — практически любая пара с общими признаками становится кандидатом
+    X = matrix(seed=2)
+    approx, n_candidates = topk_cosine_lsh(X, 5, 0.1, bands=128, rows=2, max_bucket=1000)
+    exact = topk_cosine(X, 5, 0.1)
+    for (cols, scores), (ecols, escores) in zip(approx, exact):
+        assert list(cols) == list(ecols)
+        np.testing.assert_allclose(scores, escores, rtol=1e-6)
+    assert recall_against_exact(X, approx, 5, 0.1, sample=400) == (1.0, 400)
+    assert n_candidates > 0
+
+def test_recall_against_exact_counts_missing_neighbours():
+    X = matrix(seed=4)
+    exact = topk_cosine(X, 5, 0.1)
+    truncated = [(cols[:2], scores[:2]) for cols, scores in exact]
+    total = sum(len(cols) for cols, _ in exact)
+    found = sum(len(cols) for cols, _ in truncated)
+    recall, sampled = recall_against_exact(X, truncated, 5, 0.1, sample=10_000)
+    assert sampled == X.shape[0]
+    assert recall == found / total
+
+def test_recall_grows_with_bands():
+    X = matrix(n=800, seed=5)
+    recalls = []
+    for bands in (4, 16, 64):
+        approx, _ = topk_cosine_lsh(X, 5, 0.1, bands=bands, rows=8)
+        recalls.append(recall_against_exact(X, approx, 5, 0.1, sample=800)[0])
+    assert recalls == sorted(recalls) and recalls[-1] > recalls[0]
+
+def test_band_pairs_bounded_by_max_bucket():
+    keys = np.zeros(10, dtype=np.uint64)             # одна корзина из 10 строк
+    ids = np.arange(10)
+    pairs = {(int(i), int(j)) for I, J in band_pairs(keys, ids, max_bucket=4) for i, j in zip(I, J)}
+    # группы 0-3, 4-7, 8-9: пары только внутри группы
+    groups = [range(0, 4), range(4, 8), range(8, 10)]
+    assert pairs == {(i, j) for g in groups for i in g for j in g if i < j}
@@ -0,0 +1,97 @@
+import os
+import re
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+os.environ.setdefault("LEMMA_CACHE_PATH", "off")   # кэш лемм создаётся при импорте
+import normalize_query as nq
+from lemma_cache import LemmaCache
+
+LINES = [
+    '{"id": 1, "query": "Нейронные сети для графов"}',
+    '{"id": 2, "terms": ["networks", "of", "graphs"]}',
+    '"обучение с подкреплением"',
+    '{"id": "x", "query": "GPT-4 и 2024 год"}',
+    '{"id": 5, "query": "сети и networks"}',
+    '{"id": 6, "query": ""}',
+]
+
+def english(token):
+    """Вместо WordNet (его данных может не быть): множественное число → единственное."""
+    return token[:-1] if token.endswith("s") and len(token) > 3 else token
+
+@pytest.fixture(autouse=True)
+def tokenizer(monkeypatch):
+    monkeypatch.setattr(nq, "en_lemmas", LemmaCache("test-en", "lemma", 0.3, english, path=None))
+    t = nq.make_tokenizer()
+    monkeypatch.setattr(nq, "tokenizer", t)
+    return t
+
+def server_responses(lines):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        return [nq.handle_line(line, executor, nq.DEFAULT_TIMEOUT) for line in lines]
+
+def test_batch_matches_server():
+    responses = nq.lemmatize_batch(LINES, {})
+    assert responses == server_responses(LINES)
+    assert responses[0] == {"id": 1, "lemmas": ["нейронный", "сеть", "граф"]}
+    assert responses[1] == {"id": 2, "lemmas": ["network", "graph"]}
+    assert responses[2] == {"id": None, "lemmas": ["обучение", "подкрепление"]}
+    assert responses[5] == {"id": 6, "lemmas": []}
+
+def test_bad_lines_get_errors(monkeypatch):
+    lines = ['{"id": 1, "query": "сети"}', "{битый json", "42", '{"id": 3}', '{"id": 4, "terms": "не список"}',
+             '{"id": 5, "query": "сломанное слово"}', '{"id": 6, "query": "слово"}']
+    word_lemma = nq.word_lemma
+    def failing(word):
+        if word == "сломанное":
+            raise RuntimeError("анализатор упал")
+        return word_lemma(word)
+    monkeypatch.setattr(nq, "word_lemma", failing)
+    responses = nq.lemmatize_batch(lines, {})
+    # как у сервера: у неразобранной строки id неизвестен
+    assert responses[:5] == server_responses(lines[:5])
+    assert [r["id"] for r in responses] == [1, None, None, None, None, 5, 6]
+    assert [("error" in r) for r in responses] == [False, True, True, True, True, True, False]
+    assert responses[5]["error"] == "анализатор упал"
+    assert responses[6] == {"id": 6, "lemmas": ["слово"]}
+
+def test_batch_file_lemmatizes_each_word_once(tmp_path, monkeypatch, capsys):
+    lines = LINES * 3
+    src, out = tmp_path / "queries.jsonl", tmp_path / "lemmas.jsonl"
+    # пустые строки пропускаются, BOM в начале файла допустим
+    src.write_text("﻿" + "\n\n".join(lines) + "\n", encoding="utf-8")
+    calls = []
+    word_lemma = nq.word_lemma
+    monkeypatch.setattr(nq, "word_lemma", lambda word: calls.append(word) or word_lemma(word))
+
+    nq.batch(argparse.Namespace(input=str(src), output=str(out), chunk=4))
+    responses = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert responses == server_responses(lines)
+    # пачки по 4 строки, но слово лемматизируется один раз за запуск
+    assert len(calls) == len(set(calls))
+    assert f"запросов {len(lines)} (ошибок 0)" in capsys.readouterr().err
+
+def baseline_lemmatize(text):
+    """Лемматизация запроса до tokenizer.py (ветки по is_cyrillic)."""
+    lemmas = []
+    for word in re.sub(r"[^а-яА-Яa-zA-Z0-9ёЁ\s\-]", "", text.lower()).split():
+        if re.match(r"^[а-яё]+$", word, re.IGNORECASE):
+            lemma = nq.ru_lemmas.get(word)
+            stopwords = nq.RU_STOPWORDS
+        else:
+            lemma = nq.en_lemmas.get(word)
+            stopwords = nq.EN_STOPWORDS
+        if lemma not in stopwords:
+            lemmas.append(lemma)
+    return lemmas
+
+def test_same_lemmas_as_before_tokenizer():
+    queries = ["какая-то статья", "из-за сетей", "tf-idf-модели и BM25", "covid-19 модели",
+               "Нейронные сети для графов", "the networks of graphs", "GPT-4 и 2024 год", "что-нибудь о кубитах"]
+    for query in queries:
+        assert nq.lemmatize(query) == baseline_lemmatize(query), query
+    assert nq.lemmatize("какая-то статья") == ["какая-то", "статья"]
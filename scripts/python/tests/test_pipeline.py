@@ -0,0 +1,136 @@
+import os
+import sys
+
+import pytest
+
+import pipeline
+from pipeline import Stage, PipelineState, run_pipeline, dependencies, upstream
+
+# копирует файлы-входы в выход (через пробел), считает запуски в <выход>.runs
+COPY = """
+import sys
+*inputs, output = sys.argv[1:]
+data = "".join(open(p, encoding="utf-8").read() for p in inputs)
+open(output, "w", encoding="utf-8").write(data)
+open(output + ".runs", "a").write("x")
+"""
+
+@pytest.fixture
+def files(tmp_path):
+    (tmp_path / "source.txt").write_text("исходные данные", encoding="utf-8")
+    (tmp_path / "side.txt").write_text("побочный вход", encoding="utf-8")
+    (tmp_path / "code.py").write_text("# код стадии", encoding="utf-8")
+    return tmp_path
+
+def copy_stage(name, inputs, output, code=(), **kwargs):
+    return Stage(name, [sys.executable, "-c", COPY, *inputs, output],
+                 inputs=inputs, outputs=[output], code=code, **kwargs)
+
+def make_stages(d):
+    """a → b → c, side → d; b и d зависят от кода code.py."""
+    p = lambda name: str(d / name)
+    return [
+        copy_stage("a", [p("source.txt")], p("a.txt")),
+        copy_stage("b", [p("a.txt")], p("b.txt"), code=[p("code.py")]),
+        copy_stage("c", [p("b.txt")], p("c.txt")),
+        copy_stage("d", [p("side.txt")], p("d.txt"), code=[p("code.py")]),
+    ]
+
+def run(d, **kwargs):
+    state = PipelineState(d / "state" / "state.json")
+    results = run_pipeline(make_stages(d), state, log_dir=d / "logs", **kwargs)
+    return {r["stage"]: r["status"] for r in results}
+
+def runs(d, name):
+    path = d / f"{name}.txt.runs"
+    return len(path.read_text()) if path.exists() else 0
+
+def test_default_stages_graph():
+    deps = dependencies(pipeline.default_stages("python", "php", "dataset.json"))
+    assert deps == {
+        "fetch": [],
+        "import": ["fetch"],
+        "export": ["import"],
+        "normalize": ["export"],
+        "tag_synonyms": ["normalize"],
+        "synonyms": ["normalize", "tag_synonyms"],
+        "import_normalized": ["normalize"],
+    }
+    assert upstream(["tag_synonyms"], deps) == {"fetch", "import", "export", "normalize", "tag_synonyms"}
+
+def test_cycle_and_shared_output_rejected():
+    with pytest.raises(ValueError, match="цикл"):
+        dependencies([Stage("x", ["true"], inputs=["y.txt"], outputs=["x.txt"]),
+                      Stage("y", ["true"], inputs=["x.txt"], outputs=["y.txt"])])
+    with pytest.raises(ValueError, match="пишут стадии"):
+        dependencies([Stage("x", ["true"], outputs=["z.txt"]), Stage("y", ["true"], outputs=["z.txt"])])
+
+def test_second_run_is_up_to_date(files):
+    assert run(files) == dict.fromkeys("abcd", "ran")
+    assert (files / "c.txt").read_text(encoding="utf-8") == "исходные данные"
+    assert run(files) == dict.fromkeys("abcd", "up-to-date")
+    assert [runs(files, s) for s in "abcd"] == [1, 1, 1, 1]
+
+def test_changed_input_reruns_downstream_only(files):
+    run(files)
+    (files / "source.txt").write_text("новые данные", encoding="utf-8")
+    assert run(files) == {"a": "ran", "b": "ran", "c": "ran", "d": "up-to-date"}
+    assert (files / "c.txt").read_text(encoding="utf-8") == "новые данные"
+
+def test_same_output_does_not_rerun_dependents(files):
+    run(files)
+    # b перезапускается из-за кода, но пишет то же — c актуальна
+    (files / "code.py").write_text("# другой код стадии", encoding="utf-8")
+    assert run(files) == {"a": "up-to-date", "b": "ran", "c": "up-to-date", "d": "ran"}
+
+def test_missing_or_edited_output_reruns(files):
+    run(files)
+    (files / "d.txt").unlink()
+    (files / "b.txt").write_text("испорчено", encoding="utf-8")
+    assert run(files) == {"a": "up-to-date", "b": "ran", "c": "up-to-date", "d": "ran"}
+    assert (files / "b.txt").read_text(encoding="utf-8") == "исходные данные"
+
+def test_targets_select_upstream(files):
+    assert run(files, targets=["b"]) == {"a": "ran", "b": "ran"}
+    assert runs(files, "c") == runs(files, "d") == 0
+
+def test_skip_force_and_always(files):
+    run(files)
+    assert run(files, skip=["a"], force=["c"]) == {"a": "skipped", "b": "up-to-date", "c": "ran",
+                                                   "d": "up-to-date"}
+    state = PipelineState(files / "state" / "state.json")
+    stages = make_stages(files)
+    stages[3].always = True
+    results = run_pipeline(stages, state, log_dir=files / "logs")
+    assert {r["stage"]: r["status"] for r in results}["d"] == "ran"
+    with pytest.raises(ValueError, match="неизвестные стадии"):
+        run(files, skip=["fetch"])
+
+def test_dry_run_runs_nothing(files):
+    run(files)
+    (files / "source.txt").write_text("новые данные", encoding="utf-8")
+    # b и c сами актуальны, но зависят от стадии, которая была бы запущена
+    assert run(files, dry_run=True) == {"a": "would-run", "b": "would-run", "c": "would-run",
+                                        "d": "up-to-date"}
+    assert [runs(files, s) for s in "abcd"] == [1, 1, 1, 1]
+    assert run(files) == {"a": "ran", "b": "ran", "c": "ran", "d": "up-to-date"}
+
+def test_failure_blocks_dependents(files):
+    (files / "source.txt").unlink()
+    assert run(files) == {"a": "failed", "b": "blocked", "c": "blocked", "d": "ran"}
+    assert "a" not in PipelineState(files / "state" / "state.json").stages
+    (files / "source.txt").write_text("исходные данные", encoding="utf-8")
+    assert run(files) == {"a": "ran", "b": "ran", "c": "ran", "d": "up-to-date"}
+
+def test_file_hash_cached_by_size_and_mtime(files):
+    state = PipelineState(files / "state.json")
+    path = str(files / "source.txt")
+    first = state.file_hash(path)
+    st = os.stat(path)
+    # другое содержимое той же длины и тот же mtime — хэш берётся из кэша
+    (files / "source.txt").write_bytes(b"x" * st.st_size)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert state.file_hash(path) == first
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    assert state.file_hash(path) != first
+    assert state.file_hash(str(files / "missing.txt")) is None
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+import query_cache
+from query_cache import QueryCache, CachedResult, query_key, read_generation, bump_generation, \
+    generation_stamp
+
+def result(n_docs=10, term="machine learning"):
+    docs = np.arange(n_docs, dtype=np.int32)
+    return CachedResult([("ml", 0.5)], [term], docs, np.linspace(1, 0, n_docs))
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    return clock
+
+def test_query_key_ignores_case_and_spaces():
+    assert query_key("  Machine   LEARNING ", True, False, 10) == query_key("machine learning", 1, 0, 10)
+    assert query_key("machine learning", True, False, 10) != query_key("machine learning", False, False, 10)
+
+def test_hit_and_miss(clock):
+    cache = QueryCache(memory_mb=1, ttl=60)
+    assert cache.get("a") is None
+    r = result()
+    cache.put("a", r)
+    assert cache.get("a") is r
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["bytes"] == r.nbytes
+
+def test_lru_eviction_by_memory(clock):
+    one = result().nbytes
+    cache = QueryCache(memory_mb=(3 * one + one // 2) / (1 << 20), ttl=60)
+    for key in "abc":
+        cache.put(key, result())
+    cache.get("a")                    # a — недавно запрошенная, вытесняется b
+    cache.put("d", result())
+    assert cache.get("b") is None
+    assert all(cache.get(k) is not None for k in "acd")
+    assert cache.stats()["evictions"] == 1
+    assert cache.bytes <= cache.capacity
+
+def test_entry_larger_than_cache_is_not_stored(clock):
+    cache = QueryCache(memory_mb=result().nbytes / 2 / (1 << 20), ttl=60)
+    cache.put("a", result())
+    assert cache.get("a") is None and cache.bytes == 0
+
+def test_ttl(clock):
+    cache = QueryCache(memory_mb=1, ttl=60)
+    cache.put("a", result())
+    clock.now += 59
+    assert cache.get("a") is not None
+    clock.now += 2
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["expired"], stats["entries"], stats["bytes"]) == (1, 0, 0)
+
+def test_generation_clear_and_stale_results(clock):
+    cache = QueryCache(memory_mb=1, ttl=60)
+    old, new = {"generation": 1}, {"generation": 2}
+    cache.clear(old)
+    cache.put("a", result(), old)
+    cache.clear(new)                               # данные перезагружены
+    assert cache.get("a", new) is None
+    cache.put("b", result(), old)                  # посчитан по старым данным во время перезагрузки
+    assert cache.get("b", new) is None
+    cache.put("b", result(), new)
+    assert cache.get("b", old) is None             # запрос, начатый на старых данных
+    assert cache.get("b", new) is not None
+    stats = cache.stats()
+    assert (stats["generation"], stats["invalidations"]) == (2, 1)
+
+def test_generation_file(tmp_path):
+    path = tmp_path / "search_generation.json"
+    assert read_generation(path)["generation"] == 0
+    assert generation_stamp(path) is None
+    assert bump_generation("test", path) == 1
+    first = read_generation(path)
+    assert bump_generation("test", path) == 2
+    assert read_generation(path) != first
+    assert generation_stamp(path) is not None
+    assert read_generation(path)["by"] == "test"
@@ -0,0 +1,49 @@
+import json
+import os
+
+from synonym_index import build_index, SynonymIndex, open_or_build, index_path, normalize_key
+
+SYNONYMS = {
+    "machine learning": [["statistical machine learning", 0.8165], ["deep learning", 0.5]],
+    "Multi-Agent_Systems": [["agents", 0.25]],
+    "computer vision": [["image recognition", 0.75]],
+    "ComputerVision": [["should not win", 0.1]],   # та же нормализация — побеждает первый ключ
+    "пустой": [],
+    "нейронные сети": [["сеть", 0.3333333333333333]],
+}
+
+def scan(synonyms, query):
+    """Прежний поиск по JSON: первый ключ, совпавший после нормализации."""
+    for key, syns in synonyms.items():
+        if normalize_key(key) == normalize_key(query):
+            return [(t, float(w)) for t, w in syns]
+    return []
+
+def queries():
+    out = {"", "unknown", "learning", "MACHINE LEARNING", "machine-learning", "machinelearning",
+           "multi agent systems", "computer_vision", "НЕЙРОННЫЕ-СЕТИ"}
+    out |= set(SYNONYMS)
+    return sorted(out)
+
+def test_index_matches_json_lookup(tmp_path):
+    path = tmp_path / "query_synonyms.idx"
+    build_index(SYNONYMS, path)
+    with SynonymIndex(path) as index:
+        assert len(index) == len({normalize_key(k) for k in SYNONYMS})
+        for query in queries():
+            assert index.get(query) == scan(SYNONYMS, query), query
+            assert (query in index) == any(normalize_key(k) == normalize_key(query) for k in SYNONYMS)
+
+def test_open_or_build_follows_json(tmp_path):
+    json_path = tmp_path / "query_synonyms.json"
+    json_path.write_text(json.dumps(SYNONYMS, ensure_ascii=False), encoding="utf-8")
+    with open_or_build(json_path) as index:
+        assert index.get("machine learning") == scan(SYNONYMS, "machine learning")
+
+    # словарь поправили руками — JSON новее индекса, индекс пересобирается
+    edited = dict(SYNONYMS, **{"machine learning": [["ml", 1.0]]})
+    json_path.write_text(json.dumps(edited, ensure_ascii=False), encoding="utf-8")
+    stat = index_path(json_path).stat()
+    os.utime(json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    with open_or_build(json_path) as index:
+        assert index.get("Machine-Learning") == [("ml", 1.0)]
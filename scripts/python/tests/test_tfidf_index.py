@@ -0,0 +1,79 @@
+import random
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import linear_kernel
+
+import tfidf_index
+import token_stream
+from corpus_store import tfidf_text
+from jsonstream import RecordWriter
+from tfidf_index import TfidfIndex, top_k
+
+WORDS = ["learning", "machine", "neural", "network", "graph", "optimization", "quantum",
+         "vision", "deep", "data", "search", "gpt-4", "2d", "обучение", "сеть", "A", "x"]
+QUERIES = ["machine learning", "optimization", "neural networks", "Graph SEARCH", "сеть обучение",
+           "gpt-4 vision", "absent words only", "", "data data data"]
+
+@pytest.fixture(scope="module")
+def articles():
+    rng = random.Random(0)
+    text = lambda k: " ".join(rng.choices(WORDS, k=k))
+    return [{"_id": f"{i:024x}", "title": text(rng.randint(0, 6)), "abstract": text(rng.randint(0, 25)),
+             "tags": [text(2) for _ in range(rng.randint(0, 2))]} for i in range(250)]
+
+@pytest.fixture(scope="module")
+def fitted(articles):
+    vectorizer = TfidfVectorizer()
+    return vectorizer, vectorizer.fit_transform([tfidf_text(a) for a in articles])
+
+@pytest.fixture
+def index(tmp_path, articles):
+    tfidf_index.build((tfidf_text(a) for a in articles), tmp_path / "tfidf")
+    return TfidfIndex(tmp_path / "tfidf")
+
+def test_model_matches_vectorizer(index, fitted):
+    vectorizer, matrix = fitted
+    assert list(index.vocab) == vectorizer.get_feature_names_out().tolist()
+    np.testing.assert_allclose(index.idf, vectorizer.idf_)
+    np.testing.assert_allclose(index.matrix.toarray(), matrix.toarray(), rtol=1e-6, atol=1e-7)
+    np.testing.assert_allclose(index.transform(QUERIES).toarray(), vectorizer.transform(QUERIES).toarray(),
+                               rtol=1e-6, atol=1e-7)
+
+def test_ranking_matches_old_search(index, fitted):
+    """Прежний tfidf_search: linear_kernel, положительные score, сортировка по убыванию."""
+    vectorizer, matrix = fitted
+    for query, ranked in zip(QUERIES, index.search(QUERIES)):
+        sim = linear_kernel(vectorizer.transform([query]), matrix).flatten()
+        expected = sorted((i for i, v in enumerate(sim) if v > 0), key=lambda i: sim[i], reverse=True)
+        assert sorted(ranked) == sorted(expected), query
+        # порядок может отличаться только внутри равных (во float32) оценок
+        np.testing.assert_allclose(sim[ranked], sim[expected], rtol=1e-5)
+
+def test_top_k_is_prefix_of_full_ranking(index):
+    full = index.search(QUERIES)
+    for k in (1, 3, 10, 1000):
+        assert index.search(QUERIES, k) == [r[:k] for r in full]
+
+def test_top_k_ties_by_position():
+    scores = np.array([0.5, 0.0, 0.9, 0.5, -1.0, 0.5, 0.9])
+    assert top_k(scores) == [2, 6, 0, 3, 5]
+    assert top_k(scores, 3) == [2, 6, 0]
+    assert top_k(scores, 4) == [2, 6, 0, 3]
+
+def test_query_batches(index, monkeypatch):
+    full = index.search(QUERIES)
+    monkeypatch.setattr(tfidf_index, "QUERY_BATCH", 2)
+    assert index.search(QUERIES) == full
+
+def test_stream_model_matches_text_model(tmp_path, articles, index):
+    path = tmp_path / "normalized_articles.json"
+    with RecordWriter(path) as writer:
+        for article in articles:
+            writer.write(article)
+    tfidf_index.build_from_stream(token_stream.build_stream(path), tmp_path / "stream")
+    stream = TfidfIndex(tmp_path / "stream")
+    assert list(stream.vocab) == list(index.vocab)
+    np.testing.assert_array_equal(stream.idf, index.idf)
+    assert (stream.matrix != index.matrix).nnz == 0
@@ -0,0 +1,102 @@
+import random
+import filecmp
+
+import numpy as np
+import pytest
+
+import corpus_store
+import token_stream
+from corpus_store import build_store, CorpusStore, FIELDS
+from jsonstream import RecordWriter
+
+WORDS = ["learning", "machine", "neural", "network", "networks", "graph", "optimization",
+         "quantum", "vision", "language", "model", "models", "deep", "data", "search",
+         "retrieval", "multi-agent", "systems", "робот", "обучение", "сеть", "x", "2d"]
+TAGS = ["Machine Learning", "Statistical Machine Learning", "Computer Vision",
+        "Multi-Agent Systems", "Information Retrieval", "Robotics", "Нейронные сети"]
+
+@pytest.fixture(scope="module")
+def articles():
+    """_id строкой и {"$oid"} вперемешку, пустые поля; частоты слов — по Ципфу."""
+    rng = random.Random(0)
+    weights = [1 / (i + 1) for i in range(len(WORDS))]
+    text = lambda k: " ".join(rng.choices(WORDS, weights, k=k))
+    return [{"_id": {"$oid": f"{i:024x}"} if i % 2 else f"{i:024x}", "title": text(rng.randint(0, 8)),
+             "abstract": text(rng.randint(0, 40)), "tags": rng.sample(TAGS, rng.randint(0, 3))}
+            for i in range(300)]
+
+@pytest.fixture
+def articles_file(tmp_path, articles):
+    path = tmp_path / "normalized_articles.json"
+    with RecordWriter(path) as writer:
+        for article in articles:
+            writer.write(article)
+    return path
+
+def build_both(tmp_path, articles, articles_file):
+    stream = token_stream.build_stream(articles_file)
+    build_store(articles, tmp_path / "text")
+    build_store(articles, tmp_path / "stream", stream=stream)
+    return CorpusStore(tmp_path / "text"), CorpusStore(tmp_path / "stream")
+
+def test_stream_store_matches_text_store(tmp_path, articles, articles_file):
+    text, stream = build_both(tmp_path, articles, articles_file)
+    assert list(text.ids) == list(stream.ids)
+    for field in FIELDS:
+        assert list(text.units(field)) == list(stream.units(field))
+        assert np.array_equal(text.owners(field), stream.owners(field))
+        assert np.array_equal(text.ptr(field), stream.ptr(field))
+        a, b = text.postings(field), stream.postings(field)
+        assert sorted(a) == sorted(b)
+        for token in a:
+            assert list(a[token]) == list(b[token]), (field, token)
+    # TF-IDF и BM25F — байт в байт
+    for sub in ("tfidf", "bm25"):
+        left, right = tmp_path / "text" / sub, tmp_path / "stream" / sub
+        names = sorted(p.name for p in left.iterdir())
+        assert names == sorted(p.name for p in right.iterdir())
+        _, mismatch, errors = filecmp.cmpfiles(left, right, names, shallow=False)
+        assert not mismatch and not errors, (sub, mismatch, errors)
+
+def test_stream_round_trips_values(articles, articles_file):
+    stream = token_stream.build_stream(articles_file)
+    assert stream.exact_text
+    assert stream.n_docs == len(articles)
+    assert list(stream.ids) == [corpus_store.doc_id(a) for a in articles]
+    for field in stream.fields:
+        values = [v for a in articles for v in corpus_store.field_values(a, field)]
+        assert stream.unit_strings(field) == values
+
+def test_open_for_rejects_changed_file(articles, articles_file):
+    token_stream.build_stream(articles_file)
+    assert token_stream.open_for(articles_file) is not None
+    with RecordWriter(articles_file) as writer:
+        writer.write(articles[0])
+    assert token_stream.open_for(articles_file) is None
+
+def test_open_or_build_creates_stream(tmp_path, articles_file):
+    store = corpus_store.open_or_build(articles_file, root=tmp_path / "stores")
+    assert token_stream.open_for(articles_file) is not None
+    assert store.n_docs == token_stream.open_for(articles_file).n_docs
+
+def test_failed_build_leaves_no_tmp_dir(tmp_path, articles, articles_file):
+    stream = token_stream.build_stream(articles_file)
+    with pytest.raises(ValueError):
+        build_store(articles[:10], tmp_path / "store", stream=stream)   # поток от другого корпуса
+    assert list(tmp_path.glob("store*")) == []
+
+def test_tokens_path_keeps_full_name(tmp_path):
+    paths = [tmp_path / name for name in ("normalized_articles.json", "normalized_articles.jsonl",
+                                          "normalized_articles.json.gz", "normalized_articles.jsonl.gz")]
+    assert token_stream.tokens_path(paths[0]) == tmp_path / "normalized_articles.json.tokens"
+    assert len({token_stream.tokens_path(p) for p in paths}) == len(paths)
+
+def test_json_and_jsonl_streams_are_separate(articles, articles_file):
+    jsonl = articles_file.with_name("normalized_articles.jsonl")
+    with RecordWriter(jsonl) as writer:
+        for article in articles[:10]:
+            writer.write(article)
+    token_stream.build_stream(articles_file)
+    token_stream.build_stream(jsonl)
+    assert token_stream.open_for(articles_file).n_docs == len(articles)
+    assert token_stream.open_for(jsonl).n_docs == 10
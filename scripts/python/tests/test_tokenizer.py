@@ -0,0 +1,66 @@
+import pytest
+from pymorphy3 import MorphAnalyzer
+
+import tokenizer
+from tokenizer import Tokenizer, script, CYR, LAT, NUM, OTHER
+
+class Counting:
+    """Анализатор, который помечает токен и считает вызовы."""
+    def __init__(self, tag):
+        self.tag = tag
+        self.calls = []
+
+    def __call__(self, token):
+        self.calls.append(token)
+        return f"{self.tag}:{token}"
+
+@pytest.mark.parametrize("token, kind", [
+    ("сеть", CYR), ("из-за", CYR), ("tf-idf-модель", CYR), ("ґрунт", CYR),
+    ("network", LAT), ("BM", LAT),
+    ("2024", NUM),
+    ("gpt-4", OTHER), ("state-of-the-art", OTHER), ("α", OTHER), ("x2", OTHER),
+])
+def test_script(token, kind):
+    assert script(token) == kind
+
+def test_routes_by_script():
+    ru, en, other = Counting("ru"), Counting("en"), Counting("other")
+    t = Tokenizer(ru=ru, en=en, other=other)
+    assert t.lemmas("Сети, networks: GPT-4 и 2024!") == ["ru:сети", "en:networks", "other:gpt-4", "ru:и", "2024"]
+    assert (ru.calls, en.calls, other.calls) == (["сети", "и"], ["networks"], ["gpt-4"])
+
+def test_default_routes_keep_token():
+    assert Tokenizer(ru=Counting("ru")).lemmas("Deep сети gpt-4 42") == ["deep", "ru:сети", "gpt-4", "42"]
+
+def test_stopwords_before_and_after_analysis():
+    calls = []
+    def ru(token):
+        calls.append(token)
+        return "и" if token == "иии" else token
+    t = Tokenizer(ru=ru, stopwords={"и", "the"})
+    # сам токен — стоп-слово: до анализатора не доходит; лемма — стоп-слово: отбрасывается
+    assert t.lemmas("и the иии сеть") == ["сеть"]
+    assert calls == ["иии", "сеть"]
+    assert t.lemma("и") is None and t.lemma("иии") is None
+
+def test_memo_calls_analyzer_once(monkeypatch):
+    ru = Counting("ru")
+    t = Tokenizer(ru=ru)
+    assert t.lemmas("сеть сеть сети") == ["ru:сеть", "ru:сеть", "ru:сети"]
+    t.lemmas("сеть")
+    assert ru.calls == ["сеть", "сети"]
+    monkeypatch.setattr(tokenizer, "MEMO_SIZE", 2)
+    t.lemmas("граф")                      # словарь полон — очищается
+    assert t.lemmas("сеть") == ["ru:сеть"]
+    assert ru.calls == ["сеть", "сети", "граф", "сеть"]
+
+def test_same_as_morph_for_every_token():
+    """Маршрут по письменности даёт то же, что pymorphy3 для каждого токена (нормализация статей)."""
+    morph = MorphAnalyzer()
+    def lemma(token):
+        parsed = morph.parse(token)
+        return parsed[0].normal_form if parsed and parsed[0].score > 0.3 else token
+    text = ("Нейронные сети для графов: tf-idf-модели, GPT-4, BM25 и state-of-the-art "
+            "из-за 2024 года; networks of graphs, α-beta, covid-19 какая-то x2 ёлки")
+    old = [lemma(w) for w in tokenizer.CLEAN_RE.sub("", text.lower()).split()]
+    assert Tokenizer(ru=lemma).lemmas(text) == old
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from sklearn.metrics.pairwise import cosine_similarity
+
+from topk_similarity import topk_cosine, topk_pairs, topk_row
+
+def matrix(n=300, m=80, seed=0):
+    """Разреженная матрица с повторами строк (равные score) и пустыми строками."""
+    X = sp.random(n, m, density=0.05, random_state=seed, format="csr")
+    rows = [X[i] for i in range(n)]
+    rows[10] = rows[20] = rows[30] = rows[5]
+    rows[40] = sp.csr_matrix((1, m))
+    return sp.vstack(rows).tocsr()
+
+def brute_force(X, top_n, min_score):
+    """Прежний build_synonyms: плотная матрица сходства и полная сортировка строки."""
+    S = cosine_similarity(X)
+    out = []
+    for i, row in enumerate(S):
+        order = sorted((j for j in range(len(row)) if j != i and row[j] >= min_score),
+                       key=lambda j: (-row[j], j))[:top_n]
+        out.append((np.array(order, dtype=int), row[order]))
+    return out
+
+def assert_same(got, expected):
+    assert len(got) == len(expected)
+    for i, ((cols, scores), (ecols, escores)) in enumerate(zip(got, expected)):
+        assert list(cols) == list(ecols), i
+        np.testing.assert_allclose(scores, escores, rtol=1e-6, atol=1e-9)
+
+# min_score > 0: нулевое сходство в разреженном произведении не хранится
+@pytest.mark.parametrize("block_size", [1, 7, 64, 1024])
+@pytest.mark.parametrize("top_n,min_score", [(5, 0.1), (1, 0.01), (50, 0.3)])
+def test_blocked_topk_equals_brute_force(block_size, top_n, min_score):
+    X = matrix()
+    assert_same(topk_cosine(X, top_n, min_score, block_size=block_size),
+                brute_force(X, top_n, min_score))
+
+def test_process_pool_gives_same_result():
+    X = matrix(seed=3)
+    assert_same(topk_cosine(X, 5, 0.1, block_size=32, workers=2), brute_force(X, 5, 0.1))
+
+def test_ties_broken_by_index():
+    cols, scores = topk_row(np.array([9, 3, 7, 5]), np.array([0.5, 0.5, 0.9, 0.5]), row=5, top_n=2, min_score=0)
+    assert list(cols) == [7, 3] and list(scores) == [0.9, 0.5]
+
+def test_topk_pairs_equals_topk_row():
+    rng = np.random.default_rng(1)
+    n = 40
+    I = rng.integers(0, n, 2000)
+    J = rng.integers(0, n, 2000)
+    keep = I != J
+    I, J = I[keep], J[keep]
+    scores = rng.integers(0, 10, len(I)) / 10          # много равных score
+    pairs = {}
+    for i, j, s in zip(I, J, scores):
+        pairs[(i, j)] = s                               # одна пара — один score
+    I, J = (np.array(x) for x in zip(*pairs))
+    scores = np.array(list(pairs.values()))
+
+    TI, TJ, TS = topk_pairs(I, J, scores, n, top_n=3, min_score=0.2)
+    for row in range(n):
+        mask = I == row
+        cols, vals = topk_row(J[mask], scores[mask], row, 3, 0.2)
+        assert list(TJ[TI == row]) == list(cols)
+        assert list(TS[TI == row]) == list(vals)
@@ -0,0 +1,170 @@
+"""
+TF-IDF базового режима оценки поиска: обученная модель на диске и быстрый top-k.
+
+Раньше TfidfVectorizer обучался на всём корпусе при каждом запуске, а
+выдача строилась списком Python и сортировкой с lambda. Здесь модель
+(словарь, idf и матрица документов float32 в CSR) пишется один раз в
+каталог и дальше открывается через mmap; запросы векторизуются тем же
+преобразованием, что TfidfVectorizer.transform, и оцениваются пачкой —
+одним произведением разреженных матриц.
+
+Каталог (обычно tfidf/ внутри corpus_store, ключ — хэш корпуса):
+    meta.json                      — параметры, размеры, тип данных
+    vocab.{bin,off.npy}            — термины по номерам столбцов
+    idf.npy                        — idf (float64, как в sklearn)
+    data/indices/indptr.npy        — CSR документов (float32)
+
+Формат .npz не используется: его массивы не открываются через mmap.
+"""
+import json
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+
+DTYPE = np.float32
+QUERY_BATCH = 256   # запросов в одном произведении (плотный блок документы × запросы)
+
+def build(texts, out_dir):
+    """Обучает TfidfVectorizer (параметры по умолчанию) на texts и пишет модель в out_dir."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer = TfidfVectorizer(dtype=DTYPE)
+    matrix = vectorizer.fit_transform(list(texts)).tocsr()
+    vocab = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    save(out_dir, vocab, vectorizer.idf_, matrix, vectorizer.get_params())
+
+def build_from_stream(stream, out_dir, fields=("title", "abstract", "tags")):
+    """
+    То же, что build для текстов tfidf_text, но по потоку токенов
+    (token_stream.py): анализатор TfidfVectorizer применяется к словарю
+    потока, матрица частот собирается из номеров терминов.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer = TfidfVectorizer(dtype=DTYPE)
+    analyzer = stream.analyzer(vectorizer.build_analyzer())
+    rows, cols = [], []
+    for field in fields:
+        terms, offsets = analyzer.apply(stream.tokens(field), stream.doc_offsets(field))
+        rows.append(np.repeat(np.arange(stream.n_docs, dtype=np.int64), np.diff(offsets)))
+        cols.append(terms)
+    params = vectorizer.get_params()
+    vocab, idf, matrix = fit_counts(analyzer.terms, np.concatenate(rows), np.concatenate(cols),
+                                    stream.n_docs, params, DTYPE)
+    save(out_dir, vocab, idf, matrix, params)
+
+def fit_counts(terms, rows, cols, n_rows, params, dtype):
+    """
+    TfidfVectorizer.fit_transform по уже токенизированным строкам: cols[i] —
+    номер термина (в terms) в строке rows[i]. Возвращает (термины по
+    столбцам, idf, матрица CSR) — столбцы по алфавиту, как у CountVectorizer.
+    """
+    from sklearn.feature_extraction.text import TfidfTransformer
+
+    order = np.argsort(np.array(terms, dtype=object), kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    counts = sp.csr_matrix((np.ones(len(rows), dtype=dtype), (rows, rank[cols])),
+                           shape=(n_rows, len(order)))
+    counts.sum_duplicates()
+    transformer = TfidfTransformer(norm=params["norm"], use_idf=params["use_idf"],
+                                   smooth_idf=params["smooth_idf"], sublinear_tf=params["sublinear_tf"])
+    transformer.fit(counts)
+    matrix = transformer.transform(counts, copy=False).tocsr()
+    return [terms[i] for i in order.tolist()], transformer.idf_, matrix
+
+def save(out_dir, vocab, idf, matrix, params):
+    from corpus_store import write_strings
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    matrix.sort_indices()
+    write_strings(out_dir / "vocab", vocab)
+    np.save(out_dir / "idf.npy", idf.astype(np.float64))
+    np.save(out_dir / "data.npy", matrix.data)
+    np.save(out_dir / "indices.npy", matrix.indices)
+    np.save(out_dir / "indptr.npy", matrix.indptr)
+
+    meta = {
+        "n_docs": matrix.shape[0],
+        "n_terms": matrix.shape[1],
+        "nnz": int(matrix.nnz),
+        "dtype": np.dtype(DTYPE).name,
+        "params": {k: params[k] for k in ("lowercase", "token_pattern", "ngram_range",
+                                          "norm", "use_idf", "smooth_idf", "sublinear_tf")},
+    }
+    (out_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
+class TfidfIndex:
+    """Модель из каталога build(); массивы открыты через mmap."""
+
+    def __init__(self, path):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from corpus_store import StringColumn
+
+        path = Path(path)
+        self.meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        params = self.meta["params"]
+        params["ngram_range"] = tuple(params["ngram_range"])
+        self._analyze = TfidfVectorizer(**params).build_analyzer()
+        self.vocab = {t: i for i, t in enumerate(StringColumn(path / "vocab"))}
+        self.idf = np.load(path / "idf.npy", mmap_mode="r")
+        self.matrix = sp.csr_matrix(
+            (np.load(path / "data.npy", mmap_mode="r"),
+             np.load(path / "indices.npy", mmap_mode="r"),
+             np.load(path / "indptr.npy", mmap_mode="r")),
+            shape=(self.meta["n_docs"], self.meta["n_terms"]), copy=False
+        )
+
+    def transform(self, queries):
+        """То же, что TfidfVectorizer.transform(queries) обученной модели (CSR float32)."""
+        rows, cols, counts = [], [], []
+        for r, q in enumerate(queries):
+            tf = Counter(c for c in map(self.vocab.get, self._analyze(q)) if c is not None)
+            for c in sorted(tf):
+                rows.append(r)
+                cols.append(c)
+                counts.append(tf[c])
+        cols = np.asarray(cols, dtype=np.int64)
+        data = np.asarray(counts, dtype=np.float64)
+        if self.meta["params"]["sublinear_tf"]:
+            data = np.log(data) + 1
+        if self.meta["params"]["use_idf"]:
+            data = data * self.idf[cols]
+        X = sp.csr_matrix((data, (rows, cols)), shape=(len(queries), len(self.vocab)))
+        if self.meta["params"]["norm"]:
+            from sklearn.preprocessing import normalize
+            X = normalize(X, norm=self.meta["params"]["norm"], copy=False)
+        return X.astype(DTYPE)
+
+    def scores(self, queries):
+        """Косинусная близость: плотная матрица (документы × запросы)."""
+        return (self.matrix @ self.transform(queries).T).toarray()
+
+    def search(self, queries, k=None):
+        """
+        Для каждого запроса — номера документов с положительным score по
+        убыванию (при равенстве — по номеру документа); k — только первые k.
+        """
+        results = []
+        for start in range(0, len(queries), QUERY_BATCH):
+            block = self.scores(queries[start:start + QUERY_BATCH])
+            for s in block.T:
+                results.append(top_k(s, k))
+        return results
+
+def top_k(scores, k=None):
+    """Номера положительных scores по убыванию, равные — по возрастанию номера."""
+    pos = np.flatnonzero(scores > 0)
+    vals = scores[pos]
+    if k is not None and k < len(pos):
+        # k-е по величине значение; всё строго больше него входит целиком,
+        # из равных ему — первые по номеру
+        kth = vals[np.argpartition(-vals, k - 1)[k - 1]]
+        above = vals > kth
+        tie = np.flatnonzero(vals == kth)[:k - int(above.sum())]
+        keep = np.sort(np.concatenate((np.flatnonzero(above), tie)))
+        pos, vals = pos[keep], vals[keep]
+    return pos[np.argsort(-vals, kind="stable")].tolist()
@@ -0,0 +1,249 @@
+"""
+Поток токенов нормализованных статей: словарь + номера токенов (uint32) в CSR.
+
+Раньше каждый следующий шаг заново разбирал JSON нормализованных статей
+и резал текст своими регулярками: corpus_store (индекс полей, TF-IDF,
+BM25F), build_synonyms.py, build_cooccurrence_synonyms.py. Теперь
+build_normalized_articles.py, записывая результат, пишет рядом и его
+токены — значения полей, разбитые по пробелам, — а потребители работают
+с массивами чисел.
+
+Своя токенизация потребителя (token_pattern TF-IDF, TOKEN_RE BM25F,
+clean() синонимов) применяется не к тексту, а к словарю — один раз на
+уникальный токен (Analyzer). Все они режут по пробелам и не склеивают
+соседние токены, поэтому анализ текста — это анализ его токенов подряд,
+и результаты совпадают с прежними.
+
+Каталог (<файл статей>.tokens/, рядом с файлом):
+    meta.json                — версия, число статей, поля, sha256 файла статей
+    vocab.{bin,off.npy}      — токены по номерам (порядок первого появления)
+    ids.{bin,off.npy}        — _id статей
+    <field>.tokens.npy       — номера токенов всех значений поля подряд (uint32)
+    <field>.units.npy        — значение u → tokens[units[u]:units[u+1]]
+    <field>.ptr.npy          — статья i → значения ptr[i]:ptr[i+1]
+
+Поток привязан к содержимому файла (sha256): если файл статей потом
+изменили, open_for вернёт None и потребители прочитают JSON, как раньше.
+corpus_store.open_or_build в этом случае сам строит поток заново. Для
+уже нормализованного файла поток можно построить и отдельно:
+    python token_stream.py ../../storage/app/normalized_articles.json
+"""
+import os
+import json
+import shutil
+import argparse
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from corpus_store import write_strings, StringColumn, file_hash, doc_id, field_values
+
+STREAM_VERSION = 1
+FIELDS = ("title", "abstract", "tags")
+
+def lowercase(token):
+    """Анализатор по умолчанию: токен в нижнем регистре (как units в field_index.py)."""
+    return [token.lower()]
+
+def tokens_path(articles_path):
+    """
+    normalized_articles.json → normalized_articles.json.tokens: имя файла
+    целиком, чтобы у .json, .jsonl и .json.gz рядом были разные потоки.
+    """
+    path = Path(articles_path)
+    return path.with_name(path.name + ".tokens")
+
+# === ЗАПИСЬ ===
+
+class TokenStreamWriter:
+    """
+    Копит токены статей по мере записи (add) и пишет каталог при close;
+    каталог заменяется атомарно. В памяти — словарь и массивы чисел.
+    """
+
+    def __init__(self, path, fields=FIELDS):
+        self.path = Path(path)
+        self.fields = fields
+        self.vocab = {}
+        self.ids = []
+        self.tokens = {f: array("I") for f in fields}
+        self.units = {f: array("q", [0]) for f in fields}
+        self.ptr = {f: array("q", [0]) for f in fields}
+        # значение == " ".join(его токены) у всех статей: строки восстанавливаются из потока
+        self.exact_text = True
+
+    def add(self, article):
+        vocab = self.vocab
+        self.ids.append(doc_id(article))
+        for field in self.fields:
+            tokens, units = self.tokens[field], self.units[field]
+            values = field_values(article, field)
+            for value in values:
+                words = value.split()
+                tokens.extend(vocab.setdefault(w, len(vocab)) for w in words)
+                units.append(len(tokens))
+                if self.exact_text and " ".join(words) != value:
+                    self.exact_text = False
+            self.ptr[field].append(len(units) - 1)
+
+    def close(self, source, digest=None):
+        """
+        Пишет каталог; source — файл статей, к содержимому которого привязан
+        поток, digest — уже посчитанный sha256 этого файла.
+        """
+        tmp = self.path.with_name(self.path.name + f".tmp{os.getpid()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        try:
+            write_strings(tmp / "vocab", self.vocab)
+            write_strings(tmp / "ids", self.ids)
+            for field in self.fields:
+                np.save(tmp / f"{field}.tokens.npy", np.frombuffer(self.tokens[field], dtype=np.uint32))
+                np.save(tmp / f"{field}.units.npy", np.frombuffer(self.units[field], dtype=np.int64))
+                np.save(tmp / f"{field}.ptr.npy", np.frombuffer(self.ptr[field], dtype=np.int64))
+
+            meta = {"version": STREAM_VERSION, "n_docs": len(self.ids), "n_tokens": len(self.vocab),
+                    "fields": list(self.fields), "exact_text": self.exact_text,
+                    "source": str(source), "source_sha256": digest or file_hash(source)}
+            (tmp / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.replace(tmp, self.path)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+def build_stream(articles_path, path=None, digest=None):
+    """Поток для уже готового файла статей (без повторной нормализации)."""
+    from jsonstream import iter_records
+    writer = TokenStreamWriter(path or tokens_path(articles_path))
+    for article in iter_records(articles_path):
+        writer.add(article)
+    writer.close(articles_path, digest)
+    return TokenStream(writer.path)
+
+# === ЧТЕНИЕ ===
+
+class Analyzer:
+    """
+    Токенизация потребителя, применённая к словарю потока: токен k даёт
+    термины terms[i] для i из ids[ptr[k]:ptr[k+1]]. Номера терминов — по
+    первому появлению в потоке (как при проходе по тексту статей).
+    """
+
+    def __init__(self, vocab, analyze):
+        terms = {}
+        ids = array("q")
+        ptr = array("q", [0])
+        for token in vocab:
+            ids.extend(terms.setdefault(t, len(terms)) for t in analyze(token))
+            ptr.append(len(ids))
+        self.terms = list(terms)
+        self.ids = np.frombuffer(ids, dtype=np.int64)
+        self.ptr = np.frombuffer(ptr, dtype=np.int64)
+
+    def apply(self, tokens, offsets):
+        """
+        Номера токенов → номера терминов. offsets — границы кусков (значений
+        или статей) в tokens; возвращает термины и границы тех же кусков в них.
+        """
+        tokens = np.asarray(tokens, dtype=np.int64)
+        starts = self.ptr[tokens]
+        lengths = self.ptr[tokens + 1] - starts
+        out = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=out[1:])
+        # позиция в ids для каждого выходного термина: начало его токена + сдвиг внутри
+        pos = np.arange(out[-1], dtype=np.int64) - np.repeat(out[:-1] - starts, lengths)
+        return self.ids[pos], out[np.asarray(offsets, dtype=np.int64)]
+
+class TokenStream:
+    """
+    Открытый поток; массивы — через mmap.
+        stream.vocab[k]                  — токен k
+        stream.tokens("title")           — номера токенов поля подряд
+        stream.doc_offsets("tags")       — статья i → tokens[o[i]:o[i+1]]
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        if self.meta.get("version") != STREAM_VERSION:
+            raise ValueError(f"{self.path}: версия потока {self.meta.get('version')}, нужна {STREAM_VERSION}")
+        self.n_docs = self.meta["n_docs"]
+        self.fields = tuple(self.meta["fields"])
+        self.exact_text = self.meta["exact_text"]
+        self.vocab = StringColumn(self.path / "vocab")
+        self.ids = StringColumn(self.path / "ids")
+        self._analyzers = {}
+
+    def tokens(self, field):
+        return np.load(self.path / f"{field}.tokens.npy", mmap_mode="r")
+
+    def units(self, field):
+        return np.load(self.path / f"{field}.units.npy", mmap_mode="r")
+
+    def ptr(self, field):
+        return np.load(self.path / f"{field}.ptr.npy", mmap_mode="r")
+
+    def doc_offsets(self, field):
+        """Границы статей в tokens(field): все значения статьи подряд."""
+        return np.asarray(self.units(field))[np.asarray(self.ptr(field))]
+
+    def analyzer(self, analyze):
+        """Analyzer для функции токен → термины (запоминается на время жизни потока)."""
+        if analyze not in self._analyzers:
+            self._analyzers[analyze] = Analyzer(self.vocab, analyze)
+        return self._analyzers[analyze]
+
+    def unit_strings(self, field):
+        """Значения поля строками (только при exact_text — иначе пробелы не восстановить)."""
+        if not self.exact_text:
+            raise ValueError(f"{self.path}: значения не восстанавливаются из токенов")
+        vocab = list(self.vocab)
+        tokens = self.tokens(field).tolist()
+        units = self.units(field).tolist()
+        return [" ".join([vocab[t] for t in tokens[a:b]]) for a, b in zip(units, units[1:])]
+
+    def postings(self, field, analyze=lowercase):
+        """
+        Термин → номера значений поля (CSR, как postings в field_index.py):
+        (термины, ptr, номера значений по возрастанию).
+        """
+        analyzer = self.analyzer(analyze)
+        n_units = len(self.units(field)) - 1
+        terms, units = analyzer.apply(self.tokens(field), self.units(field))
+        owners = np.repeat(np.arange(n_units, dtype=np.int64), np.diff(units))
+        # (термин, значение) одним ключом: np.unique сортирует по термину, затем по значению
+        width = max(n_units, 1)
+        keys = np.unique(terms * width + owners)
+        term_ids, starts = np.unique(keys // width, return_index=True)
+        ptr = np.append(starts, len(keys)).astype(np.int64)
+        return [analyzer.terms[t] for t in term_ids.tolist()], ptr, keys % width
+
+def open_for(articles_path, digest=None):
+    """
+    Поток рядом с файлом статей, если он построен именно для этого
+    содержимого файла; иначе None. digest — уже посчитанный sha256 файла.
+    """
+    path = tokens_path(articles_path)
+    try:
+        stream = TokenStream(path)
+    except (ValueError, OSError, KeyError):
+        return None
+    if stream.meta.get("source_sha256") != (digest or file_hash(articles_path)):
+        return None
+    return stream
+
+def main():
+    parser = argparse.ArgumentParser(description="Поток токенов для уже нормализованного файла статей.")
+    parser.add_argument("articles", help="нормализованные статьи: JSON-массив или JSON Lines, можно .gz")
+    args = parser.parse_args()
+    stream = open_for(args.articles) or build_stream(args.articles)
+    n = sum(len(stream.tokens(f)) for f in stream.fields)
+    print(f"Поток токенов: {stream.path} (статей: {stream.n_docs}, токенов: {n}, "
+          f"словарь: {stream.meta['n_tokens']})")
+
+if __name__ == "__main__":
+    main()
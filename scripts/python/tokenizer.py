@@ -0,0 +1,160 @@
+"""
+Токенизация и лемматизация смешанного русско-английского текста.
+
+Раньше каждый токен шёл в один анализатор: build_normalized_articles.py
+отдавал pymorphy3 и английские слова (а это почти весь текст статей
+arXiv), хотя для токена без кириллицы pymorphy3 возвращает его же.
+Здесь письменность токена определяется один раз (предкомпилированные
+регулярные выражения), и токен уходит туда, где от анализа есть толк:
+
+    cyr    — есть кириллица (в т.ч. «из-за», «tf-idf-модель») → ru
+    lat    — только латинские буквы                          → en
+    num    — только цифры                                    → как есть
+    other  — прочее без кириллицы (gpt-4, α, state-of-the-art) → other
+
+en и other по умолчанию оставляют токен как есть — ровно то, что для
+таких токенов выдаёт pymorphy3 (проверено на корпусе и случайных
+токенах), поэтому нормализация статей не меняется. normalize_query.py
+отдаёт в ru только слова целиком из кириллицы, как было у него до этого
+модуля («какая-то» остаётся «какая-то», pymorphy3 дал бы «какой-то»).
+Стоп-слова отбрасываются до анализа (по самому токену) и после (по лемме).
+Результат для каждого уникального токена запоминается в словаре
+экземпляра — повторы не доходят даже до lemma_cache.
+
+Сравнение с прежним путём на корпусе (токенов в секунду, результат
+проверяется на совпадение):
+    python tokenizer.py bench ../../storage/app/articles_export.jsonl --limit 5000
+"""
+import re
+import sys
+import time
+import argparse
+
+CLEAN_RE = re.compile(r"[^\w\s\-]")               # вырезается перед разбиением (нормализация статей)
+HAS_CYRILLIC_RE = re.compile(r"[\u0400-\u052f]")  # любая кириллица, не только русский алфавит
+LATIN_RE = re.compile(r"[a-z]+", re.IGNORECASE)
+NUMBER_RE = re.compile(r"[0-9]+")
+MEMO_SIZE = 500_000                                # уникальных токенов в словаре экземпляра
+_MISSING = object()                                # нет в memo (None там — стоп-слово)
+
+CYR, LAT, NUM, OTHER = "cyr", "lat", "num", "other"
+
+def script(token):
+    """Класс токена для маршрутизации: cyr / lat / num / other."""
+    if HAS_CYRILLIC_RE.search(token):
+        return CYR
+    if LATIN_RE.fullmatch(token):
+        return LAT
+    if NUMBER_RE.fullmatch(token):
+        return NUM
+    return OTHER
+
+class Tokenizer:
+    """
+    text → леммы. ru, en, other — функции токен → лемма (например,
+    LemmaCache.get); None — токен как есть. clean_re — что вырезать из
+    текста в нижнем регистре перед разбиением по пробелам.
+    """
+
+    def __init__(self, ru, en=None, other=None, stopwords=(), clean_re=CLEAN_RE):
+        self.route = {CYR: ru, LAT: en, NUM: None, OTHER: other}
+        self.stopwords = frozenset(stopwords)
+        self.clean_re = clean_re
+        self._memo = {}
+
+    def tokens(self, text):
+        return self.clean_re.sub("", text.lower()).split()
+
+    def lemma(self, token):
+        """Лемма токена; None — стоп-слово."""
+        try:
+            return self._memo[token]
+        except KeyError:
+            pass
+        if token in self.stopwords:
+            lemma = None
+        else:
+            analyze = self.route[script(token)]
+            lemma = analyze(token) if analyze else token
+            if lemma in self.stopwords:
+                lemma = None
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[token] = lemma
+        return lemma
+
+    def lemmas(self, text):
+        memo = self._memo
+        result = []
+        for token in self.tokens(text):
+            # одно обращение к memo: между проверкой и чтением его может очистить другой поток
+            lemma = memo.get(token, _MISSING)
+            if lemma is _MISSING:
+                lemma = self.lemma(token)
+            if lemma is not None:
+                result.append(lemma)
+        return result
+
+# === СРАВНЕНИЕ С ПРЕЖНИМ ПУТЁМ ===
+
+def article_texts(path, limit):
+    from jsonstream import iter_records
+    for i, article in enumerate(iter_records(path)):
+        if limit and i >= limit:
+            return
+        yield article.get("title", "")
+        yield article.get("abstract", "")
+        yield from article.get("tags", [])
+
+def bench(args):
+    from pymorphy3 import MorphAnalyzer
+    from lemma_cache import morph_lemma_cache
+
+    texts = list(article_texts(args.articles, args.limit))
+    morph = MorphAnalyzer()
+
+    # прежний путь build_normalized_articles.lemmatize: каждый токен — в кэш pymorphy3
+    old_lemmas = morph_lemma_cache(morph, threshold=0.3, path=None)
+    def old(text):
+        return [old_lemmas.get(w) for w in re.sub(r"[^\w\s\-]", "", text.lower()).split()]
+
+    new_lemmas = morph_lemma_cache(morph, threshold=0.3, path=None)
+    tokenizer = Tokenizer(ru=new_lemmas.get)
+
+    n_tokens = sum(len(tokenizer.tokens(t)) for t in texts)
+    counts = {}
+    for t in texts:
+        for token in tokenizer.tokens(t):
+            kind = script(token)
+            counts[kind] = counts.get(kind, 0) + 1
+    print(f"Текстов: {len(texts)}, токенов: {n_tokens} "
+          f"({', '.join(f'{k} {v / max(n_tokens, 1):.1%}' for k, v in sorted(counts.items()))})")
+
+    results = {}
+    for name, fn in (("прежний путь", old), ("tokenizer", tokenizer.lemmas)):
+        for run in range(args.repeat):
+            started = time.perf_counter()
+            output = [fn(t) for t in texts]
+            elapsed = time.perf_counter() - started
+            label = "холодный" if run == 0 else "тёплый"
+            print(f"{name:<14} {label:<9} {elapsed:7.2f} с  {n_tokens / elapsed:12,.0f} токенов/с")
+        results[name] = output
+    same = results["прежний путь"] == results["tokenizer"]
+    print(f"Результаты совпадают: {'да' if same else 'НЕТ'}")
+    print(f"morph.parse вызовов: прежний путь {old_lemmas.misses}, tokenizer {new_lemmas.misses}")
+    if not same:
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Токенизатор с маршрутизацией по письменности.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("bench", help="сравнить с прежним путём на файле статей")
+    b.add_argument("articles", help="JSON-массив или JSON Lines статей (можно .gz)")
+    b.add_argument("--limit", type=int, default=0, help="статей из начала файла (0 — все)")
+    b.add_argument("--repeat", type=int, default=2, help="прогонов каждого пути (первый — холодный кэш)")
+    args = parser.parse_args()
+    if args.command == "bench":
+        bench(args)
+
+if __name__ == "__main__":
+    main()
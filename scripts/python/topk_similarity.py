@@ -0,0 +1,93 @@
+"""
+Top-k ближайших строк разреженной матрицы по косинусному сходству.
+
+Вместо плотной матрицы N×N (cosine_similarity) и полного argsort каждой
+строки считаем разреженное произведение блоками строк X[a:b] @ X.T, сразу
+отбрасываем значения ниже min_score и выбираем top-k через argpartition.
+Память — O(block_size × средняя плотность строки результата), блоки можно
+раздать пулу процессов.
+"""
+import os
+from multiprocessing import Pool
+
+import numpy as np
+from sklearn.preprocessing import normalize
+
+DEFAULT_BLOCK_SIZE = 1024
+
+def topk_row(cols, vals, row, top_n, min_score):
+    """Top-k одной строки: без самой себя, score >= min_score, по убыванию score."""
+    mask = (vals >= min_score) & (cols != row)
+    cols = cols[mask]
+    vals = vals[mask]
+    if len(vals) > top_n:
+        # k-й по величине score; оставляем всё, что не меньше (включая равные ему)
+        kth = -np.partition(-vals, top_n - 1)[top_n - 1]
+        keep = vals >= kth
+        cols = cols[keep]
+        vals = vals[keep]
+    # по убыванию score, при равенстве — по возрастанию индекса (детерминированно)
+    order = np.lexsort((cols, -vals))[:top_n]
+    return cols[order], vals[order]
+
+def topk_pairs(I, J, scores, n_rows, top_n, min_score=0.0):
+    """
+    Top-k по списку пар (строка I, столбец J, score): оставляет не больше
+    top_n пар на строку с score >= min_score. Результат отсортирован по
+    строке, внутри — как в topk_row (по убыванию score, затем по индексу).
+    """
+    keep = scores >= min_score
+    I, J, scores = I[keep], J[keep], scores[keep]
+    order = np.lexsort((J, -scores, I))
+    I, J, scores = I[order], J[order], scores[order]
+    starts = np.searchsorted(I, np.arange(n_rows + 1))
+    top = np.arange(len(I)) - starts[I] < top_n
+    return I[top], J[top], scores[top]
+
+def topk_block(X, XT, start, stop, top_n, min_score):
+    """Top-k для строк [start, stop): список пар (индексы, scores)."""
+    S = (X[start:stop] @ XT).tocsr()
+    out = []
+    for r in range(stop - start):
+        lo, hi = S.indptr[r], S.indptr[r + 1]
+        out.append(topk_row(S.indices[lo:hi], S.data[lo:hi], start + r, top_n, min_score))
+    return out
+
+# --- пул процессов: матрица передаётся воркеру один раз через initializer ---
+_X = None
+_XT = None
+
+def _init_worker(X):
+    global _X, _XT
+    _X = X
+    _XT = X.T.tocsr()
+
+def _worker_block(task):
+    start, stop, top_n, min_score = task
+    return topk_block(_X, _XT, start, stop, top_n, min_score)
+
+def topk_cosine(X, top_n, min_score=0.0, block_size=DEFAULT_BLOCK_SIZE, workers=1):
+    """
+    Для каждой строки X — её top_n соседей с косинусным сходством >= min_score.
+    Возвращает список длины X.shape[0] из пар (индексы соседей, scores).
+    Строки нормируются по L2 (для TF-IDF с norm='l2' это no-op).
+    """
+    X = normalize(X.tocsr(), norm="l2", copy=True)
+    n = X.shape[0]
+    tasks = [(start, min(start + block_size, n), top_n, min_score)
+             for start in range(0, n, block_size)]
+
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(tasks) <= 1:
+        XT = X.T.tocsr()
+        result = []
+        for start, stop, _, _ in tasks:
+            result.extend(topk_block(X, XT, start, stop, top_n, min_score))
+        return result
+
+    result = []
+    with Pool(processes=workers, initializer=_init_worker, initargs=(X,)) as pool:
+        for block in pool.imap(_worker_block, tasks):
+            result.extend(block)
+    return result